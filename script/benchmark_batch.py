@@ -0,0 +1,28 @@
+import sys
+import time
+import vipy.globals
+from vipy.batch import Batch
+
+
+def run(n_processes, n_tasks):
+    """Compare the startup time and the per-task overhead of the vipy.batch.Batch backends, using a trivial per-element operation such that scheduling and serialization overhead dominates"""
+    for backend in ['dask', 'process', 'thread']:
+        t = time.time()
+        b = Batch(list(range(0, n_tasks)), n_processes=n_processes, backend=backend)
+        startup = time.time() - t
+
+        t = time.time()
+        b.map(lambda x: x+1)
+        elapsed = time.time() - t
+
+        t = time.time()
+        b.chunksize('auto').map(lambda x: x+1)
+        chunked = time.time() - t
+
+        print('[vipy.batch.benchmark]: backend=%s, n_processes=%d, startup=%1.3fs, per-task=%1.3fms, per-task (chunksize=auto)=%1.3fms' % (backend, n_processes, startup, 1000*elapsed/n_tasks, 1000*chunked/n_tasks))
+        (vipy.globals.dask() if backend == 'dask' else vipy.globals.executor(backend=backend)).shutdown()
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) <= 3, "python benchmark_batch.py $num_processes $num_tasks (e.g. 'python benchmark_batch.py 4 10000', or 'python benchmark_batch.py')"
+    run(int(sys.argv[1]) if len(sys.argv)>=2 else 2, int(sys.argv[2]) if len(sys.argv)==3 else 10000)
@@ -0,0 +1,127 @@
+import sys
+import time
+import warnings
+import numpy as np
+import PIL.Image
+import vipy.image
+
+
+class LegacyImage(vipy.image.Image):
+    def _convert(self, to):
+        """The PIL colorspace conversion of vipy.image.Image._convert() prior to the colorspace graph, for comparison"""
+        to = to if to != 'gray' else 'grey'  # standardize 'gray' -> 'grey' internally
+        self.load()
+        if self.colorspace() == to:
+            return self
+        elif to == 'float':
+            img = self.load().array()  # any type
+            self._array = np.array(img).astype(np.float32)  # typecast to float32
+        elif self.colorspace() == 'lum':
+            img = self.load().array()  # single channel, uint8 [0,255]
+            assert img.dtype == np.uint8
+            img = np.squeeze(img, axis=2) if img.ndim == 3 and img.shape[2] == 1 else img  # remove singleton channel            
+            self._array = np.array(PIL.Image.fromarray(img, mode='L').convert('RGB'))  # uint8 luminance [0,255] -> uint8 RGB
+            self.colorspace('rgb')
+            self._convert(to)
+        elif self.colorspace() in ['gray', 'grey']:
+            img = self.load().array()  # single channel float32 [0,1]
+            img = np.squeeze(img, axis=2) if img.ndim == 3 and img.shape[2] == 1 else img  # remove singleton channel                        
+            self._array = np.array(PIL.Image.fromarray(255.0 * img, mode='F').convert('RGB'))  # float32 gray [0,1] -> float32 gray [0,255] -> uint8 RGB
+            self.colorspace('rgb')
+            self._convert(to)
+        elif self.colorspace() == 'rgba':
+            img = self.load().array()  # uint8 RGBA
+            if to == 'bgra':
+                self._array = np.array(img)[:,:,::-1]  # uint8 RGBA -> uint8 ABGR
+                self._array = self._array[:,:,[1,2,3,0]]  # uint8 ABGR -> uint8 BGRA
+            elif to == 'rgb':
+                self._array = self._array[:,:,0:-1]  # uint8 RGBA -> uint8 RGB
+            else:
+                self._array = self._array[:,:,0:-1]  # uint8 RGBA -> uint8 RGB
+                self.colorspace('rgb')
+                self._convert(to)
+        elif self.colorspace() == 'rgb':
+            img = self.load().array()  # uint8 RGB
+            if to in ['grey', 'gray']:
+                self._array = (1.0 / 255.0) * np.array(PIL.Image.fromarray(img).convert('L')).astype(np.float32)  # uint8 RGB -> float32 Grey [0,255] -> float32 Grey [0,1]
+            elif to == 'bgr':
+                self._array = np.array(img)[:,:,::-1]  # uint8 RGB -> uint8 BGR
+            elif to == 'hsv':
+                self._array = np.array(PIL.Image.fromarray(img).convert('HSV'))  # uint8 RGB -> uint8 HSV
+            elif to == 'lum':
+                self._array = np.array(PIL.Image.fromarray(img).convert('L'))  # uint8 RGB -> uint8 Luminance (integer grey)
+            elif to == 'rgba':
+                self._array = np.dstack((img, np.zeros((img.shape[0], img.shape[1]), dtype=np.uint8)))
+            elif to == 'bgra':
+                self._array = np.array(img)[:,:,::-1]  # uint8 RGB -> uint8 BGR
+                self._array = np.dstack((self._array, np.zeros((img.shape[0], img.shape[1]), dtype=np.uint8)))  # uint8 BGR -> uint8 BGRA
+        elif self.colorspace() == 'bgr':
+            img = self.load().array()  # uint8 BGR
+            self._array = np.array(img)[:,:,::-1]  # uint8 BGR -> uint8 RGB
+            self.colorspace('rgb')
+            self._convert(to)
+        elif self.colorspace() == 'bgra':
+            img = self.load().array()  # uint8 BGRA
+            self._array = np.array(img)[:,:,::-1]  # uint8 BGRA -> uint8 ARGB
+            self._array = self._array[:,:,[1,2,3,0]]  # uint8 ARGB -> uint8 RGBA
+            self.colorspace('rgba')
+            self._convert(to)
+        elif self.colorspace() == 'hsv':
+            img = self.load().array()  # uint8 HSV
+            self._array = np.array(PIL.Image.fromarray(img, mode='HSV').convert('RGB'))  # uint8 HSV -> uint8 RGB
+            self.colorspace('rgb')
+            self._convert(to)
+        elif self.colorspace() == 'float':
+            img = self.load().array()  # float32
+            if np.max(img) > 1 or np.min(img) < 0:
+                warnings.warn('Float image will be rescaled with self.mat2gray() into the range float32 [0,1]')
+                img = self.mat2gray().array()
+            if not self.channels() in [1,3]:
+                raise ValueError('Float image must be single channel or three channel RGB in the range float32 [0,1] prior to conversion')
+            if self.channels() == 3:  # assumed RGB
+                self._array = np.uint8(255 * self.array())   # float32 RGB [0,1] -> uint8 RGB [0,255]
+                self.colorspace('rgb')
+            else:
+                self._array = (1.0 / 255.0) * np.array(PIL.Image.fromarray(np.uint8(255 * self.array())).convert('L')).astype(np.float32)  # float32 RGB [0,1] -> float32 gray [0,1]                
+                self.colorspace('grey')
+            self._convert(to)
+        elif self.colorspace() is None:
+            raise ValueError('Colorspace must be initialized by constructor or colorspace() to allow for colorspace conversion')
+        else:
+            raise ValueError('unsupported colorspace "%s"' % self.colorspace())
+
+        self.colorspace(to)
+        return self
+
+
+COLORSPACES = ['rgb', 'rgba', 'bgr', 'bgra', 'hsv', 'lum', 'grey', 'float']
+
+
+def run(height=512, width=512, n_trials=10):
+    """Time the conversion of an image from every source colorspace to every target colorspace, for the numpy colorspace graph in vipy.image.Image._convert() and the legacy PIL conversion, and check that the results are identical"""
+    rgb = vipy.image.RandomImage(height, width)
+    print('[vipy.colorspace.benchmark]: height=%d, width=%d, ms per conversion (speedup over legacy PIL conversion)' % (height, width))
+    print('%8s' % 'from/to' + ''.join(['%16s' % dst for dst in COLORSPACES]))
+    for src in COLORSPACES:
+        im = rgb.clone()._convert(src) if src != 'float' else rgb.clone().float().mat2gray()
+        row = '%8s' % src
+        for dst in COLORSPACES:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                (a, b) = (im.clone()._convert(dst), LegacyImage(array=im.array(), colorspace=im.colorspace())._convert(dst))
+                assert a.colorspace() == b.colorspace() and np.array_equal(a.array(), b.array()), "Conversion '%s' -> '%s' differs from legacy" % (src, dst)
+                t = time.time()
+                for k in range(0, n_trials):
+                    im.clone()._convert(dst)
+                t_graph = (time.time() - t) / n_trials
+                t = time.time()
+                for k in range(0, n_trials):
+                    LegacyImage(array=np.copy(im.array()), colorspace=im.colorspace())._convert(dst)
+                t_legacy = (time.time() - t) / n_trials
+            row += '%16s' % ('%1.2f (%1.1fx)' % (1000*t_graph, t_legacy / max(t_graph, 1E-9)))
+        print(row)
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) <= 3, "python benchmark_colorspace.py $height $width (e.g. 'python benchmark_colorspace.py 1080 1920')"
+    run(int(sys.argv[1]) if len(sys.argv)>=2 else 512, int(sys.argv[2]) if len(sys.argv)==3 else 512)
@@ -0,0 +1,60 @@
+import sys
+import time
+import tracemalloc
+import numpy as np
+import vipy.image
+import vipy.object
+from vipy.image import ImageCategory
+from vipy.geometry import BoundingBox
+
+
+class LegacyScene(vipy.image.Scene):
+    """The zeropad() then crop implementation of vipy.image.Scene padcrop(), maxsquare() and maxmatte() prior to the output buffer implementation, for comparison"""
+    def zeropad(self, padwidth, padheight):
+        padwidth = padwidth if isinstance(padwidth, tuple) else (padwidth, padwidth)
+        padheight = padheight if isinstance(padheight, tuple) else (padheight, padheight)
+        self._array = np.pad(self.load().array(), pad_width=(padheight, padwidth, (0, 0)) if self.iscolor() else (padheight, padwidth), mode='constant', constant_values=0)
+        self._objectlist = [bb.translate(padwidth[0], padheight[0]) for bb in self._objectlist]
+        return self
+
+    def padcrop(self, bbox):
+        self.zeropad(bbox.int().width(), bbox.int().height())
+        (dx, dy) = (bbox.width(), bbox.height())
+        bbox = bbox.translate(dx, dy)
+        self = super(ImageCategory, self)._crop(bbox)
+        (dx, dy) = (bbox.xmin(), bbox.ymin())
+        self._objectlist = [bb.translate(-dx, -dy) for bb in self._objectlist]
+        return self
+
+
+def _frame(cls, img):
+    return cls(array=img, colorspace='rgb', objects=[vipy.object.Detection('person', xmin=1700, ymin=-100, width=400, height=500), vipy.object.Detection('car', xmin=100, ymin=100, width=300, height=200)])
+
+
+def run(n_trials=10):
+    """Time and measure the peak allocation of padcrop(), maxsquare() and maxmatte() per 1080p frame, compared to the legacy zeropad() then crop, and check that the results are identical"""
+    img = np.uint8(255 * np.random.rand(1080, 1920, 3))
+    for (name, f) in [('padcrop (interior box)', lambda im: im.padcrop(BoundingBox(xmin=800, ymin=400, width=256, height=256))),
+                      ('padcrop (boundary box)', lambda im: im.padcrop(BoundingBox(xmin=1700, ymin=-100, width=500, height=500))),
+                      ('padcrop (person box)', lambda im: im.padcrop(im.boundingbox().dilate(1.2).maxsquare().int())),
+                      ('maxsquare', lambda im: im.maxsquare()),
+                      ('maxmatte', lambda im: im.maxmatte())]:
+        (a, b) = (f(_frame(vipy.image.Scene, img)), f(_frame(LegacyScene, img)))
+        assert np.array_equal(a.array(), b.array()) and all([bba == bbb for (bba, bbb) in zip(a.objects(), b.objects())]), "'%s' differs from legacy" % name
+        result = []
+        for cls in [LegacyScene, vipy.image.Scene]:
+            t = time.time()
+            for k in range(0, n_trials):
+                f(_frame(cls, img))
+            elapsed = (time.time() - t) / n_trials
+            tracemalloc.start()
+            f(_frame(cls, img))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result.append( (elapsed, peak) )
+        print('[vipy.padcrop.benchmark]: 1080p %s, legacy=%1.2fms (peak %1.1fMB), output buffer=%1.2fms (peak %1.1fMB)' % (name, 1000*result[0][0], result[0][1]/1E6, 1000*result[1][0], result[1][1]/1E6))
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) <= 2, "python benchmark_padcrop.py $num_trials (e.g. 'python benchmark_padcrop.py 10')"
+    run(int(sys.argv[1]) if len(sys.argv)==2 else 10)
@@ -0,0 +1,51 @@
+import sys
+import io
+import time
+import pickle
+import copyreg
+import numpy as np
+import vipy.video
+import vipy.object
+import vipy.globals
+from vipy.geometry import BoundingBox
+
+
+class DefaultPickler(pickle.Pickler):
+    """Pickle vipy.video.Video and vipy.object.Track objects with the default object state, ignoring __getstate__, for comparison"""
+    def reducer_override(self, obj):
+        if isinstance(obj, (vipy.video.Video, vipy.object.Track)):
+            return (copyreg.__newobj__, (type(obj),), obj.__dict__)
+        return NotImplemented
+
+
+def meva_scene(n_tracks=100, n_keyframes=1000, n_activities=50):
+    """Create a scene that is representative of a MEVA scene, with dense per-frame track annotations and activities with raw YAML attributes"""
+    tracks = [vipy.object.Track(category='person', framerate=30, keyframes=list(range(0, n_keyframes)), boxes=[BoundingBox(xmin=k, ymin=k, width=100, height=200) for k in range(0, n_keyframes)]) for j in range(0, n_tracks)]
+    activities = [vipy.object.Activity(category='person_talks_on_phone', startframe=0, endframe=n_keyframes, framerate=30, tracks={t.id():t for t in tracks[k:k+2]},
+                                       attributes={'act':{'act2':{'person_talks_on_phone':1.0}, 'id2':k, 'timespan':[{'tsr0':[0, n_keyframes]}], 'src_status':'active'}}) for k in range(0, n_activities)]
+    return vipy.video.Scene(filename='/path/to/meva/2018-03-07.16-50-00.16-55-00.admin.G329.avi', framerate=30, tracks=tracks, activities=activities).clip(0, n_keyframes)
+
+
+def run(n_trials=5):
+    v = meva_scene()
+    for (name, dumps) in [('default', lambda v: _dumps(v, DefaultPickler)), ('compact', lambda v: _dumps(v, pickle.Pickler))]:
+        t = time.time()
+        for k in range(0, n_trials):
+            b = dumps(v)
+        t_dumps = (time.time() - t) / n_trials
+        t = time.time()
+        for k in range(0, n_trials):
+            pickle.loads(b)
+        t_loads = (time.time() - t) / n_trials
+        print('[vipy.pickle.benchmark]: %s pickle, bytes=%d, dumps=%1.1fms, loads=%1.1fms' % (name, len(b), 1000*t_dumps, 1000*t_loads))
+
+
+def _dumps(v, pickler):
+    f = io.BytesIO()
+    pickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(v)
+    return f.getvalue()
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) <= 2, "python benchmark_pickle.py $num_trials (e.g. 'python benchmark_pickle.py 5')"
+    run(int(sys.argv[1]) if len(sys.argv)==2 else 5)
@@ -0,0 +1,48 @@
+import sys
+import time
+import numpy as np
+import vipy.image
+import vipy.geometry
+import vipy.globals
+
+
+def run(n_trials=10):
+    """Time each resize and warp backend for 1080p uint8 RGB, uint8 luminance and float32 RGB inputs, and show the backend selected by vipy.globals.resize_backend('auto') and vipy.globals.warp_backend('auto')"""
+    for (name, img) in [('uint8 rgb', np.uint8(255 * np.random.rand(1080, 1920, 3))), ('uint8 lum', np.uint8(255 * np.random.rand(1080, 1920))), ('float32 rgb', np.float32(np.random.rand(1080, 1920, 3)))]:
+        for interp in ['bilinear', 'nearest']:
+            for (cols, rows) in [(640, 360), (3840, 2160)]:
+                result = []
+                for (backend, f) in vipy.image._RESIZE_BACKENDS.items():
+                    try:
+                        f(img, cols, rows, interp)
+                    except ImportError:
+                        continue
+                    t = time.time()
+                    for k in range(0, n_trials):
+                        f(img, cols, rows, interp)
+                    result.append('%s=%1.1fms' % (backend, 1000*(time.time() - t) / n_trials))
+                vipy.globals.resize_backend('auto')
+                vipy.image._resize(img, cols, rows, interp)
+                auto = vipy.image._RESIZE_AUTO[(img.dtype.str, img.shape[2] if img.ndim == 3 else 0, interp, cols*rows < img.shape[0]*img.shape[1])]
+                print('[vipy.resize.benchmark]: %s, %s, 1920x1080 -> %dx%d, %s, auto=%s' % (name, interp, cols, rows, ', '.join(result), auto))
+
+        A = vipy.geometry.similarity_transform_2x3(c=(960,540), r=0.2, s=1.2)
+        result = []
+        for (backend, f) in vipy.geometry._WARP_BACKENDS.items():
+            try:
+                f(img, A, 'bilinear')
+            except ImportError:
+                continue
+            t = time.time()
+            for k in range(0, n_trials):
+                f(img, A, 'bilinear')
+            result.append('%s=%1.1fms' % (backend, 1000*(time.time() - t) / n_trials))
+        vipy.globals.warp_backend('auto')
+        vipy.geometry.imtransform(img, A)
+        auto = vipy.geometry._WARP_AUTO[(img.dtype.str, img.shape[2] if img.ndim == 3 else 0, 'bilinear', A.shape)]
+        print('[vipy.warp.benchmark]: %s, bilinear, 1920x1080 affine, %s, auto=%s' % (name, ', '.join(result), auto))
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) <= 2, "python benchmark_resize.py $num_trials (e.g. 'python benchmark_resize.py 10')"
+    run(int(sys.argv[1]) if len(sys.argv)==2 else 10)
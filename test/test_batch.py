@@ -1,8 +1,12 @@
 import os
+import time
+import threading
+import tempfile
 import vipy.batch
 import numpy as np
 import vipy
 from vipy.image import ImageDetection
+from vipy.util import Failed
 
 rgbfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_rgb.jpg')
 
@@ -25,6 +29,135 @@ def test_batch():
     assert isinstance(res[0], vipy.image.Scene)
     print('[test_image.batch]: batch  PASSED')
 
+    imb = vipy.batch.Batch([ImageDetection(filename=rgbfile, category='face', bbox=vipy.geometry.BoundingBox(0,0,100,100)).crop() for k in range(0,10)])
+    t = imb.torch(sharedmemory=False)
+    assert np.array_equal(imb.torch(sharedmemory=True).numpy(), t.numpy()) and np.array_equal(imb.numpy(sharedmemory=True), imb.numpy(sharedmemory=False))
+    assert imb.numpy().shape == (10,100,100,3)
+    imb = vipy.batch.Batch([vipy.image.RandomImage(16,16) if k != 2 else vipy.image.RandomImage(8,8) for k in range(0,4)], ignoreErrors=True)
+    assert not imb._issameshape() and imb.numpy(sharedmemory=True).shape == (3,16,16,3) and [f.index() for f in imb.failures()] == [2]  # failed rows removed
+    try:
+        vipy.batch.Batch(imb.batch()).numpy(sharedmemory=True)
+        raise Failed()
+    except AssertionError:
+        pass
+    print('[test_image.batch]: sharedmemory  PASSED')
+
+    b = vipy.batch.Batch(list(range(0,20)), n_processes=2)
+    assert list(b.imap(lambda x: x*x, window=3)) == [x*x for x in range(0,20)]
+    assert sorted(b.imap_unordered(lambda x: x*x, window=3)) == [x*x for x in range(0,20)]
+    assert b.batch() == list(range(0,20))
+    print('[test_image.batch]: imap  PASSED')
+
+    for chunksize in [7, 'auto']:
+        b = vipy.batch.Batch([str(k) for k in range(0,50)], n_processes=2, chunksize=chunksize)
+        assert b.map(lambda x: x+'a').batch() == [str(k)+'a' for k in range(0,50)]  # same type results replace the batch
+        assert b.map(lambda x,y: len(x)+y, args=[(k,) for k in range(0,50)]) == [len(str(k))+1+k for k in range(0,50)]
+        assert b.filter(lambda x: len(x) == 3).batch() == [str(k)+'a' for k in range(10,50)]
+        assert b.product(lambda x,y: x+y, args=[('b',),('c',)]).batch() == [str(k)+'a'+y for k in range(10,50) for y in ('b','c')]
+    b = vipy.batch.Batch([str(k) for k in range(0,6)], n_processes=2, backend='process', chunksize='auto', ignoreErrors=True)
+    assert b.map(lambda x: int(x) if x != '1' else __import__('threading').Lock()) == [0,2,3,4,5] and [f.index() for f in b.failures()] == [1]  # unpicklable result fails the timed task
+    vipy.globals.executor(backend='process').shutdown()
+    imb = vipy.batch.Batch([ImageDetection(filename=rgbfile, category='face', bbox=vipy.geometry.BoundingBox(0,0,100,100)) for k in range(0,10)], chunksize=4)
+    assert imb.category() == ['face']*10
+    print('[test_image.batch]: chunksize  PASSED')
+
+    for backend in ['process', 'thread']:
+        imb = vipy.batch.Batch([ImageDetection(filename=rgbfile, category='face', bbox=vipy.geometry.BoundingBox(0,0,100,100)) for k in range(0,10)], n_processes=2, backend=backend)
+        assert imb.crop().map(lambda im: im.shape()) == [(100,100)]*10
+        assert list(imb.imap(lambda im: im.category(), window=2)) == ['face']*10
+        assert sorted(imb.chunksize(3).imap_unordered(lambda im: im.width())) == [100]*10 and imb.category() == ['face']*10
+    for backend in ['process', 'thread']:
+        e = vipy.globals.executor(backend=backend)
+        t = time.time()
+        f = e.submit(lambda x, y: x+y, e.submit(lambda: (time.sleep(0.5), 'a')[1]), e.submit(lambda: 'b'))
+        assert time.time() - t < 0.4 and f.result() == 'ab'  # future arguments are chained, not resolved when submitted
+        assert isinstance(e.submit(lambda x: x, e.submit(lambda: int('x'))).exception(), ValueError)
+    vipy.globals.executor(backend='process').shutdown()
+    vipy.globals.executor(backend='thread').shutdown()
+    print('[test_image.batch]: backend  PASSED')
+
+    b = vipy.batch.Batch([str(k) for k in range(0,8)], n_processes=2, backend='auto')
+    assert b.map(lambda x: (time.sleep(0.05), os.getpid())[1]) == [os.getpid()]*8  # profiled as I/O bound, thread pool in this process
+    assert os.getpid() not in b.map(lambda x: (sum(range(5000000)), os.getpid())[1])[1:]  # profiled as CPU bound, process pool
+    assert vipy.globals.executor(backend='process')._pool._mp_context.get_start_method() != 'fork'  # workers are not forked from a process with a running thread pool
+    assert os.getpid() not in b.map(lambda x: os.getpid(), iobound=False) and list(b.imap(lambda x: os.getpid(), iobound=True)) == [os.getpid()]*8
+    assert sorted(b.imap_unordered(lambda x: x+'a', window=3)) == sorted([str(k)+'a' for k in range(0,8)])
+    vipy.globals.executor(backend='process').shutdown()
+    vipy.globals.executor(backend='thread').shutdown()
+    print('[test_image.batch]: backend=auto  PASSED')
+
+    b = vipy.batch.Batch([str(k) for k in range(0,8)], n_processes=4, backend='thread', memory=2)
+    t = time.time()
+    assert b.map(lambda x: (time.sleep(0.1), x)[1], memory=1).batch() == [str(k) for k in range(0,8)]
+    assert time.time() - t > 0.4  # at most two tasks in flight
+    b = vipy.batch.Batch([vipy.image.RandomImage(16,16) for k in range(0,4)], n_processes=2, backend='thread', memory=16*16*3)
+    assert b.map(lambda im: im.nbytes()) == [16*16*3]*4
+    imlist = [vipy.image.RandomImage(16,16) for k in range(0,4)]
+    (client, nbytes) = ([], imlist[0].nbytes)
+    for im in imlist:
+        im.nbytes = lambda: (client.append(threading.current_thread() is threading.main_thread()), nbytes())[1]
+    b = vipy.batch.Batch(imlist, n_processes=2, backend='thread', memory=16*16*3)
+    t = time.time()
+    assert b.map(lambda im: (time.sleep(0.1), im.shape())[1]) == [(16,16)]*4
+    assert time.time() - t > 0.35 and client.count(True) == 1 and len(client) >= 4  # one task in flight, estimated on the client for the first chunk only, then by the workers
+    calls = []
+    b = vipy.batch.Batch([str(k) for k in range(0,4)], n_processes=2, backend='thread', memory=2, ignoreErrors=True)
+    assert b.map(lambda x: (calls.append(x), int(x) if (x != '2' or calls.count('2') > 1) else (_ for _ in ()).throw(MemoryError()))[1], memory=1) == [0,1,2,3]  # out of memory, retried alone
+    assert calls.count('2') == 2 and len(b.failures()) == 0
+    vipy.globals.executor(backend='thread').shutdown()
+    print('[test_image.batch]: memory  PASSED')
+
+    b = vipy.batch.Batch([str(k) for k in range(0,6)], n_processes=2, ignoreErrors=True)
+    assert b.map(lambda x: int(x) if x != '3' else int('x')) == [0,1,2,4,5]
+    assert len(b.failures()) == 1 and b.failures()[0].index() == 3 and b.failures()[0].element() == '3' and isinstance(b.failures()[0].exception(), ValueError)
+    assert b.filter(lambda x: int(x) % 2 == 0 if x != '4' else int('x')).batch() == ['0', '2'] and b.failures()[0].index() == 4
+    try:
+        vipy.batch.Batch([str(k) for k in range(0,6)], n_processes=2).map(lambda x: int('x'))
+        raise Failed()
+    except ValueError:
+        pass
+    b = vipy.batch.Batch([str(k) for k in range(0,4)], n_processes=2, backend='thread', ignoreErrors=True, retries=2, backoff=0.01, timeout=1)
+    assert b.map(lambda x: (time.sleep(10) if x == '1' else x+'a')).batch() == ['0a', '2a', '3a'] and isinstance(b.failures()[0].exception(), TimeoutError)
+    assert b.map(lambda x: (_ for _ in ()).throw(OSError('transient'))) == [] and all([f.attempts() == 3 for f in b.failures()])
+    vipy.globals.executor(backend='thread').shutdown()
+    b = vipy.batch.Batch([str(k) for k in range(0,6)], n_processes=2, backend='process', chunksize=2, ignoreErrors=True)
+    assert b.filter(lambda x: __import__('threading').Lock() if x == '3' else int(x) % 2 == 0).batch() == ['0', '4']  # unpicklable result fails the whole chunk outside the policy
+    assert [(f.index(), f.element()) for f in b.failures()] == [(2, '2'), (3, '3')]
+    vipy.globals.executor(backend='process').shutdown()
+    print('[test_image.batch]: ignoreErrors  PASSED')
+
+    dbfile = os.path.join(vipy.util.tempdir(), 'vipy_test_batch_checkpoint_%d.db' % os.getpid())
+    calls = []
+    b = vipy.batch.Batch([str(k) for k in range(0,6)], n_processes=2, backend='thread', ignoreErrors=True)
+    assert b.map(lambda x: (calls.append(x), int(x) if x != '3' else int('x'))[1], checkpoint=dbfile) == [0,1,2,4,5] and isinstance(b.failures()[0].exception(), ValueError)
+    assert b.map(lambda x: (calls.append(x), int(x))[1], checkpoint=dbfile) == [0,1,2,3,4,5] and calls.count('3') == 2 and len(calls) == 7  # resumed, failed element only
+    assert b.map(lambda x: (_ for _ in ()).throw(SystemExit(1)) if x == '2' else x, checkpoint=dbfile+'.exit').batch() == ['0', '1', '3', '4', '5'] and isinstance(b.failures()[0].exception(), SystemExit)  # raised outside the policy
+    assert b.failures()[0].index() == 2 and b.failures()[0].element() == '2'
+    os.remove(dbfile)
+    os.remove(dbfile+'.exit')
+    vipy.globals.executor(backend='thread').shutdown()
+    print('[test_image.batch]: checkpoint  PASSED')
+
+    from distributed import SpecCluster, Scheduler, Nanny
+    caches = [tempfile.mkdtemp() for k in range(0,3)]  # one VIPY_CACHE per local worker standing in for a node
+    cluster = SpecCluster(scheduler={'cls':Scheduler, 'options':{'port':0, 'dashboard_address':None}}, workers={'node%d' % k:{'cls':Nanny, 'options':{'nthreads':1, 'env':{'VIPY_CACHE':caches[k]}}} for k in range(0,3)})
+    (cache, _) = (os.environ.get('VIPY_CACHE'), vipy.globals.cache(caches[0]))
+    for k in range(0,6):
+        open(os.path.join(caches[k % 3], 'video_%d.mp4' % k), 'w').close()
+    vipy.globals.dask(address=cluster.scheduler_address)
+    assert vipy.globals.dask().isremote() and vipy.globals.num_workers() == 3
+    b = vipy.batch.Batch([vipy.video.Video(filename=os.path.join(caches[0], 'video_%d.mp4' % k)) for k in range(0,6)], n_processes=2)
+    assert b.map(lambda v: os.environ['VIPY_CACHE']) == [caches[k % 3] for k in range(0,6)]  # each element runs on the node with the file
+    hascache = b._locations[2]
+    assert b.map(lambda v: os.environ['VIPY_CACHE']) == [caches[k % 3] for k in range(0,6)] and b._locations[2] is hascache  # workers are checked once per batch
+    vipy.globals.dask().shutdown()
+    cluster.close()
+    if cache is not None:
+        vipy.globals.cache(cache)
+    else:
+        os.environ.pop('VIPY_CACHE')
+    print('[test_image.batch]: locality  PASSED')
+
 if __name__ == "__main__":
     test_batch()
     
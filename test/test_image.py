@@ -1,6 +1,10 @@
 import os
+import importlib.util
 import numpy as np
 import vipy.image
+import vipy.video
+import vipy.geometry
+import vipy.globals
 from vipy.image import ImageDetection, Image, ImageCategory, Scene
 from vipy.object import Detection
 from vipy.util import tempjpg, temppng, tempdir, Failed
@@ -754,9 +758,184 @@ def test_scene():
     
 
 
+
+def test_lazy():
+    for f in [lambda im: im.centersquare().fliplr().zeropad(3,4).lum(), lambda im: im.fliplr().maxsquare().rescale(0.5), lambda im: im.resize(300,200).centercrop(100,150).resize(60,40).fliplr().grey()]:
+        im = f(Image(filename=rgbfile).lazy())
+        assert not im.isloaded() and im.shape() == f(Image(filename=rgbfile)).shape()
+        assert np.allclose(im.load().array(), f(Image(filename=rgbfile)).array(), atol=8)  # fused resizes within interpolation rounding
+    im = ImageDetection(filename=rgbfile, xmin=10, ymin=10, width=100, height=100).lazy().crop().mindim(32)
+    assert not im.isloaded() and im.boundingbox() == BoundingBox(0,0,32,32) and im.numpy().shape == (32,32,3)
+    for im in [Scene(filename=rgbfile, objects=[Detection('obj', xmin=30, ymin=40, xmax=130, ymax=120)]).lazy().zeropad(10,20), ImageDetection(filename=rgbfile, xmin=30, ymin=40, xmax=130, ymax=120).lazy().zeropad(10,20)]:
+        bb = lambda im: (im.objects()[0] if isinstance(im, Scene) else im.boundingbox()).ulbr()
+        assert np.allclose(bb(im), (40,60,140,140)) and not im.isloaded()
+        assert np.allclose(bb(im.load()), (40,60,140,140))  # replaying the pad must not translate the objects again
+        assert im.shape() == Image(filename=rgbfile).zeropad(10,20).shape()
+    print('[test_image.lazy]: PASSED')
+
+    for d in [64, 200]:
+        (a, b) = (Image(filename=rgbfile).load(maxdim=d), Image(filename=rgbfile).load().maxdim(d))  # JPEG draft decoding
+        assert a.shape() == b.shape() and np.mean(np.abs(a.array().astype(np.float32) - b.array())) < 8
+    im = ImageDetection(filename=rgbfile, xmin=100, ymin=100, width=200, height=200).load(mindim=100)
+    assert im.isloaded() and min(im.shape()) == 100 and im.boundingbox().width() < 200
+    print('[test_image.lazy]: draft PASSED')
+
+
+def test_colorspace():
+    img = vipy.image.RandomImage(64, 80).array()
+    orig = np.copy(img)
+    for (src, dst) in [(s, d) for s in ['rgb', 'rgba', 'bgr', 'bgra', 'hsv', 'lum', 'grey'] for d in ['rgb', 'rgba', 'bgr', 'bgra', 'hsv', 'lum', 'grey', 'float']]:
+        im = Image(array=img, colorspace='rgb')._convert(src)
+        a = np.copy(im.array())
+        assert im._convert(dst).colorspace() == dst and np.array_equal(img, orig)  # never in place
+        assert im.array().dtype == (np.uint8 if dst not in ['grey', 'float'] else np.float32) and im.channels() == {'rgba':4, 'bgra':4, 'lum':1, 'grey':1, 'float':a.shape[2] if a.ndim == 3 else 1}.get(dst, 3)
+    assert vipy.image._colorspace_path('bgra', 'grey') == [('bgra', 'bgr'), ('bgr', 'lum'), ('lum', 'grey')]
+    assert np.array_equal(Image(array=img, colorspace='rgb').bgra().rgb().array(), img) and np.array_equal(Image(array=img, colorspace='rgb').lum().array(), np.array(PIL.Image.fromarray(img).convert('L')))
+    assert np.array_equal(Image(array=img, colorspace='rgb').hsv().bgr().array(), np.array(PIL.Image.fromarray(np.array(PIL.Image.fromarray(img).convert('HSV')), mode='HSV').convert('RGB'))[:,:,::-1])
+    for im in [Image(array=img, colorspace='rgb'), Image(array=img, colorspace='rgb').lum(), Image(array=img, colorspace='rgb').grey()]:
+        x = im.numpy(mean=0.5, std=0.25, scale=1.0/255.0 if im.array().dtype == np.uint8 else 1.0)
+        assert x.shape == im.numpy().shape and x.dtype == np.float32 and np.allclose(x, (im.numpy()*(1.0/255.0 if im.array().dtype == np.uint8 else 1.0) - 0.5) / 0.25, atol=1E-5)  # HxW greyscale stays HxW
+    print('[test_image.colorspace]: PASSED')
+
+    
+def test_imagebatch():
+    ims = [vipy.image.RandomImageDetection(64, 80) for k in range(0,8)]
+    imb = vipy.image.ImageBatch(ims)
+    assert len(imb) == 8 and imb.array().shape == (8,64,80,3) and imb.array().flags['C_CONTIGUOUS']
+    assert all([np.array_equal(a.array(), b.array()) and a.category() == b.category() for (a,b) in zip(imb.images(), ims)])
+    print('[test_image.imagebatch]: images PASSED')
+
+    for f in [lambda im: im.lum(), lambda im: im.bgr(), lambda im: im.float(), lambda im: im.lum().rgb(), lambda im: im.bgr().lum()]:
+        assert all([np.array_equal(a.array(), f(b.clone()).array()) for (a,b) in zip(f(vipy.image.ImageBatch(ims)), ims)])
+    print('[test_image.imagebatch]: colorspace PASSED')
+
+    for f in [lambda im: im.fliplr(), lambda im: im.resize(40, 32, interp='nearest'), lambda im: im.resize(100, 128, interp='bilinear'), lambda im: im.resize(90, 50, interp='bicubic')]:
+        for (a,b) in zip(f(vipy.image.ImageBatch(ims)), [f(im.clone()) for im in ims]):
+            assert a.shape() == b.shape() and np.max(np.abs(a.array().astype(np.int32) - b.array().astype(np.int32))) <= 2  # same filter as PIL, within rounding
+            assert a.boundingbox().iou(b.boundingbox()) > 0.99
+    for (a,b) in zip(vipy.image.ImageBatch(ims).centercrop(32, 40), ims):
+        assert np.array_equal(a.array(), b.clone().centercrop(32, 40).array()) and a.boundingbox() == b.boundingbox().clone().translate(-20, -16)
+    print('[test_image.imagebatch]: geometry PASSED')
+
+    t = vipy.image.ImageBatch(ims).torch()
+    assert tuple(t.shape) == (8,3,64,80) and np.array_equal(t[2].numpy(), ims[2].torch()[0].numpy())
+    assert np.allclose(vipy.image.ImageBatch(ims).torch(mean=0.5, std=0.25).numpy(), vipy.image.ImageBatch(ims).normalize(mean=0.5, std=0.25, scale=1.0/255.0).torch().numpy())
+    print('[test_image.imagebatch]: torch PASSED')
+
+
+def test_crops():
+    img = np.uint8(255 * np.random.rand(64, 80, 3))
+    im = vipy.image.Scene(array=img, colorspace='rgb', objects=[vipy.object.Detection('a', xmin=10, ymin=20, width=32, height=16), vipy.object.Detection('b', xmin=-8, ymin=-4, width=32, height=16)])
+    for interp in ['bilinear', 'nearest']:
+        c = im.crops((16, 32), interp=interp)
+        assert c.shape == (2,16,32,3) and c.dtype == np.uint8
+        assert np.array_equal(c[0], img[20:36, 10:42]) and np.array_equal(c[0], im.clone().padcrop(im.objects()[0].clone()).array())  # pixel aligned
+        assert np.array_equal(c[1], im.clone().padcrop(im.objects()[1].clone()).array())  # zero outside image rectangle
+    assert im.clone().lum().crops((8,8), dilate=1.2, squareify=True).shape == (2,8,8)
+    print('[test_image.crops]: image PASSED')
+
+    v = vipy.video.RandomScene(64, 64, 32)
+    chips = v.crops((8, 8))
+    assert set(chips.keys()) == set(v.tracks().keys()) and all([c.shape == (len([k for k in range(0, len(v)) if v.tracks()[tid][k] is not None]), 8, 8, 3) for (tid, c) in chips.items()])
+    print('[test_image.crops]: video PASSED')
+
+
+def test_backends():
+    im = vipy.image.RandomImage(120, 90)
+    for interp in ['bilinear', 'bicubic', 'nearest']:
+        for (cols, rows) in [(50, 70), (200, 260)]:
+            imlist = [im.clone().resize(cols, rows, interp=interp) for b in ['pil', 'numpy', 'auto'] if vipy.globals.resize_backend(b)]
+            assert all([x.shape() == (rows, cols) and np.max(np.abs(x.array().astype(np.int32) - imlist[0].array().astype(np.int32))) <= 2 for x in imlist])
+    vipy.globals.resize_backend('pil')
+    print('[test_image.backends]: resize PASSED')
+
+    A = vipy.geometry.similarity_transform_2x3(c=(45,60), r=0.3, s=1.4)
+    backend = vipy.globals.warp_backend()
+    assert backend == ('cv2' if importlib.util.find_spec('cv2') is not None else 'numpy')  # cv2 is optional
+    imlist = [vipy.geometry.imtransform(im.array(), A) for b in [backend, 'pil', 'numpy', 'auto'] if vipy.globals.warp_backend(b)]
+    assert all([x.shape == im.array().shape and np.max(np.abs(x.astype(np.int32) - imlist[0].astype(np.int32))[2:-2,2:-2]) <= 2 for x in imlist])
+    vipy.globals.warp_backend(backend)
+    print('[test_image.backends]: warp PASSED')
+
+
+def test_imagecache():
+    f = tempjpg()
+    vipy.image.RandomImage(48, 64).saveas(f)
+    c = vipy.globals.imagecache(48*64*3 + 24*32*3 + 100)
+    (a, b) = (Image(filename=f).load(), Image(filename=f).load())
+    assert a.array() is b.array() and not a.array().flags.writeable and c.stats()['hits'] == 1 and c.stats()['misses'] == 1
+    assert a.numpy().flags.writeable and a.array() is not b.array()  # copy on write
+    assert ImageDetection(filename=f, xmin=1, ymin=2, width=10, height=12).setzero().numpy().sum() > 0 and b.array().flags.writeable is False
+    print('[test_image.imagecache]: hit PASSED')
+
+    assert Image(filename=f).lazy().mindim(24).load().shape() == (24, 32) and len(c) == 2 and c.stats()['misses'] == 2  # decode params
+    assert Image(filename=f).lazy().mindim(24).load().shape() == (24, 32) and c.stats()['misses'] == 2
+    Image(filename=f).lazy().maxdim(24).load()
+    assert len(c) == 2 and c.stats()['evictions'] == 1 and c.nbytes() <= c.maxbytes()  # least recently used
+    g = tempjpg()
+    vipy.image.RandomImage(96, 128).saveas(g)
+    im = Image(filename=g).load()
+    im.array()[0:2] = 0
+    assert im.array().flags.writeable and len(c) == 2 and im.array()[0:2].sum() == 0  # larger than the budget, not cached and not read-only
+    vipy.globals.imagecache(0)
+    assert vipy.globals.imagecache() is None and Image(filename=f).load().array().flags.writeable
+    print('[test_image.imagecache]: eviction PASSED')
+
+
+def test_tiles():
+    img = np.uint8(255 * np.random.rand(300, 500, 3))
+    im = Scene(array=img, colorspace='rgb', objects=[Detection('car', xmin=100, ymin=50, width=60, height=40, confidence=0.9)])
+    levels = list(im.pyramid((1.0, 0.5, 0.25)))
+    assert [l.shape() for l in levels] == [(300,500), (150,250), (75,125)] and levels[0].array() is img and levels[2].objects()[0] == Detection('car', xmin=25, ymin=12.5, width=15, height=10)
+    assert np.max(np.abs(levels[2].array().astype(np.int32) - im.clone().rescale(0.5).rescale(0.5).array().astype(np.int32))) == 0  # incremental
+    print('[test_image.tiles]: pyramid PASSED')
+
+    tiles = list(im.tiles((128, 128), overlap=32))
+    assert len(tiles) == 3*5 and all([t.shape() == (128,128) and np.shares_memory(t.array(), img) for t in tiles])
+    assert np.array_equal(tiles[-1].array(), img[172:300, 372:500]) and tiles[-1].getattribute('tile') == (372, 172, 1.0)
+    assert tiles[1].objects()[0] == Detection('car', xmin=4, ymin=50, width=60, height=40)
+    print('[test_image.tiles]: tiles PASSED')
+
+    dets = vipy.image.mergetiles([t for l in levels for t in l.tiles((128, 128), overlap=32)])
+    assert len(dets) == 1 and dets[0] == im.objects()[0]
+    assert list(vipy.geometry.nms(np.array([[0,0,10,10], [1,1,11,11], [20,20,30,30]]), [0.5, 0.9, 0.1])) == [1,2]
+    print('[test_image.tiles]: merge PASSED')
+
+
+def test_affine():
+    A = vipy.geometry.random_affine_transforms(4, txy=((-4,4),(-4,4)), r=(-0.2,0.2), sx=(0.8,1.2), sy=(0.8,1.2), kx=(-0.1,0.1), ky=(-0.1,0.1), c=(32,24))
+    assert A.shape == (4,3,3) and np.allclose(A[:,2], [0,0,1])
+    assert np.allclose(vipy.geometry.transform_boxes(np.array([[2,0,1], [0,3,2]]), [[0,0,10,20]]), [[1,2,21,62]])
+    imgs = (np.random.rand(3, 640, 480, 3)*255).astype(np.uint8)  # more than one 64MB chunk
+    B = vipy.geometry.random_affine_transforms(3, txy=((-4,4),(-4,4)), r=(-0.2,0.2), sx=(0.8,1.2), sy=(0.8,1.2), kx=(-0.1,0.1), ky=(-0.1,0.1), c=(240,320))
+    assert (2**26) // vipy.geometry._warp_numpy_nbytes(640, 480, 3) < 3 and np.array_equal(vipy.geometry.imtransforms(imgs, B), np.stack([vipy.geometry.imtransform(im, b) for (im, b) in zip(imgs, B)]))
+    print('[test_image.affine]: transforms PASSED')
+
+    ims = [vipy.image.RandomScene(48, 64) for k in range(0,4)]
+    out = np.zeros((4,48,64,3), dtype=np.uint8)
+    imb = vipy.image.ImageBatch(ims).affine(A, interp='nearest', out=out)
+    assert imb.array() is out and all([np.array_equal(out[k], vipy.geometry.imtransform(ims[k].array(), A[k], interp='nearest')) for k in range(0,4)])
+    assert all([np.allclose(a.objects()[j].ulbr(), vipy.geometry.transform_boxes(A[k], [b.objects()[j].ulbr()])[0]) for (k, (a, b)) in enumerate(zip(imb, ims)) for j in range(0, len(b))])
+    assert vipy.image.ImageBatch(ims).randomaffine().array().shape == (4,48,64,3)
+    print('[test_image.affine]: batch PASSED')
+
+    v = vipy.video.RandomScene(64, 64, 32)
+    (frames, boxes) = (np.copy(v.array()), {k:t[0].clone() for (k,t) in v.tracks().items()})
+    v.affine(A[0])
+    assert np.array_equal(v.array()[3], vipy.geometry.imtransform(frames[3], A[0])) and all([np.allclose(v.tracks()[k][0].ulbr(), vipy.geometry.transform_boxes(A[0], [bb.ulbr()])[0]) for (k,bb) in boxes.items()])
+    print('[test_image.affine]: video PASSED')
+
     
 if __name__ == "__main__":
     test_image()
     test_imagedetection()
     test_scene()
+    test_lazy()
+    test_colorspace()
+    test_imagebatch()
+    test_crops()
+    test_backends()
+    test_imagecache()
+    test_tiles()
+    test_affine()
     
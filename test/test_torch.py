@@ -0,0 +1,48 @@
+import os
+import numpy as np
+import torch
+import vipy.torch
+import vipy.video
+import vipy.util
+from vipy.image import ImageDetection
+
+rgbfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_rgb.jpg')
+
+
+def test_dataset():
+    imlist = [ImageDetection(filename=rgbfile, category='face', bbox=vipy.geometry.BoundingBox(0,0,100,100)) for k in range(0,10)] + [ImageDetection(filename='/invalid/file.jpg', category='face')]
+    d = vipy.torch.ImageDataset(imlist, transform=lambda im: im.crop().torch(dtype=torch.float32).squeeze(0), label=lambda im: im.category())
+    x = list(d)
+    assert len(x) == 10 and x[0][0].shape == (3,100,100) and x[0][1] == 'face'
+    assert d.stats()['skipped'] == 1 and not imlist[0].isloaded()
+    print('[test_torch.dataset]: ImageDataset  PASSED')
+
+    assert [tuple(x.shape) for (x,y) in torch.utils.data.DataLoader(d, batch_size=5, num_workers=2)] == [(5,3,100,100), (5,3,100,100)]
+    print('[test_torch.dataset]: DataLoader  PASSED')
+    
+    vidlist = [vipy.video.RandomScene(64,64,32) for k in range(0,7)]
+    d = vipy.torch.VideoDataset(vidlist, transform=lambda v: v.torch(startframe='random', length=8), label=lambda v: v.category(), shuffle=True, world_size=2, rank=0)
+    assert len(list(d)) == 4 and list(d)[0][0].shape == (8,3,64,64)
+    assert sorted(vipy.torch.VideoDataset(vidlist, shuffle=True, world_size=2, rank=1).index().tolist() + d.index().tolist()) == list(range(0,7))
+    print('[test_torch.dataset]: VideoDataset  PASSED')
+
+
+def test_clipindex():
+    vidlist = [vipy.video.RandomSceneActivity(64,64,50), vipy.video.RandomSceneActivity(64,64,32)]
+    d = vipy.torch.ClipIndex(vidlist, length=8, stride=4)
+    assert len(d) == 11+7 and d.windows()[11].tolist() == [1,0,8] and d.categories() == ['Person Carrying']
+    a = vidlist[0].activitylist()[0]
+    assert all([l[0] == (s < a.endframe() and e > a.startframe()) for ((k,s,e), l) in zip(d.windows(), d.labels()) if k == 0])
+    clips = list(d)
+    assert len(clips) == len(d) and np.allclose(clips[12][0].numpy(), vidlist[1].array()[4:12].transpose(0,3,1,2) / 255.0)
+    print('[test_torch.clipindex]: ClipIndex  PASSED')
+
+    outfile = vipy.util.temppkl().replace('.pkl', '.npz')
+    d.save(outfile)
+    assert np.all(vipy.torch.ClipIndex(vidlist, indexfile=outfile).windows() == d.windows())
+    print('[test_torch.clipindex]: save  PASSED')
+
+
+if __name__ == "__main__":
+    test_dataset()
+    test_clipindex()
@@ -3,7 +3,7 @@ import numpy as np
 import vipy.video
 import vipy.videosearch
 import vipy.object
-from vipy.util import tempjpg, tempdir, Failed, isurl, rmdir, totempdir
+from vipy.util import tempjpg, tempdir, Failed, isurl, rmdir, totempdir, tempMP4
 from vipy.geometry import BoundingBox
 import pdb
 from vipy.dataset.kinetics import Kinetics400, Kinetics600, Kinetics700
@@ -11,6 +11,8 @@ from vipy.dataset.activitynet import ActivityNet
 from vipy.dataset.lfw import LFW
 from vipy.object import Detection, Track, Activity
 import shutil
+import pickle
+import vipy.globals
 
 
 mp4file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Video.mp4')
@@ -368,6 +370,85 @@ def test_track():
     assert d.xmin() == 1 and d.ymin() == 1
     print('[test_video.track]: interpolation  PASSED')
 
+    assert pickle.loads(pickle.dumps(t)).dict() == t.dict()
+    v = vipy.video.RandomSceneActivity()
+    vp = pickle.loads(pickle.dumps(v))
+    assert vp._ffmpeg_commandline() == v._ffmpeg_commandline() and np.array_equal(vp.array(), v.array())
+    assert all([vp.tracks()[k].dict() == t.dict() for (k,t) in v.tracks().items()])
+    vipy.globals.pickle_arrays(False)
+    assert not pickle.loads(pickle.dumps(v)).isloaded() and v.clone().isloaded()
+    vipy.globals.pickle_arrays(True)
+    print('[test_video.track]: pickle  PASSED')
+
+    
+def test_torch():
+    v = vipy.video.RandomVideo(64,64,32)
+    t = v.torch()
+    assert t.shape == (32,3,64,64) and np.allclose(t[4].numpy(), v.array()[4].transpose(2,0,1)/255.0)
+    (t, s) = v.torch(startframe=30, length=8, withslice=True)
+    assert s == (30,38,1) and t.shape == (8,3,64,64) and np.allclose(t[7].numpy(), t[1].numpy())  # boundary='repeat'
+    assert v.torch(stride=4, order='nhwc').shape == (8,64,64,3)
+    try:
+        v.torch(startframe=30, length=8, boundary='strict')
+        raise Failed()
+    except Failed:
+        raise
+    except:
+        pass
+    print('[test_video.video]: torch()  PASSED')
+
+    t = v.totensor(mean=[0.5,0.5,0.5], std=[0.25,0.25,0.25])
+    assert t.shape == (32,3,64,64) and np.allclose(t[3].numpy(), ((v.array()[3]/255.0 - 0.5) / 0.25).transpose(2,0,1), atol=1E-5)
+    assert v.totensor(out=t, order='nchw') is t and np.allclose(t.numpy(), v.torch().numpy())
+    vn = v.clone().normalize(mean=0.5, std=0.25, scale=1.0/255.0)
+    assert vn.colorspace() == 'float' and vn.array().dtype == np.float32 and np.allclose(vn.array(), (v.array()/255.0 - 0.5) / 0.25, atol=1E-5)
+    print('[test_video.video]: totensor()  PASSED')
+
+    storefile = os.path.join(tempdir(), 'test_video.frames')
+    for f in [storefile, storefile+'.json']:
+        if os.path.exists(f):
+            os.remove(f)
+    store = vipy.video.FrameStore(storefile).add(v, key='random')
+    assert 'random' in store and len(store) == 1 and store.filesize() == v.array().nbytes
+    vs = vipy.video.RandomVideo(64,64,32).from_framestore(storefile, key='random')
+    assert np.array_equal(vs.array(), v.array()) and not vs.array().flags.writeable
+    print('[test_video.video]: framestore  PASSED')
+
+
+def test_torch_decode():
+    f = vipy.video.RandomVideo(64,64,32).saveas(tempMP4()).filename()
+    for v in [vipy.video.Video(f), vipy.video.Scene(f), vipy.video.Video(f).framerate(10), vipy.video.Video(f).clip(4,30), vipy.video.Video(f).framerate(10).clip(2,12)]:
+        n = len(v.clone(flushforward=True).load())
+        for offset in [0, 1, -1]:
+            v.framecount = lambda n=n+offset: n  # probed frame count without ffprobe, which may be off by one
+            for kwargs in [dict(), dict(stride=2), dict(startframe=2, length=5), dict(startframe=3, endframe=8), dict(take=3), dict(startframe=1, stride=3), dict(startframe=n-3, length=6)]:
+                (vc, tl) = (v.clone(), v.clone().load().torch(**kwargs))
+                t = vc.torch(**kwargs)
+                assert t.shape == tl.shape and np.array_equal(t.numpy(), tl.numpy())
+                assert vc.isloaded() == (offset != 0 or v._startframe is not None)  # decoded only the slice, or loaded for a clip or a wrong frame count
+        assert v.clone().torch(startframe='random', length=4).shape == (4,3,64,64)
+    for kwargs in [dict(), dict(stride=3), dict(take=5)]:
+        (t, tl) = (vipy.video.Video(f).torch(**kwargs), vipy.video.Video(f).load().torch(**kwargs))  # framecount() from ffprobe, if installed
+        assert t.shape == tl.shape and np.array_equal(t.numpy(), tl.numpy())
+    print('[test_video.video]: torch() decode  PASSED')
+
+
+def test_stream():
+    f = vipy.video.RandomVideo(64,64,32).saveas(tempMP4()).filename()
+    storefile = os.path.join(tempdir(), 'test_video_stream.frames')
+    for g in [storefile, storefile+'.json']:
+        if os.path.exists(g):
+            os.remove(g)
+    for v in [vipy.video.Video(f), vipy.video.Video(f).clip(4,20).mindim(32)]:
+        frames = v.clone().load().array()
+        ringbuffer = np.zeros( (3,)+frames.shape[1:], dtype=np.uint8)
+        assert np.array_equal(np.stack([np.copy(im) for im in v.clone().stream(ringbuffer=ringbuffer)]), frames)  # decoded from the ffmpeg pipe into the ring buffer
+        assert np.array_equal(ringbuffer[(len(frames)-1) % 3], frames[-1]) and np.array_equal(np.stack([np.copy(im) for im in v.clone().stream()]), frames)
+        store = vipy.video.FrameStore(storefile).add(v.clone())
+        assert v.clone() in store and np.array_equal(v.clone().from_framestore(store).array(), frames)
+    assert len(vipy.video.FrameStore(storefile)) == 2
+    print('[test_video.video]: stream() ringbuffer and framestore  PASSED')
+
     
 def test_scene_union():
     
@@ -420,5 +501,8 @@ def test_scene_union():
 if __name__ == "__main__":
     test_video()
     test_track()
+    test_torch()
+    test_torch_decode()
+    test_stream()
     _test_scene()
     test_scene_union()
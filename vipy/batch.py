@@ -2,15 +2,184 @@ import os
 import sys
 from vipy.util import try_import, islist, tolist, tempdir, remkdir
 from itertools import repeat
-try_import('dask', 'dask distributed torch')
-from dask.distributed import as_completed, wait
-try_import('torch', 'torch');  import torch
+from collections import deque
 import numpy as np
+import concurrent.futures
 import tempfile
+import time
 import warnings
+import threading
+import traceback
+import hashlib
 import vipy.globals
 
 
+# Methods that are I/O or subprocess bound, which are run in the thread pool for Batch(..., backend='auto')
+IOBOUND = ['download', 'fetch', 'load', 'save', 'saveas', 'saveastmp', 'savetmp', 'savefig', 'thumbnail', 'preview']
+
+
+class Failure(object):
+    """vipy.batch.Failure class
+
+    A failed element of a batch operation with Batch(..., ignoreErrors=True), containing the exception, the formatted traceback, the number of attempts, and the index and element of the batch that failed (if known).
+    
+    >>> b = vipy.batch.Batch(videos, ignoreErrors=True, retries=2, timeout=600)
+    >>> b.map(lambda v: v.download().save())   # videos that were downloaded
+    >>> b.failures()  # list of vipy.batch.Failure for the videos that failed after all retries
+    """
+    def __init__(self, exception, traceback=None, attempts=1, index=None, element=None):
+        self._exception = exception
+        self._traceback = traceback
+        self._attempts = attempts
+        self._index = index
+        self._element = element
+
+    def __repr__(self):
+        return str('<vipy.batch.failure: %sexception=%s, attempts=%d>' % ('index=%d, ' % self._index if self._index is not None else '', repr(self._exception), self._attempts))
+
+    def exception(self):
+        return self._exception
+
+    def traceback(self):
+        return self._traceback
+
+    def attempts(self):
+        return self._attempts
+
+    def index(self):
+        return self._index
+
+    def element(self):
+        return self._element
+
+
+class _Policy(object):
+    """Call f_lambda with a per-call timeout, retries with exponential backoff for transient errors (OSError, including network errors), and return a vipy.batch.Failure rather than raising if ignoreErrors=True"""
+    def __init__(self, f_lambda, retries=0, backoff=1.0, timeout=None, ignoreErrors=False):
+        self._f = f_lambda
+        self._retries = retries
+        self._backoff = backoff
+        self._timeout = timeout
+        self._ignoreErrors = ignoreErrors
+
+    def _call(self, args):
+        """Run the call in a daemon thread when there is a timeout, so that a hung call (e.g. ffmpeg) is abandoned and the worker continues with the next task"""
+        if self._timeout is None:
+            return (self._f(*args), False)
+        result = {}
+        def _target():
+            try:
+                result['value'] = self._f(*args)
+            except BaseException as e:
+                result['error'] = e
+        t = threading.Thread(target=_target, daemon=True)
+        t.start()
+        t.join(self._timeout)
+        if t.is_alive():
+            return (TimeoutError('Task exceeded timeout=%s seconds' % str(self._timeout)), True)
+        if 'error' in result:
+            raise result['error']
+        return (result['value'], False)
+
+    def __call__(self, *args):
+        for k in range(0, self._retries+1):
+            try:
+                (r, istimeout) = self._call(args)
+                if not istimeout:
+                    return r
+                e = r   # hung tasks are not retried
+                tb = None
+                break
+            except Exception as exc:
+                (e, tb) = (exc, traceback.format_exc())
+                if not isinstance(e, OSError) or k == self._retries:
+                    break
+                time.sleep(self._backoff * (2**k))
+        if self._ignoreErrors:
+            return Failure(e, traceback=tb, attempts=k+1)
+        raise e
+
+
+def _wait(futures, return_when='ALL_COMPLETED'):
+    """Wait for a list of dask or concurrent.futures futures, returning the (done, not_done) sets"""
+    if len(futures) > 0 and not isinstance(next(iter(futures)), concurrent.futures.Future):
+        from dask.distributed import wait
+        return wait(futures, return_when=return_when)
+    return concurrent.futures.wait(futures, return_when=return_when)
+
+
+def _release(f):
+    """Release a completed future so that the result can be garbage collected by the scheduler, concurrent.futures futures are released when dereferenced"""
+    if hasattr(f, 'release'):
+        f.release()
+
+
+def _toarena(x, arenafile, shape, dtype, k, n):
+    """Write the array x into the k-th slice of n rows along the first dimension of the shared memory array in arenafile, without returning the array to the client"""
+    if x is not None:
+        x = np.asarray(x)
+        assert x.dtype == dtype and x.shape == (n,)+tuple(shape[1:]), "All elements must have the same shape and dtype - Use sharedmemory=False"
+        out = np.memmap(arenafile, dtype=dtype, mode='r+', shape=shape)
+        out[k*n:(k+1)*n] = x
+        del out  # unmap
+
+
+def _chunk(f_lambda, argslist, *shared):
+    """Apply f_lambda to each args tuple in a chunk as a single task"""
+    return [f_lambda(*shared, *a) for a in argslist]
+
+
+def _runqueue():
+    """The total time in seconds that this thread has been runnable but waiting for a CPU (e.g. on an oversubscribed machine), from /proc/thread-self/schedstat on Linux, or zero if unavailable"""
+    try:
+        with open('/proc/thread-self/schedstat') as f:
+            return int(f.read().split()[1]) / 1E9
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def _timedchunk(f_lambda, argslist, *shared):
+    """Apply f_lambda to each args tuple in a chunk as a single task, and return the results with the elapsed wall time, CPU time and time waiting for a CPU of the task thread in seconds"""
+    (t, c, q) = (time.time(), time.thread_time(), _runqueue())
+    return (_chunk(f_lambda, argslist, *shared), time.time() - t, time.thread_time() - c, _runqueue() - q)
+
+
+def _measuredchunk(f_lambda, argslist, *shared):
+    """Apply f_lambda to each args tuple in a chunk as a single task, and return the results with the estimated memory in bytes of the task from nbytes() of the elements, measured in the worker rather than on the client"""
+    objlist = [shared[0]] if len(shared) > 0 else [a[0] for a in argslist]
+    return (_chunk(f_lambda, argslist, *shared), max([_objnbytes(obj) for obj in objlist]))
+
+
+def _objnbytes(obj):
+    """The estimated memory in bytes of an element from nbytes(), or zero if unknown"""
+    return (obj.nbytes() if hasattr(obj, 'nbytes') and callable(obj.nbytes) else None) or 0
+
+
+def _unwrap(f):
+    """Return a completed concurrent.futures future for the results of the completed _timedchunk() or _measuredchunk() future f, or with the exception of f, without a round trip through the pool"""
+    g = concurrent.futures.Future()
+    if f.cancelled():
+        g.cancel()
+    elif f.exception() is not None:
+        g.set_exception(f.exception())
+    else:
+        g.set_result(f.result()[0])
+    return g
+
+
+def _hascache(relpaths):
+    """Does this worker have each of the relative paths under its VIPY_CACHE directory?"""
+    cache = os.environ['VIPY_CACHE'] if 'VIPY_CACHE' in os.environ else None
+    return [cache is not None and p is not None and os.path.exists(os.path.join(cache, p)) for p in relpaths]
+
+
+def _resolved(result):
+    """Return a completed concurrent.futures future for a result computed outside the pool"""
+    f = concurrent.futures.Future()
+    f.set_result(result)
+    return f
+
+
 class Batch(object):
     """vipy.batch.Batch class
 
@@ -35,16 +204,61 @@ class Batch(object):
 
     """    
              
-    def __init__(self, objlist, n_processes=2, dashboard=False):
+    def __init__(self, objlist, n_processes=2, dashboard=False, chunksize=1, backend='dask', n_threads=None, memory=None, ignoreErrors=False, retries=0, timeout=None, backoff=1.0):
         """Create a batch of homogeneous vipy.image objects from an iterable that can be operated on with a single parallel function call
+
+           * chunksize [int, 'auto']:  The number of elements in the batch processed by a single task.  Cheap per-element operations (e.g. category(), flush()) are dominated by scheduling and serialization overhead, 
+             and should be grouped with chunksize>1.  If chunksize='auto', the chunksize is set from the measured duration of the first task for each process in map(), filter() or method calls on the batch.
+           * backend ['dask', 'process', 'thread', 'auto']:  Use the global dask client (vipy.globals.dask()), which supports multi-node processing and a dashboard, or a local process pool or thread pool (vipy.globals.executor()) which has 
+             much lower startup and per-task overhead on a single machine.  Use backend='thread' for work that releases the GIL (e.g. PIL resizing, ffmpeg subprocesses, downloads).
+           * backend='auto':  Each operation is routed to a pool of n_processes processes for CPU bound work, or a pool of n_threads threads (default 32*n_processes) for I/O or subprocess bound work.  
+             Methods in vipy.batch.IOBOUND (e.g. download(), saveas(), load()) are run in the thread pool, otherwise the first element is profiled in the thread pool, and the operation is I/O bound if the task thread used less than half of the elapsed time on the CPU.
+             Use map(..., iobound=True|False) to declare the operation and skip profiling.
+           * backend='dask' with vipy.globals.dask(address=...) or vipy.globals.dask(scheduler_file=...):  Use an existing multi-node dask scheduler.  Elements with a filename() under VIPY_CACHE prefer the workers whose VIPY_CACHE has the file in map() (see _locality()).
+
+        >>> Batch(d, n_processes=8, backend='auto').map(lambda v: v.download().save())  # 256 concurrent downloads in threads, with ffmpeg in subprocesses
+
+           * memory [int]:  The memory budget in bytes for all tasks in flight.  Tasks are submitted only when the sum of the estimated memory of the tasks in flight is within the budget, and at least one task is always in flight.
+             The memory for each element is estimated from map(..., memory=bytes) or map(..., memory=lambda v: bytes) if provided, otherwise from nbytes() of the element (e.g. vipy.video.Video.nbytes() from the probed frame count and frame shape).
+             Tasks that fail with a MemoryError, or whose worker was killed (e.g. dask worker exceeded the memory limit), are retried one at a time after all other tasks complete.
+
+        >>> Batch(videos, n_processes=32, memory=64*1024**3).map(lambda v: v.load().mindim(256).flush())  # at most 64GB of decoded video in flight
+
+           * ignoreErrors [bool]:  If True, an exception for one element does not fail the operation.  The results of the operation include only the elements that succeeded, and failures() returns a list of vipy.batch.Failure for the elements that failed.
+             Ctrl-C cancels the pending tasks and returns the completed results, without shutting down the workers.
+           * retries [int]:  The number of times to retry an element that raised a transient error (OSError, such as a download error), waiting backoff*(2**k) seconds before the k-th retry
+           * timeout [float]:  The maximum time in seconds for each element.  An element that exceeds the timeout (e.g. hung in ffmpeg) is abandoned in a background thread of the worker and fails with a TimeoutError, so that the worker continues with the next task.
         """
         objlist = tolist(objlist)
         self._batchtype = type(objlist[0])        
         assert all([isinstance(im, self._batchtype) for im in objlist]), "Invalid input - Must be homogeneous list of the same type"                
+        assert chunksize == 'auto' or (isinstance(chunksize, int) and chunksize > 0), "chunksize must be a positive integer or 'auto'"
         self._objlist = objlist        
-        if vipy.globals.dask() is None or vipy.globals.num_workers() < n_processes:
-            vipy.globals.dask(num_processes=n_processes, dashboard=dashboard)
-        self._client = vipy.globals.dask().client()  # shutdown using vipy.globals.dask().shutdown(), or let python garbage collect it
+        self._chunksize = chunksize
+        self._memory = memory
+        assert isinstance(retries, int) and retries >= 0, "retries must be a non-negative integer"
+        (self._ignoreErrors, self._retries, self._timeout, self._backoff) = (ignoreErrors, retries, timeout, backoff)
+        self._failures = []
+        assert backend in ['dask', 'process', 'thread', 'auto'], "backend must be in ['dask', 'process', 'thread', 'auto']"
+        self._backend = backend
+        self._threadpool = None
+        self._locations = None  # (relpaths, workers, {worker_address: [bool, ...]}) for _locality()
+        if backend == 'auto':
+            n_threads = 32*n_processes if n_threads is None else n_threads
+            if vipy.globals.executor(backend='process') is None or vipy.globals.executor(backend='process').num_processes() < n_processes:
+                vipy.globals.executor(num_processes=n_processes, backend='process')
+            if vipy.globals.executor(backend='thread') is None or vipy.globals.executor(backend='thread').num_processes() < n_threads:
+                vipy.globals.executor(num_processes=n_threads, backend='thread')
+            self._client = vipy.globals.executor(backend='process').client()
+            self._threadpool = vipy.globals.executor(backend='thread').client()
+        elif backend == 'dask':
+            if vipy.globals.dask() is None or (vipy.globals.num_workers() < n_processes and not vipy.globals.dask().isremote()):
+                vipy.globals.dask(num_processes=n_processes, dashboard=dashboard)
+            self._client = vipy.globals.dask().client()  # shutdown using vipy.globals.dask().shutdown(), or let python garbage collect it
+        else:
+            if vipy.globals.executor(backend=backend) is None or vipy.globals.executor(backend=backend).num_processes() < n_processes:
+                vipy.globals.executor(num_processes=n_processes, backend=backend)
+            self._client = vipy.globals.executor(backend=backend).client()  # shutdown using vipy.globals.executor(backend=backend).shutdown()
 
     def __enter__(self):
         return self
@@ -56,7 +270,7 @@ class Batch(object):
         return len(self._objlist)
 
     def __repr__(self):
-        return str('<vipy.batch: type=%s, len=%d, procs=%d>' % (str(self._batchtype), len(self), self.n_processes()))
+        return str('<vipy.batch: type=%s, len=%d, procs=%d, backend=%s>' % (str(self._batchtype), len(self), self.n_processes(), self._backend))
 
     def info(self):
         return self._client.scheduler_info()
@@ -64,23 +278,15 @@ class Batch(object):
     def n_processes(self):
         return len(self.info()['workers'])
 
-    def batch(self, newlist=None):
+    def batch(self, newlist=None, chunked=False):
+        """Return the list of elements in the batch, or update the batch with the newlist or the results of a list of futures.  If chunked is a list of the number of elements in each chunk, each future returns a list of results to be concatenated"""
         if islist(newlist) and not hasattr(newlist[0], 'result'):
             self._objlist = newlist
             return self
         elif islist(newlist) and hasattr(newlist[0], 'result'):
-            try:
-                wait(newlist)
-            except KeyboardInterrupt:
-                warnings.warn('[vipy.batch]: batch cannot be restarted after killing with ctrl-c - You must create a new Batch()')
-                vipy.globals.dask().shutdown()
-                self._client = None
-                return None  
-            except:
-                # warnings.warn('[vipy.batch]: batch cannot be restarted after exception - Recreate Batch()')                
-                raise
-            completedlist = [f.result() for f in newlist]
-            if isinstance(completedlist[0], self._batchtype):
+            resultlist = self._results(newlist, chunked)
+            completedlist = [r for r in resultlist if not isinstance(r, Failure)]
+            if len(completedlist) > 0 and isinstance(completedlist[0], self._batchtype):
                 self._objlist = completedlist
                 return self
             else:
@@ -90,6 +296,44 @@ class Batch(object):
         else:
             raise ValueError('Invalid input - must be list')
         
+    def _results(self, futures, chunked=False):
+        """Wait for the futures and return the list of results in order.  If ignoreErrors=True, failed elements or tasks are vipy.batch.Failure objects in the list, which are also saved in failures().
+        
+           If chunked is a list of the number of elements in each chunk, each future returns a list of results to be concatenated, and a failed chunk is a vipy.batch.Failure for each element in the chunk so that the results are aligned with the batch.
+        """
+        try:
+            _wait(futures)
+        except KeyboardInterrupt:
+            for f in futures:
+                f.cancel()  # workers are not shutdown, completed results are kept
+            warnings.warn('[vipy.batch]: batch interrupted with ctrl-c - Pending tasks cancelled')
+            if not self._ignoreErrors:
+                raise
+        resultlist = []
+        for (k, f) in enumerate(futures):
+            try:
+                resultlist += f.result() if chunked else [f.result()]
+            except (Exception, concurrent.futures.CancelledError) as e:
+                if not self._ignoreErrors:
+                    raise
+                tb = traceback.format_exc()
+                resultlist += [Failure(e, traceback=tb) for j in range(0, chunked[k] if chunked else 1)]  # one failure for each element of a failed chunk
+        self._failures = [r for r in resultlist if isinstance(r, Failure)]
+        for (k, r) in enumerate(resultlist):
+            if isinstance(r, Failure):
+                (r._index, r._element) = (k, self._objlist[k] if len(resultlist) == len(self._objlist) else None)
+        return resultlist
+
+    def failures(self):
+        """Return the list of vipy.batch.Failure for the elements that failed in the last operation with ignoreErrors=True"""
+        return self._failures
+
+    def _policy(self, f_lambda):
+        """Wrap the lambda function with the retries, timeout and error handling for this batch"""
+        if not self._ignoreErrors and self._retries == 0 and self._timeout is None:
+            return f_lambda
+        return _Policy(f_lambda, retries=self._retries, backoff=self._backoff, timeout=self._timeout, ignoreErrors=self._ignoreErrors)
+
     def __iter__(self):
         for im in self._objlist:
             yield im
@@ -97,56 +341,351 @@ class Batch(object):
     def __getattr__(self, attr):
         """Call the same method on all Image objects"""
         assert self.__dict__['_client'] is not None, "Batch() must be reconstructed after shutdown"                                
-        return lambda *args, **kw: self.batch(self.__dict__['_client'].map(lambda im: getattr(im, attr)(*args, **kw), self._objlist))
+        return lambda *args, **kw: self.map(lambda im: getattr(im, attr)(*args, **kw), iobound=True if attr in IOBOUND else None)
+
+    def chunksize(self, n=None):
+        """Get or set the number of elements in the batch processed by a single task"""
+        if n is not None:
+            assert n == 'auto' or (isinstance(n, int) and n > 0), "chunksize must be a positive integer or 'auto'"
+            self._chunksize = n
+            return self
+        return self._chunksize
+
+    def _isparallel(self):
+        """Operations are submitted with _chunkmap() if chunking, routing between pools or throttling by memory"""
+        return self._chunksize != 1 or self._backend == 'auto' or self._memory is not None
+
+    def _nbytes(self, chunk, shared=(), memory=None):
+        """Estimate the memory in bytes for the task for the chunk from the memory hint or nbytes() of the elements, which are processed sequentially.  Unknown estimates are zero"""
+        objlist = [shared[0]] if len(shared) > 0 else [a[0] for a in chunk]
+        if memory is not None:
+            return max([memory(obj) if callable(memory) else memory for obj in objlist])
+        return max([_objnbytes(obj) for obj in objlist])
+
+    def _throttle(self, c, f_lambda, chunks, chunklist, shared=(), memory=None):
+        """Submit each chunk only when the estimated memory of all tasks in flight is within the memory budget, and retry tasks that ran out of memory one at a time.
 
-    def product(self, f_lambda, args, waiting=True):
+           Without a memory hint, nbytes() of the elements (e.g. an ffprobe and preview decode for an unloaded video) is estimated on the client for the first chunk only, and the remaining chunks use the largest estimate so far reported back by the workers with the results of completed tasks
+        """
+        (futures, pending, inflight, estimate) = ([None]*len(chunks), {}, 0, None)
+        for (k, chunk) in enumerate(chunks):
+            if memory is not None or estimate is None:
+                nbytes = estimate = self._nbytes(chunklist[k], shared, memory)
+            else:
+                nbytes = estimate
+            while len(pending) > 0 and inflight + nbytes > self._memory:
+                (done, notdone) = _wait(list(pending.keys()), return_when='FIRST_COMPLETED')
+                for f in done:
+                    inflight -= pending.pop(f)
+                    if memory is None and not f.cancelled() and f.exception() is None:
+                        estimate = nbytes = max(estimate, f.result()[1])  # measured in the worker
+            futures[k] = c.submit(_chunk if memory is not None else _measuredchunk, f_lambda, chunk, *shared, pure=False)
+            (pending[futures[k]], inflight) = (nbytes, inflight + nbytes)
+        _wait(futures)
+        if memory is None:
+            futures = [_unwrap(f) if isinstance(f, concurrent.futures.Future) else c.submit(lambda r: r[0], f, pure=False) for f in futures]  # unwrap local results on the client, dask results on the worker
+            _wait(futures)
+        for (k, f) in enumerate(futures):
+            e = f.exception() if f.exception() is not None else next((r.exception() for r in f.result() if isinstance(r, Failure) and isinstance(r.exception(), MemoryError)), None)  # ignoreErrors=True returns the MemoryError as a failure
+            if e is not None and type(e).__name__ in ['MemoryError', 'KilledWorker']:
+                warnings.warn('[vipy.batch]: task out of memory (%s) - Retrying alone' % type(e).__name__)
+                futures[k] = c.submit(_chunk, f_lambda, chunks[k], *shared, pure=False)
+                _wait([futures[k]])
+        return futures
+
+    def _profile(self, f_lambda, argslist, shared=()):
+        """Run the elements in argslist in the thread pool, and return the results and if the task thread used less than half of the elapsed time on the CPU (e.g. waiting on I/O or a subprocess).  Time waiting for a CPU on a busy machine is not counted as waiting"""
+        (results, elapsed, cputime, runqueue) = self._threadpool.submit(_timedchunk, f_lambda, argslist, *shared).result()
+        return (results, cputime < 0.5*(elapsed - runqueue))
+
+    def _pool(self, f_lambda, argslist, shared=(), iobound=None):
+        """Return the client for this operation, with the results of the elements in argslist used for profiling an undeclared operation for backend='auto'"""
+        if self._backend != 'auto':
+            return (self.__dict__['_client'], [])
+        (results, iobound) = self._profile(f_lambda, argslist, shared) if (iobound is None and len(argslist) > 0) else ([], iobound)
+        return (self._threadpool if iobound is True else self.__dict__['_client'], results)
+        
+    def _chunkmap(self, f_lambda, argslist, shared=(), iobound=None, memory=None):
+        """Submit f_lambda(*shared, *args) for each args tuple in argslist, grouped into chunks of elements that are executed as a single task.  Returns a list of futures, each of which returns a list of results in argslist order, and the list of the number of elements in each chunk"""
+        (c, results) = self._pool(f_lambda, argslist[0:1], shared, iobound)
+        futures = [_resolved(results)] if len(results) > 0 else []  # profiled chunk
+        lengths = [len(results)] if len(results) > 0 else []
+        argslist = argslist[len(results):]
+        chunksize = self._chunksize
+        if chunksize == 'auto' and len(argslist) > 0:
+            # Measure the duration of one task per worker, keep these results, then chunk the remaining elements so that each task takes about 200ms with at least four tasks per worker
+            n_workers = len(c.scheduler_info()['workers'])
+            n = min(len(argslist), n_workers)
+            timed = [c.submit(_timedchunk, f_lambda, argslist[k:k+1], *shared, pure=False) for k in range(0, n)]
+            _wait(timed)
+            elapsed = [f.result()[1] for f in timed if not f.cancelled() and f.exception() is None]  # failed tasks are reported with the results
+            elapsed = float(np.median(elapsed)) if len(elapsed) > 0 else 0.0
+            futures += [_unwrap(f) if isinstance(f, concurrent.futures.Future) else c.submit(lambda r: r[0], f, pure=False) for f in timed]  # unwrap local results on the client, dask results on the worker
+            lengths += [1]*n
+            argslist = argslist[n:]
+            chunksize = int(max(1, min(np.ceil(0.2 / max(elapsed, 1E-6)), np.ceil(len(argslist) / (4*n_workers)))))
+        chunklist = [argslist[k:k+chunksize] for k in range(0, len(argslist), chunksize)]
+        chunks = c.scatter(chunklist, hash=False) if len(argslist) > 0 else []
+        lengths += [len(chunk) for chunk in chunklist]
+        if self._memory is not None:
+            return (futures + self._throttle(c, f_lambda, chunks, chunklist, shared, memory), lengths)
+        return (futures + [c.submit(_chunk, f_lambda, chunk, *shared, pure=False) for chunk in chunks], lengths)
+
+    def product(self, f_lambda, args, waiting=True, iobound=None):
         """Cartesian product of args and batch, returns an MxN list of N args applied to M batch elements.  Use this with extreme caution, as the memory requirements may be high."""
         assert self.__dict__['_client'] is not None, "Batch() must be reconstructed after shutdown"                        
+        f_lambda = self._policy(f_lambda)
         c = self.__dict__['_client']
-        objlist = c.scatter(self._objlist)        
+        if self._isparallel():
+            (futures, lengths) = self._chunkmap(f_lambda, [(im,)+tuple(a) for im in self._objlist for a in args], iobound=iobound)
+            return self.batch(futures, chunked=lengths) if waiting else futures
+        objlist = c.scatter(self._objlist, hash=False)        
         futures = [c.submit(f_lambda, im, *a) for im in objlist for a in args]
         return self.batch(futures) if waiting else futures
         
-    def map(self, f_lambda, args=None):
+    def map(self, f_lambda, args=None, iobound=None, memory=None, checkpoint=None):
         """Run the lambda function on each of the elements of the batch. 
         
         If args is provided, then this is a unique argument for the lambda function for each of the elements in the batch, or is broadcastable.
+        If iobound is True or False, the operation is declared as I/O or subprocess bound (thread pool) or CPU bound (process pool) for backend='auto', otherwise it is profiled.
+        If memory is an integer number of bytes or a lambda function of an element returning bytes, this is the memory estimate per element for Batch(..., memory=budget).
+        If checkpoint is a filename, the results are recorded in a SQLite database as they complete, and calling map() again with the same checkpoint computes only the elements without a recorded result.  The checkpoint path submits one task per element, without chunksize, memory throttling or locality.  See _checkpointmap().
         
         >>> iml = [vipy.image.RandomScene(512,512) for k in range(0,1000)]   
         >>> imb = vipy.image.Batch(iml, n_processes=4) 
         >>> imb.map(lambda im,f: im.saveas(f), args=[('/tmp/out%d.jpg'%k,) for k in range(0,1000)])  
         >>> imb.map(lambda im: im.rgb())  # this is equivalent to imb.rgb()
+        >>> Batch(d.trainset(), n_processes=32).map(lambda v: v.download().save(), checkpoint='/path/to/kinetics.db')  # resumable after interruption
 
         """
         assert self.__dict__['_client'] is not None, "Batch() must be reconstructed after shutdown"                
+        f_lambda = self._policy(f_lambda)
         c = self.__dict__['_client']        
+        if checkpoint is not None:
+            assert args is None or islist(args), "args must be a list"
+            argslist = [(im,) for im in self._objlist] if args is None else ([(self._objlist[0],)+tuple(a) for a in args] if len(self._objlist) == 1 else [(im,)+tuple(a) for (im, a) in zip(self._objlist, args)])
+            return self.batch(self._checkpointmap(f_lambda, argslist, checkpoint, iobound=iobound))
+        if self._isparallel():
+            if args is not None and len(self._objlist) == 1:
+                assert islist(args), "args must be a list"
+                obj = c.scatter(self._objlist[0], broadcast=True, hash=False)
+                return self.batch(*self._chunkmap(f_lambda, [tuple(a) for a in args], shared=(obj,), iobound=iobound, memory=memory))
+            assert args is None or (islist(args) and len(list(args)) == len(self._objlist)), "args must be a list of arguments of length %d, one for each element in batch" % len(self._objlist)
+            argslist = [(im,) for im in self._objlist] if args is None else [(im,)+tuple(a) for (im, a) in zip(self._objlist, args)]
+            return self.batch(*self._chunkmap(f_lambda, argslist, iobound=iobound, memory=memory))
+        workers = self._locality(c)
+        if workers is not None:
+            assert args is None or (islist(args) and len(list(args)) == len(self._objlist)), "args must be a list of arguments of length %d, one for each element in batch" % len(self._objlist)
+            argslist = [()]*len(self._objlist) if args is None else [tuple(a) for a in args]
+            return self.batch([c.submit(f_lambda, im, *a, workers=w, allow_other_workers=True, pure=False) for (im, a, w) in zip(self._objlist, argslist, workers)])
         if args is not None:
             if len(self._objlist) > 1:
                 assert islist(args) and len(list(args)) == len(self._objlist), "args must be a list of arguments of length %d, one for each element in batch" % len(self._objlist)
-                objlist = c.scatter(self._objlist)
+                objlist = c.scatter(self._objlist, hash=False)
                 return self.batch([c.submit(f_lambda, im, *a) for (im, a) in zip(objlist, args)])                
             else:
                 assert islist(args), "args must be a list"
-                obj = c.scatter(self._objlist[0], broadcast=True)
+                obj = c.scatter(self._objlist[0], broadcast=True, hash=False)
                 return self.batch([self.__dict__['_client'].submit(f_lambda, obj, *a) for a in args])
         else:
             return self.batch(self.__dict__['_client'].map(f_lambda, self._objlist))
 
-    def filter(self, f_lambda):
+    def _locality(self, c):
+        """Return a list of preferred dask worker addresses for each element in the batch, or None if there are no locality hints.
+        
+           Elements with a filename() under the VIPY_CACHE directory of the client are checked on each worker for the same path relative to the VIPY_CACHE of the worker, in one call per worker.  
+           Each element prefers the workers that have the file (e.g. a video downloaded to the local disk of a node), or any worker if no worker or all workers have the file.
+           The check is skipped for a single worker, and the result is reused by later operations on the batch with the same filenames and workers.
+        """
+        cache = vipy.globals.cache()
+        if self._backend != 'dask' or cache is None or not hasattr(self._objlist[0], 'filename') or len(self._objlist) == 1:
+            return None
+        workers = sorted(c.scheduler_info()['workers'].keys())
+        if len(workers) == 1:
+            return None
+        cache = os.path.realpath(cache)
+        filenames = [obj.filename() for obj in self._objlist]
+        relpaths = [os.path.relpath(os.path.realpath(f), cache) if (f is not None and os.path.realpath(f).startswith(cache + os.sep)) else None for f in filenames]
+        if all([p is None for p in relpaths]):
+            return None
+        if self._locations is None or self._locations[0] != relpaths or self._locations[1] != workers:
+            self._locations = (relpaths, workers, c.run(_hascache, relpaths))  # {worker_address: [bool, ...]}
+        hascache = self._locations[2]
+        workers = [[w for (w, b) in hascache.items() if b[k]] for k in range(0, len(relpaths))]
+        workers = [w if (len(w) > 0 and len(w) < len(hascache)) else None for w in workers]
+        return workers if any([w is not None for w in workers]) else None
+
+    def _checkpointmap(self, f_lambda, argslist, checkpoint, iobound=None):
+        """Submit f_lambda(*args) for each args tuple in argslist, and record each result in the SQLite database checkpoint as it completes.  Returns a list of completed futures in argslist order.
+
+           Each element is keyed by the sha1 hash of the index and the repr() of the args tuple (e.g. filename, clip and framerate of a video), so that the same job in the same order is resumed.  
+           Elements with a result in the database are not submitted, and the recorded result is used.  Results are serialized with dill, and can be file paths returned by f_lambda for large results. 
+           Failures with ignoreErrors=True are not recorded, so they are retried on restart.  Recorded results are committed at least once per second and on interruption.
+           Each element is submitted as its own task so that each result is recorded as it completes, and the chunksize, memory budget and locality hints of the batch are not used on this path.
+        """
+        import sqlite3
+        import dill
+        db = sqlite3.connect(checkpoint)
+        db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result BLOB)')
+        keys = [hashlib.sha1(('%d:%s' % (k, repr(a))).encode('utf-8')).hexdigest() for (k, a) in enumerate(argslist)]
+        completed = set([r[0] for r in db.execute('SELECT key FROM results')])
+        todo = [k for (k, key) in enumerate(keys) if key not in completed]
+        
+        failed = {}
+        def _record(k, r, db=db):
+            if isinstance(r, Failure):
+                failed[k] = r
+            else:
+                db.execute('INSERT OR REPLACE INTO results (key, result) VALUES (?, ?)', (keys[k], sqlite3.Binary(dill.dumps(r))))
+
+        pending = {}
+        try:
+            (c, results) = self._pool(f_lambda, [argslist[k] for k in todo[0:1]], iobound=iobound)
+            for r in results:
+                _record(todo[0], r)
+            pending = {c.submit(f_lambda, *argslist[k], pure=False):k for k in todo[len(results):]}
+            t = time.time()
+            while len(pending) > 0:
+                (done, notdone) = _wait(list(pending.keys()), return_when='FIRST_COMPLETED')
+                for f in done:
+                    k = pending.pop(f)
+                    if f.exception() is None:
+                        _record(k, f.result())
+                    elif not self._ignoreErrors:
+                        raise f.exception()
+                    else:
+                        _record(k, Failure(f.exception(), traceback=''.join(traceback.format_exception(type(f.exception()), f.exception(), f.exception().__traceback__))))  # raised outside the policy (e.g. KilledWorker, cancelled)
+                if time.time() - t > 1:
+                    db.commit()
+                    t = time.time()
+        except BaseException:
+            for f in pending.keys():
+                f.cancel()
+            raise
+        finally:
+            db.commit()
+        
+        if len(todo) > 0 and len(completed) > 0:
+            warnings.warn('[vipy.batch]: resumed from checkpoint "%s" with %d/%d completed' % (checkpoint, len(argslist)-len(todo), len(argslist)))
+        futures = []
+        for (k, key) in enumerate(keys):
+            r = db.execute('SELECT result FROM results WHERE key=?', (key,)).fetchone()
+            futures.append(_resolved(dill.loads(r[0]) if r is not None else failed.get(k, Failure(RuntimeError('No recorded result for element %d in checkpoint "%s"' % (k, checkpoint)), index=k))))
+        db.close()
+        return futures
+
+    def imap(self, f_lambda, window=None, iobound=None):
+        """Run the lambda function on each of the elements of the batch, and yield the results in batch order as they complete.
+        
+           Unlike map(), at most window tasks are in flight at once, results are not collected into a list and the batch is not replaced, and references to completed results are released as they are yielded.
+           This is useful for very large batches (e.g. downloading and clipping all videos in a dataset) where the results can be consumed (e.g. saved) as they are computed.
+
+           * window [int]:  The maximum number of submitted tasks that have not been yielded, defaults to twice the number of processes
+           * iobound [bool]:  Declare the operation as I/O bound or CPU bound for backend='auto', see map()
+           
+        >>> for v in vipy.batch.Batch(videolist, n_processes=8).imap(lambda v: v.download().save(), window=32):
+        >>>     print(v)
+        """
+        assert self.__dict__['_client'] is not None, "Batch() must be reconstructed after shutdown"                
+        f_lambda = self._policy(f_lambda)
+        c = self.__dict__['_client']
+        window = 2*self.n_processes() if window is None else window
+        assert isinstance(window, int) and window > 0, "window must be a positive integer"
+
+        objiter = iter(self._objlist)
+        (c, results) = self._pool(f_lambda, [(next(objiter),)] if self._backend == 'auto' and iobound is None else [], iobound=iobound)
+        futures = deque([_resolved(r) for r in results] + [c.submit(f_lambda, obj, pure=False) for (k, obj) in zip(range(window-len(results)), objiter)])
+        while len(futures) > 0:
+            f = futures.popleft()
+            result = f.result()  # in batch order, raises exception on failure
+            _release(f)
+            obj = next(objiter, None)  # batch elements are never None
+            if obj is not None:
+                futures.append(c.submit(f_lambda, obj, pure=False))
+            yield result
+
+    def imap_unordered(self, f_lambda, window=None, iobound=None):
+        """Run the lambda function on each of the elements of the batch, and yield the results in completion order with at most window tasks in flight.  See imap()."""
+        assert self.__dict__['_client'] is not None, "Batch() must be reconstructed after shutdown"                
+        f_lambda = self._policy(f_lambda)
+        c = self.__dict__['_client']
+        window = 2*self.n_processes() if window is None else window
+        assert isinstance(window, int) and window > 0, "window must be a positive integer"
+
+        objiter = iter(self._objlist)
+        (c, results) = self._pool(f_lambda, [(next(objiter),)] if self._backend == 'auto' and iobound is None else [], iobound=iobound)
+        pending = set([_resolved(r) for r in results] + [c.submit(f_lambda, obj, pure=False) for (k, obj) in zip(range(window-len(results)), objiter)])
+        while len(pending) > 0:
+            (done, pending) = _wait(pending, return_when='FIRST_COMPLETED')
+            for f in done:
+                result = f.result()
+                _release(f)
+                obj = next(objiter, None)
+                if obj is not None:
+                    pending.add(c.submit(f_lambda, obj, pure=False))
+                yield result
+
+    def filter(self, f_lambda, iobound=None):
         """Run the lambda function on each of the elements of the batch and filter based on the provided lambda  
         """
         assert self.__dict__['_client'] is not None, "Batch() must be reconstructed after shutdown"        
+        f_lambda = self._policy(f_lambda)
         c = self.__dict__['_client']
-        objlist = c.scatter(self._objlist)        
-        is_filtered = self.batch(self.__dict__['_client'].map(f_lambda, objlist))
+        if self._isparallel():
+            is_filtered = self._results(*self._chunkmap(f_lambda, [(im,) for im in self._objlist], iobound=iobound))
+        else:
+            objlist = c.scatter(self._objlist, hash=False)        
+            is_filtered = self._results(self.__dict__['_client'].map(f_lambda, objlist))
         self._objlist = [obj for (f, obj) in zip(is_filtered, self._objlist) if f is True]
         return self
         
-    def torch(self):
-        """Convert the batch of N HxWxC images to a NxCxHxW torch tensor"""
+    def _islocal(self):
+        """Are all workers on this machine, such that they can write to a shared memory arena?"""
+        return all([isinstance(w, int) or any([h in w for h in ['127.0.0.1', 'localhost', 'inproc://']]) for w in self.info()['workers'].keys()])
+
+    def _issameshape(self):
+        """Are all elements loaded with arrays of the same shape and dtype, such that the results can be written to a shared memory arena without decoding?"""
+        return all([hasattr(obj, 'isloaded') and obj.isloaded() for obj in self._objlist]) and len(set([(obj.array().shape, obj.array().dtype) for obj in self._objlist])) == 1
+
+    def _arena(self, f_numpy):
+        """Concatenate the arrays f_numpy(obj) for all elements in the batch along the first dimension, written by the workers directly into a preallocated output array.
+        
+           The output is a memory-mapped file in shared memory (/dev/shm if available), which is allocated by the client with the shape and dtype of the result for the first element, computed in the pool.  Each worker maps the file and writes the result for the element
+           into the slice of the output for the element, so that arrays are not pickled back to the client and concatenated.  The file is unlinked when complete, and the memory is released when the returned array is garbage collected.  
+           All elements must have the same shape and dtype.  Elements that fail (e.g. a different shape) raise an exception, or are removed from the output with ignoreErrors=True and are reported in failures().
+        """
+        first = self.__dict__['_client'].submit(lambda obj: np.asarray(f_numpy(obj)), self._objlist[0], pure=False).result()
+        (n, shape, dtype) = (first.shape[0], (len(self)*first.shape[0],)+first.shape[1:], first.dtype)
+        (fd, arenafile) = tempfile.mkstemp(suffix='.arena', dir='/dev/shm' if os.path.isdir('/dev/shm') else tempdir())
+        os.close(fd)
+        try:
+            out = np.memmap(arenafile, dtype=dtype, mode='w+', shape=shape)
+            out[0:n] = first
+            self._failures = []
+            if len(self) > 1:
+                self.map(lambda obj, k: _toarena(f_numpy(obj) if k > 0 else None, arenafile, shape, dtype, k, n), args=[(k,) for k in range(0, len(self))])
+        finally:
+            os.remove(arenafile)  # mapping is valid until garbage collected
+        if len(self.failures()) > 0:
+            warnings.warn('[vipy.batch]: %d elements failed and are not in the output - See failures()' % len(self.failures()))
+            failed = set([f.index() for f in self.failures()])
+            return np.asarray(out).reshape((len(self), n)+first.shape[1:])[[k for k in range(0, len(self)) if k not in failed]].reshape((-1,)+first.shape[1:])
+        return np.asarray(out)
+
+    def torch(self, sharedmemory=None):
+        """Convert the batch of N HxWxC images to a NxCxHxW torch tensor.  
+        
+           If sharedmemory=True, the workers write directly into a preallocated output tensor, rather than returning each tensor to be concatenated, which requires all workers on this machine and all images to have the same shape.
+           Defaults to shared memory if all workers are on this machine and all images are loaded with the same shape.
+        """
+        try_import('torch', 'torch');  import torch
+        if sharedmemory is True or (sharedmemory is None and self._islocal() and self._issameshape()):
+            return torch.from_numpy(self._arena(lambda im: im.torch().numpy()))
         return torch.cat(self.map(lambda im: im.torch()))
 
-    def numpy(self):
-        """Convert the batch of N HxWxC images to a NxCxHxW torch tensor"""
+    def numpy(self, sharedmemory=None):
+        """Convert the batch of N HxWxC images to a NxHxWxC numpy array.  See torch() for sharedmemory option."""
+        if sharedmemory is True or (sharedmemory is None and self._islocal() and self._issameshape()):
+            return self._arena(lambda im: np.expand_dims(im.numpy(), 0))
         return np.stack(self.map(lambda im: im.numpy()))
     
@@ -2,7 +2,8 @@ import math
 import numpy as np
 import scipy.spatial
 from itertools import product
-from vipy.util import try_import, istuple, isnumpy, isnumber, tolist
+from vipy.util import try_import, istuple, isnumpy, isnumber, tolist, fastest
+import vipy.globals
 from vipy.linalg import columnvector
 import warnings
 
@@ -75,14 +76,154 @@ def random_affine_transform(txy=((0,1),(0,1)), r=(0,1), sx=(0.1,1), sy=(0.1,1),
                             ky=uniform_random_in_range(ky))
 
 
-def imtransform(img, A):
-    """Transform an numpy array image (MxNx3) following the affine or similiarity transformation A"""
-    assert isnumpy(img) and isnumpy(A), "invalid input"
-    try_import(cv2, 'opencv-python'); import cv2
-    if A.shape == (2,3):
-        return cv2.warpAffine(img, A, (img.shape[1], img.shape[0]))
+def random_affine_transforms(n, txy=((0,1),(0,1)), r=(0,1), sx=(0.1,1), sy=(0.1,1), kx=(0.1,1), ky=(0.1,1), c=(0,0)):
+    """Return an nx3x3 numpy array of n random affine transformations sampled at once, with the same parameterization and ranges as random_affine_transform(), composed about the origin c=(x,y) (e.g. the image center)"""
+    assert istuple(txy) and istuple(txy[0]) and istuple(txy[1]) and istuple(r) and istuple(sx) and istuple(sy) and istuple(kx) and istuple(ky) and istuple(c), "Invalid input"
+    uniform_random_in_range = lambda t: np.random.uniform(t[0], t[1], size=n)
+    (tx, ty, r, sx, sy, kx, ky) = [uniform_random_in_range(t) for t in (txy[0], txy[1], r, sx, sy, kx, ky)]
+    A = np.zeros((n, 3, 3), dtype=np.float64)
+    A[:,0,0] = sx*np.cos(r) + ky*sy*np.sin(r)  # K*S*R
+    A[:,0,1] = -sx*np.sin(r) + ky*sy*np.cos(r)
+    A[:,1,0] = kx*sx*np.cos(r) + sy*np.sin(r)
+    A[:,1,1] = -kx*sx*np.sin(r) + sy*np.cos(r)
+    A[:,0,2] = tx + c[0] - (A[:,0,0]*c[0] + A[:,0,1]*c[1])  # + T, about origin c
+    A[:,1,2] = ty + c[1] - (A[:,1,0]*c[0] + A[:,1,1]*c[1])
+    A[:,2,2] = 1
+    return A
+
+
+def _warp_cv2(img, A, interp='bilinear'):
+    """Warp the HxW or HxWxC array img with the 2x3 affine or 3x3 perspective transformation A using cv2.warpAffine() or cv2.warpPerspective()"""
+    try_import('cv2', 'opencv-python'); import cv2
+    flags = {'bilinear':cv2.INTER_LINEAR, 'nearest':cv2.INTER_NEAREST}[interp]
+    A = np.asarray(A, dtype=np.float64)
+    y = cv2.warpAffine(img, A, (img.shape[1], img.shape[0]), flags=flags) if A.shape == (2,3) else cv2.warpPerspective(img, A, (img.shape[1], img.shape[0]), flags=flags)
+    return y.reshape(img.shape)  # cv2 drops singleton channels
+
+
+def _warp_pil(img, A, interp='bilinear'):
+    """Warp the HxW or HxWxC array img with the 2x3 affine or 3x3 perspective transformation A using PIL.Image.transform().  Arrays that are not greyscale, RGB or RGBA uint8 are warped per channel as greyscale uint8 or float32 PIL images"""
+    import PIL.Image
+    A = np.asarray(A, dtype=np.float64)
+    T = np.array([[1,0,0.5], [0,1,0.5], [0,0,1]])  # PIL samples at pixel centers (x+0.5, y+0.5), cv2 samples at (x,y)
+    Ainv = T.dot(np.linalg.inv(A if A.shape == (3,3) else np.vstack((A, [0,0,1])))).dot(np.linalg.inv(T))  # PIL maps output to input coordinates
+    (method, data) = (PIL.Image.AFFINE, Ainv[0:2].flatten()) if A.shape == (2,3) else (PIL.Image.PERSPECTIVE, (Ainv / Ainv[2,2]).flatten()[0:8])
+    resample = {'bilinear':PIL.Image.BILINEAR, 'nearest':PIL.Image.NEAREST}[interp]
+    size = (img.shape[1], img.shape[0])
+    if img.dtype == np.uint8 and (img.ndim == 2 or img.shape[2] in [3,4]):
+        return np.array(PIL.Image.fromarray(img).transform(size, method, data=tuple(data), resample=resample))
+    y = np.stack([np.array(PIL.Image.fromarray(np.ascontiguousarray(c, dtype=np.uint8 if img.dtype == np.uint8 else np.float32)).transform(size, method, data=tuple(data), resample=resample)) for c in np.moveaxis(img.reshape(img.shape[0], img.shape[1], -1), 2, 0)], axis=2)
+    return (np.round(y) if np.issubdtype(img.dtype, np.integer) else y).astype(img.dtype).reshape(img.shape)
+
+
+def _warp_numpy(img, A, interp='bilinear'):
+    """Warp the HxW or HxWxC array img with the 2x3 affine or 3x3 perspective transformation A by inverse mapping each output pixel (x,y) and sampling with zeros outside the image, as in cv2.warpAffine()"""
+    return _warp_numpy_batch(img[np.newaxis], np.asarray(A)[np.newaxis], interp)[0]
+
+
+def _warp_numpy_batch(imgs, A, interp='bilinear', out=None):
+    """Warp each image in the NxHxW or NxHxWxC array imgs with the corresponding transformation in the Nx2x3 or Nx3x3 array A as a single vectorized inverse mapping and gather, written into out if provided.
+    
+       The inverse transformations are computed in float64, and the sample coordinates, indexes and weights are float32 and int32 to bound the temporaries to about _warp_numpy_nbytes() bytes per image.
+    """
+    (N, H, W) = imgs.shape[0:3]
+    A = np.asarray(A, dtype=np.float64)
+    A = A if A.shape[1] == 3 else np.concatenate((A, np.tile(np.array([[[0,0,1]]], dtype=np.float64), (N,1,1))), axis=1)
+    Ainv = np.linalg.inv(A).astype(np.float32).reshape(N, 3, 3, 1, 1)
+    (x, y) = (np.arange(0, W, dtype=np.float32).reshape(1, 1, W), np.arange(0, H, dtype=np.float32).reshape(1, H, 1))
+    (u, v) = (Ainv[:,0,0]*x + Ainv[:,0,1]*y + Ainv[:,0,2], Ainv[:,1,0]*x + Ainv[:,1,1]*y + Ainv[:,1,2])  # NxHxW input coordinates of each output pixel
+    if not np.all(A[:,2] == [0,0,1]):
+        z = Ainv[:,2,0]*x + Ainv[:,2,1]*y + Ainv[:,2,2]  # perspective
+        (u, v) = (u / z, v / z)
+    if interp == 'nearest':
+        (u0, v0, offsets) = (np.floor(u+0.5).astype(np.int32), np.floor(v+0.5).astype(np.int32), [(0,0)])
+    else:
+        (u0, v0, offsets) = (np.floor(u), np.floor(v), [(0,0), (0,1), (1,0), (1,1)])
+        (fu, fv) = (u - u0, v - v0)
+        (u0, v0) = (u0.astype(np.int32), v0.astype(np.int32))
+    del u, v
+    n = np.arange(0, N, dtype=np.int32).reshape(N, 1, 1)
+    img = np.zeros(imgs.shape, dtype=np.float32)
+    for (dv, du) in offsets:
+        (vi, ui) = (v0 + dv, u0 + du)
+        w = ((vi >= 0) & (vi < H) & (ui >= 0) & (ui < W)).astype(np.float32)  # zero outside image rectangle
+        if interp != 'nearest':
+            w *= (fv if dv else 1-fv) * (fu if du else 1-fu)
+        img += w.reshape(w.shape + (1,)*(imgs.ndim-3)) * imgs[n, np.clip(vi, 0, H-1, out=vi), np.clip(ui, 0, W-1, out=ui)]
+    if np.issubdtype(imgs.dtype, np.integer):
+        img = np.clip(np.round(img, out=img), np.iinfo(imgs.dtype).min, np.iinfo(imgs.dtype).max, out=img)
+    out = np.empty_like(imgs) if out is None else out
+    out[...] = img
+    return out
+
+
+def _warp_numpy_nbytes(H, W, C=1):
+    """The approximate peak bytes of temporaries for _warp_numpy_batch() for one HxWxC image: the float32 coordinates and weights and int32 indexes per pixel, and the float32 weighted samples and sum per channel"""
+    return H*W*(48 + 12*C)
+
+
+_WARP_BACKENDS = {'cv2':_warp_cv2, 'pil':_warp_pil, 'numpy':_warp_numpy}  # vipy.globals.warp_backend()
+_WARP_AUTO = {}  # (dtype, channels, interp, transform) -> fastest backend, memoized per process
+
+
+def imtransform(img, A, interp='bilinear'):
+    """Transform an numpy array image (MxN or MxNxC) following the 2x3 affine or 3x3 perspective transformation A, with 'bilinear' or 'nearest' interpolation, using the backend vipy.globals.warp_backend().  
+    
+       Transformations follow the cv2.warpAffine() convention, mapping input pixel (x,y) to output pixel A*(x,y,1) in an output of the same size as the input, with zeros outside the image.
+       The 'auto' backend is the fastest backend for the (dtype, channels, interp, transform) selected on first use by a micro-benchmark on a 256x256 random image, 
+       among those backends that are installed, support the input and agree to within two intensity levels for a similarity transform interior to the image.
+    """
+    assert isnumpy(img) and isnumpy(A) and A.shape in [(2,3), (3,3)], "invalid input"
+    return _WARP_BACKENDS[_warp_backend(img, A.shape, interp)](img, A, interp)
+
+
+def _warp_backend(img, shape, interp):
+    """Return the warp backend for the HxW or HxWxC image img and transformation shape (2,3) or (3,3), resolving vipy.globals.warp_backend('auto') with a memoized micro-benchmark"""
+    assert interp in ['bilinear', 'nearest'], "Invalid interp - Must be in ['bilinear', 'nearest']"
+    backend = vipy.globals.warp_backend()
+    if backend == 'auto':
+        key = (img.dtype.str, img.shape[2] if img.ndim == 3 else 0, interp, tuple(shape))
+        if key not in _WARP_AUTO:
+            x = (np.random.RandomState(0).rand(*((256, 256) + img.shape[2:])) * 255).astype(img.dtype)
+            S = similarity_transform_2x3(c=(128,128), r=0.2, s=1.5)  # zoom and rotate about the image center, such that all samples are interior
+            _WARP_AUTO[key] = fastest(_WARP_BACKENDS, (x, S if tuple(shape) == (2,3) else np.vstack((S, [0,0,1])), interp), atol=2)
+        backend = _WARP_AUTO[key]
+    return backend
+
+
+def imtransforms(imgs, A, interp='bilinear', out=None):
+    """Transform each image in the NxHxW or NxHxWxC numpy array imgs by the corresponding transformation in the Nx2x3 or Nx3x3 array A, or all images by the same 2x3 or 3x3 transformation A (e.g. the frames of a video), following imtransform().
+
+       * The output is written into the preallocated array out of the same shape and dtype as imgs if provided, which may be imgs itself for an in-place warp
+       * The 'numpy' backend is one vectorized warp per chunk of images, other backends warp each image in turn
+    """
+    assert isnumpy(imgs) and imgs.ndim in [3,4] and isnumpy(A), "Invalid input"
+    A = np.asarray(A, dtype=np.float64)
+    A = np.broadcast_to(A, (len(imgs),) + A.shape) if A.ndim == 2 else A
+    assert A.shape[0] == len(imgs) and A.shape[1:] in [(2,3), (3,3)], "Invalid input - A must be 2x3, 3x3, Nx2x3 or Nx3x3"
+    assert out is None or (out.shape == imgs.shape and out.dtype == imgs.dtype), "Invalid output buffer - Must be the same shape and dtype as imgs"
+    out = np.empty_like(imgs) if out is None else out
+    backend = _warp_backend(imgs[0], A.shape[1:], interp) if len(imgs) > 0 else 'numpy'
+    if backend == 'numpy':
+        n = max(1, (2**26) // _warp_numpy_nbytes(imgs.shape[1], imgs.shape[2], int(np.prod(imgs.shape[3:]))))  # at most 64MB of temporaries per chunk
+        for k in range(0, len(imgs), n):
+            _warp_numpy_batch(imgs[k:k+n], A[k:k+n], interp, out=out[k:k+n])
     else:
-        return cv2.warpPerspective(img, A, (img.shape[1], img.shape[0]))
+        for k in range(0, len(imgs)):
+            out[k] = _WARP_BACKENDS[backend](imgs[k], A[k], interp)
+    return out
+
+
+def transform_boxes(A, boxes):
+    """Transform the Nx4 numpy array of boxes (xmin, ymin, xmax, ymax) by the 2x3 or 3x3 transformation A, or each box by the corresponding transformation in the Nx2x3 or Nx3x3 array A, 
+       returning the Nx4 array of the enclosing boxes of the four transformed corners of each box
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    A = np.asarray(A, dtype=np.float64)
+    corners = np.stack((boxes[:,[0,2,2,0]], boxes[:,[1,1,3,3]], np.ones((len(boxes), 4))), axis=1)  # Nx3x4 homogeneous corners
+    p = np.matmul(A, corners)
+    p = p[:,0:2] / p[:,2:3] if p.shape[1] == 3 else p  # Nx2x4
+    return np.stack((np.min(p[:,0], axis=1), np.min(p[:,1], axis=1), np.max(p[:,0], axis=1), np.max(p[:,1], axis=1)), axis=1)
 
 
 def sqdist(d_obs, d_ref):
@@ -98,6 +239,26 @@ def normalize(x, eps=1E-16):
     assert isnumpy(x), "Invalid input"
     return x / (np.linalg.norm(x.astype(np.float64)) + eps)
 
+def nms(boxes, scores, iou=0.5):
+    """Greedy non-maximum suppression of the Nx4 numpy array of boxes (xmin, ymin, xmax, ymax) in decreasing order of the N scores.  
+
+       A box is suppressed if the intersection over union with a kept box of higher score is greater than iou.  Returns the array of indices of the kept boxes in decreasing order of score.
+       The pairwise intersection over union is a single vectorized NxN computation, so this is suitable for up to a few thousand boxes.
+    """
+    assert isnumpy(boxes) and boxes.ndim == 2 and boxes.shape[1] == 4 and len(scores) == len(boxes), "Invalid input"
+    order = np.argsort(-np.asarray(scores, dtype=np.float64), kind='stable')
+    b = np.asarray(boxes, dtype=np.float64)[order]
+    area = np.maximum(b[:,2] - b[:,0], 0) * np.maximum(b[:,3] - b[:,1], 0)
+    iw = np.maximum(np.minimum(b[:,np.newaxis,2], b[np.newaxis,:,2]) - np.maximum(b[:,np.newaxis,0], b[np.newaxis,:,0]), 0)
+    ih = np.maximum(np.minimum(b[:,np.newaxis,3], b[np.newaxis,:,3]) - np.maximum(b[:,np.newaxis,1], b[np.newaxis,:,1]), 0)
+    overlap = (iw * ih) > iou * np.maximum(area[:,np.newaxis] + area[np.newaxis,:] - (iw * ih), np.finfo(np.float64).eps)  # NxN iou > threshold
+    keep = np.ones(len(b), dtype=bool)
+    for k in range(0, len(b)):
+        if keep[k]:
+            keep[k+1:] &= ~overlap[k, k+1:]
+    return order[keep]
+
+
 def imagebox(shape):
     return BoundingBox(xmin=0, ymin=0, width=shape[1], height=shape[0])
 
@@ -1,13 +1,19 @@
 import os
 import webbrowser
 import tempfile
+import importlib.util
 import vipy.math
 
 
 # Global mutable dictionary
 GLOBAL = {'VERBOSE': False, 
           'DASK_CLIENT': None,
-          'CACHE':None}
+          'EXECUTOR': {'process':None, 'thread':None},
+          'PICKLE_ARRAYS': True,
+          'CACHE':None,
+          'RESIZE_BACKEND': 'pil',
+          'WARP_BACKEND': 'cv2' if importlib.util.find_spec('cv2') is not None else 'numpy',  # opencv is optional
+          'IMAGE_CACHE': None}
 
 
 def cache(cachedir=None):
@@ -24,9 +30,55 @@ def verbose(b=None):
     return GLOBAL['VERBOSE']
 
 
+def pickle_arrays(b=None):
+    """Include the loaded pixel buffers of vipy.video.Video and vipy.image.Image objects when pickled (e.g. when sent to vipy.batch.Batch workers).  
+       If False, objects are pickled without the array(), and must be reloaded from the filename or url.  This does not change clone().
+    """
+    if b is not None:
+        GLOBAL['PICKLE_ARRAYS'] = b
+    return GLOBAL['PICKLE_ARRAYS']
+
+
+def resize_backend(backend=None):
+    """The backend used for all image resizing in vipy.image, in ['pil', 'cv2', 'numpy', 'auto'].  
+    
+       * 'pil': PIL.Image.resize(), with antialiasing for downsampling (default)
+       * 'cv2': cv2.resize(), requires opencv-python
+       * 'numpy': separable resampling matrices with the same filters as PIL
+       * 'auto': the fastest backend for each (dtype, channels, interp, upsample or downsample) that agrees with PIL, selected by a one-time micro-benchmark per process
+    """
+    if backend is not None:
+        assert backend in ['pil', 'cv2', 'numpy', 'auto'], "Invalid resize backend '%s' - Must be in ['pil', 'cv2', 'numpy', 'auto']" % str(backend)
+        GLOBAL['RESIZE_BACKEND'] = backend
+    return GLOBAL['RESIZE_BACKEND']
+
+
+def warp_backend(backend=None):
+    """The backend used for affine and perspective image warps in vipy.geometry.imtransform(), in ['cv2', 'pil', 'numpy', 'auto'], where 'auto' is the fastest backend for each (dtype, channels, interp, transform) selected by a one-time micro-benchmark per process.  Defaults to 'cv2' if opencv is installed, otherwise 'numpy'"""
+    if backend is not None:
+        assert backend in ['pil', 'cv2', 'numpy', 'auto'], "Invalid warp backend '%s' - Must be in ['pil', 'cv2', 'numpy', 'auto']" % str(backend)
+        GLOBAL['WARP_BACKEND'] = backend
+    return GLOBAL['WARP_BACKEND']
+
+
+def imagecache(maxbytes=None):
+    """The process-wide decoded image cache for vipy.image.Image.load(), which is disabled by default.  
+    
+       Set maxbytes>0 to enable a vipy.image.ImageCache of decoded images up to maxbytes in total with least recently used eviction, or maxbytes=0 to disable.  Returns the cache, or None if disabled.
+
+    >>> vipy.globals.imagecache(2**30)  # 1GB
+    >>> vipy.globals.imagecache().stats()
+    """
+    if maxbytes is not None:
+        from vipy.image import ImageCache
+        GLOBAL['IMAGE_CACHE'] = ImageCache(maxbytes) if maxbytes > 0 else None
+    return GLOBAL['IMAGE_CACHE']
+
+
 class Dask(object):
-    def __init__(self, num_processes, dashboard=False):
-        assert isinstance(num_processes, int) and num_processes >=2, "num_processes must be >= 2"
+    def __init__(self, num_processes=None, dashboard=False, address=None, scheduler_file=None):
+        assert (address is not None or scheduler_file is not None) or (isinstance(num_processes, int) and num_processes >=2), "num_processes must be >= 2"
+        assert address is None or scheduler_file is None, "Provide one of address or scheduler_file"
 
         from vipy.util import try_import
         try_import('dask', 'dask distributed')
@@ -37,6 +89,12 @@ class Dask(object):
         
         dask_config_set({"distributed.comm.timeouts.tcp": "50s"})
         dask_config_set({"distributed.comm.timeouts.connect": "10s"})        
+        self._remote = address is not None or scheduler_file is not None
+        if self._remote:
+            # Existing scheduler with workers started on each node (e.g. 'dask-scheduler --scheduler-file f.json' and 'dask-worker --scheduler-file f.json --nthreads 1'), which are not shutdown by this client
+            self._client = Client(address=address, scheduler_file=scheduler_file, name='vipy', direct_to_workers=True)
+            self._num_processes = len(self._client.scheduler_info()['workers'])
+            return
         self._num_processes = num_processes
         self._client = Client(name='vipy', 
                               scheduler_port=0, 
@@ -49,15 +107,20 @@ class Dask(object):
                               local_directory=tempfile.mkdtemp())
 
     def __repr__(self):
-        return str('<vipy.globals.dask: num_processes=%d%s>' % (self._num_processes, '' if self._num_processes==0 or len(self._client.dashboard_link)==0 else ', dashboard="%s"' % str(self._client.dashboard_link)))
+        return str('<vipy.globals.dask: num_processes=%d%s%s>' % (self._num_processes, '' if not self._remote else ', scheduler="%s"' % str(self._client.scheduler.address), '' if self._num_processes==0 or len(self._client.dashboard_link)==0 else ', dashboard="%s"' % str(self._client.dashboard_link)))
 
     def dashboard(self):        
         webbrowser.open(self._client.dashboard_link) if len(self._client.dashboard_link)>0 else None
     
     def num_processes(self):
-        return self._num_processes
+        return self._num_processes if not self._remote or self._num_processes == 0 else len(self._client.scheduler_info()['workers'])
+
+    def isremote(self):
+        """Is this client connected to an existing scheduler, rather than a local cluster created by this client?"""
+        return self._remote
 
     def shutdown(self):
+        """Shutdown the local cluster, or disconnect from the existing scheduler without shutting down its workers"""
         self._client.close()
         self._num_processes = 0
         GLOBAL['DASK_CLIENT'] = None
@@ -67,16 +130,142 @@ class Dask(object):
         return self._client
 
     
-def dask(num_processes=None, dashboard=False):
-    """Return the local Dask client, can be accessed globally for parallel processing"""
-    if GLOBAL['DASK_CLIENT'] is None and num_processes is not None:
+def dask(num_processes=None, dashboard=False, address=None, scheduler_file=None):
+    """Return the Dask client, can be accessed globally for parallel processing.  
+    
+       * num_processes [int]: Create a local cluster with this many worker processes
+       * address [str]: Connect to an existing scheduler at this address (e.g. 'tcp://10.0.0.1:8786') for multi-node processing
+       * scheduler_file [str]: Connect to an existing scheduler described by this json file written by 'dask-scheduler --scheduler-file'
+
+    >>> vipy.globals.dask(scheduler_file='/shared/scheduler.json')
+    >>> vipy.batch.Batch(videos).map(lambda v: v.load().mindim(256).flush())  # uses the cluster
+    """
+    if address is not None or scheduler_file is not None:
+        if GLOBAL['DASK_CLIENT'] is not None:
+            GLOBAL['DASK_CLIENT'].shutdown()
+        GLOBAL['DASK_CLIENT'] = Dask(address=address, scheduler_file=scheduler_file)
+    elif GLOBAL['DASK_CLIENT'] is None and num_processes is not None:
         GLOBAL['DASK_CLIENT'] = Dask(num_processes, dashboard=dashboard)        
-    elif GLOBAL['DASK_CLIENT'] is not None and num_processes is not None and GLOBAL['DASK_CLIENT'].num_processes() != num_processes:
+    elif GLOBAL['DASK_CLIENT'] is not None and num_processes is not None and GLOBAL['DASK_CLIENT'].num_processes() != num_processes and not GLOBAL['DASK_CLIENT'].isremote():
         GLOBAL['DASK_CLIENT'].shutdown()
         GLOBAL['DASK_CLIENT'] = Dask(num_processes, dashboard=dashboard)        
     return GLOBAL['DASK_CLIENT']
 
 
+def _dillcall(payload):
+    """Call a dill serialized (function, args, kwargs) tuple in a worker process, so that lambda functions can be submitted to a process pool"""
+    import dill
+    (f, args, kwargs) = dill.loads(payload)
+    return f(*args, **kwargs)
+
+
+def _chain(src, dst):
+    """Copy the result, exception or cancellation of the completed concurrent.futures future src to the future dst, unless dst is already done (e.g. cancelled)"""
+    if dst.done():
+        return
+    if src.cancelled():
+        dst.cancel()
+    elif src.exception() is not None:
+        dst.set_exception(src.exception())
+    else:
+        dst.set_result(src.result())
+
+
+class Executor(object):
+    """Local process or thread pool for parallel processing with vipy.batch.Batch() on a single machine, without the scheduler, communication and startup overhead of a Dask cluster.
+
+       * backend='process':  A concurrent.futures process pool using forkserver (where available, otherwise spawn), such that worker processes are not forked from a parent with running threads (e.g. the thread pool), which can deadlock on a lock held at fork.  
+         Functions and arguments are serialized with dill to support lambda functions.  As with any non-fork start method, scripts that use the process pool must guard the entry point with if __name__ == '__main__'.
+       * backend='thread':  A concurrent.futures thread pool, which is best for work that releases the GIL, such as PIL resizing, ffmpeg subprocesses and downloads.
+
+       The executor provides the subset of the dask.distributed.Client interface used by vipy.batch.Batch().  Use dask for multi-node processing.
+    """
+    def __init__(self, num_processes, backend='process'):
+        assert isinstance(num_processes, int) and num_processes >= 1, "num_processes must be >= 1"
+        assert backend in ['process', 'thread'], "backend must be in ['process', 'thread']"
+        import concurrent.futures
+        import multiprocessing
+
+        self._num_processes = num_processes
+        self._backend = backend
+        self._futuretype = concurrent.futures.Future
+        if backend == 'thread':
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=num_processes)
+        else:
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=num_processes, mp_context=context)
+
+    def __repr__(self):
+        return str('<vipy.globals.executor: backend=%s, num_processes=%d>' % (self._backend, self._num_processes))
+
+    def num_processes(self):
+        return self._num_processes
+
+    def backend(self):
+        return self._backend
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._num_processes = 0
+        GLOBAL['EXECUTOR'][self._backend] = None
+        return self
+
+    def client(self):
+        return self
+
+    def close(self):
+        return self.shutdown()
+
+    def submit(self, f, *args, pure=None, **kwargs):
+        """Submit f(*args, **kwargs) to the pool and return a concurrent.futures.Future.  Future arguments are replaced with their results and the pure keyword is ignored, for compatibility with dask.
+        
+           If any future argument is not complete, this returns immediately with a future for the task, which is submitted to the pool when all future arguments complete, or fails with the exception of the first failed future argument.
+        """
+        import threading
+        pending = [a for a in args if isinstance(a, self._futuretype) and not a.done()]
+        if len(pending) > 0:
+            (future, remaining, lock) = (self._futuretype(), [len(pending)], threading.Lock())
+            def _submit(a):
+                with lock:
+                    remaining[0] -= 1
+                    if remaining[0] > 0:
+                        return
+                try:
+                    self.submit(f, *args, **kwargs).add_done_callback(lambda g: _chain(g, future))  # all arguments are done
+                except BaseException as e:
+                    if not future.done():
+                        future.set_exception(e)  # failed argument or pool shutdown
+            for a in pending:
+                a.add_done_callback(_submit)
+            return future
+        args = [a.result() if isinstance(a, self._futuretype) else a for a in args]
+        if self._backend == 'thread':
+            return self._pool.submit(f, *args, **kwargs)
+        import dill
+        return self._pool.submit(_dillcall, dill.dumps((f, args, kwargs)))
+
+    def map(self, f, objlist, pure=None):
+        return [self.submit(f, obj) for obj in objlist]
+
+    def scatter(self, obj, broadcast=False, hash=None):
+        """Objects are sent with each task in a local pool, so this returns the object unchanged, for compatibility with dask"""
+        return obj
+
+    def scheduler_info(self):
+        return {'workers':{k:{} for k in range(0, self._num_processes)}}
+
+
+def executor(num_processes=None, backend='process'):
+    """Return the local process pool or thread pool executor, can be accessed globally for parallel processing on a single machine.  This is used in conjunction with vipy.batch.Batch(..., backend='process'|'thread'|'auto')"""
+    assert backend in GLOBAL['EXECUTOR'], "backend must be in %s" % str(list(GLOBAL['EXECUTOR'].keys()))
+    if GLOBAL['EXECUTOR'][backend] is None and num_processes is not None:
+        GLOBAL['EXECUTOR'][backend] = Executor(num_processes, backend=backend)
+    elif GLOBAL['EXECUTOR'][backend] is not None and num_processes is not None and GLOBAL['EXECUTOR'][backend].num_processes() != num_processes:
+        GLOBAL['EXECUTOR'][backend].shutdown()
+        GLOBAL['EXECUTOR'][backend] = Executor(num_processes, backend=backend)
+    return GLOBAL['EXECUTOR'][backend]
+
+
 def num_workers(n=None):
     """Create n parallel Dask processes.  This is used in conjunction with vipy.batch.Batch()"""
     if n is not None:
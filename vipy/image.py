@@ -9,10 +9,13 @@ from vipy.util import isnumpy, isurl, isimageurl, \
     fileext, tempimage, mat2gray, imwrite, imwritegray, \
     tempjpg, filetail, isimagefile, remkdir, hasextension, \
     try_import, tolist, islistoflists, istupleoftuples, isstring, \
-    istuple, islist, isnumber, isnumpyarray
+    istuple, islist, isnumber, isnumpyarray, fastest
 from vipy.geometry import BoundingBox, imagebox
+import vipy.geometry
 import vipy.object
 import vipy.downloader
+import vipy.math
+import vipy.globals
 import urllib.request
 import urllib.error
 import urllib.parse
@@ -29,6 +32,102 @@ import types
 import hashlib
 from itertools import repeat
 import atexit
+import threading
+from collections import OrderedDict
+
+
+# Colorspace conversion graph for Image._convert().  Each edge (from, to) is a kernel f(img, inplace) on a uint8 or float32 HxWxC (or HxW for 'lum' and 'grey') array, where inplace=True if img is an 
+# intermediate buffer of the conversion that may be overwritten.  Kernels operate on the trailing axes, so that they also apply to NxHxWxC arrays in vipy.image.ImageBatch.  Each kernel is the fastest 
+# single pass implementation with identical results, which is a single PIL convert() for some conversions of HxWxC images (see script/benchmark_colorspace.py).
+def _swaprb(img, inplace=False):
+    """Swap the red and blue channels, rgb <-> bgr or rgba <-> bgra"""
+    if img.shape[-1] == 3:
+        return img[...,::-1] if inplace else np.copy(img)[...,::-1]  # by reference with negative stride
+    img = img if inplace else np.copy(img)
+    r = np.copy(img[...,0])
+    img[...,0] = img[...,2]
+    img[...,2] = r
+    return img
+
+
+def _dropalpha(img, inplace=False):
+    """rgba -> rgb or bgra -> bgr, by reference"""
+    return img[...,0:3]
+
+
+def _addalpha(img, inplace=False):
+    """rgb -> rgba or bgr -> bgra, with zero alpha"""
+    out = np.zeros(img.shape[0:-1] + (4,), dtype=np.uint8)
+    out[...,0:3] = img
+    return out
+
+
+def _tolum(img, inplace=False, weights=(19595, 38470, 7471)):
+    """rgb -> lum with ITU-R 601-2 weights in 16 bit fixed point, identical to PIL convert('L'), without float temporaries"""
+    if img.ndim == 3 and weights[0] == 19595 and img.flags['C_CONTIGUOUS']:
+        return np.array(PIL.Image.fromarray(img).convert('L'))
+    acc = np.multiply(img[...,0], np.uint32(weights[0]), dtype=np.uint32)
+    t = np.multiply(img[...,1], np.uint32(weights[1]), dtype=np.uint32)
+    acc += t
+    np.multiply(img[...,2], np.uint32(weights[2]), out=t, dtype=np.uint32)
+    acc += t
+    acc += 0x8000
+    acc >>= 16
+    return acc.astype(np.uint8)
+
+
+def _bgrtolum(img, inplace=False):
+    """bgr -> lum, without swapping channels"""
+    return _tolum(img, weights=(7471, 38470, 19595))
+
+
+def _fromlum(img, inplace=False):
+    """lum -> rgb or lum -> bgr"""
+    return np.array(PIL.Image.fromarray(img, mode='L').convert('RGB')) if img.ndim == 2 else np.repeat(img[...,np.newaxis], 3, axis=-1)
+
+
+def _lumtogrey(img, inplace=False):
+    """uint8 lum [0,255] -> float32 grey [0,1]"""
+    return np.multiply(img, np.float32(1.0 / 255.0), dtype=np.float32)
+
+
+def _greytolum(img, inplace=False):
+    """float32 grey [0,1] -> uint8 lum [0,255], truncated and clipped, identical to PIL convert('L') of mode 'F'"""
+    x = np.multiply(img, np.float32(255.0), out=img if inplace else None)
+    return np.clip(x, 0, 255, out=x).astype(np.uint8)
+
+
+def _rgbtohsv(img, inplace=False):
+    """rgb -> hsv, with PIL which is faster than an equivalent numpy kernel"""
+    return np.array(PIL.Image.fromarray(img).convert('HSV'))
+
+
+def _hsvtorgb(img, inplace=False):
+    """hsv -> rgb, with PIL which is faster than an equivalent numpy kernel"""
+    return np.array(PIL.Image.fromarray(img, mode='HSV').convert('RGB'))
+
+
+_COLORSPACE_EDGES = {('rgb', 'bgr'):_swaprb, ('bgr', 'rgb'):_swaprb, ('rgba', 'bgra'):_swaprb, ('bgra', 'rgba'):_swaprb,
+                     ('rgba', 'rgb'):_dropalpha, ('bgra', 'bgr'):_dropalpha, ('rgb', 'rgba'):_addalpha, ('bgr', 'bgra'):_addalpha,
+                     ('rgb', 'lum'):_tolum, ('bgr', 'lum'):_bgrtolum, ('lum', 'rgb'):_fromlum, ('lum', 'bgr'):_fromlum,
+                     ('lum', 'grey'):_lumtogrey, ('grey', 'lum'):_greytolum, ('rgb', 'hsv'):_rgbtohsv, ('hsv', 'rgb'):_hsvtorgb}
+_COLORSPACE_PATHS = {}
+
+
+def _colorspace_path(src, dst):
+    """Return the shortest list of edges (from, to) in the colorspace graph from colorspace src to colorspace dst"""
+    if (src, dst) not in _COLORSPACE_PATHS:
+        (visited, queue) = ({src:[]}, [src])  # breadth first search
+        while len(queue) > 0:
+            a = queue.pop(0)
+            for (s, b) in _COLORSPACE_EDGES.keys():
+                if s == a and b not in visited:
+                    visited[b] = visited[a] + [(a, b)]
+                    queue.append(b)
+        if dst not in visited:
+            raise ValueError('unsupported colorspace conversion "%s" -> "%s"' % (src, dst))
+        _COLORSPACE_PATHS[(src, dst)] = visited[dst]
+    return _COLORSPACE_PATHS[(src, dst)]
 
 
 class Image(object):
@@ -78,6 +177,8 @@ class Image(object):
         self._loader = None     # lambda function to load an image, set with loader() method
         self._array = None
         self._colorspace = None
+        self._lazy = False      # record transformations until load(), set with lazy() method
+        self._ops = []          # recorded transformations (name, args, (height, width)) applied on load()
         
         # Initialization
         self._filename = filename
@@ -117,6 +218,20 @@ class Image(object):
         """Called on np.array(self) for custom array container, (requires numpy >=1.16)"""
         return self.numpy()
     
+    def __getstate__(self):
+        """Exclude the loaded array when pickled if vipy.globals.pickle_arrays(False)"""
+        state = self.__dict__.copy()
+        if not vipy.globals.pickle_arrays():
+            state['_array'] = None
+        return state
+
+    def __deepcopy__(self, memo):
+        """Deep copy all attributes including the loaded array, bypassing the pickle state"""
+        im = self.__class__.__new__(self.__class__)
+        memo[id(self)] = im
+        im.__dict__.update(copy.deepcopy(self.__dict__, memo))
+        return im
+
     def __repr__(self):
         strlist = []
         if self.isloaded():
@@ -152,12 +267,25 @@ class Image(object):
         self._loader = f
         return self
 
-    def load(self, ignoreErrors=False, verbose=False):
-        """Load image to cached private '_array' attribute and return Image object"""
+    def load(self, ignoreErrors=False, verbose=False, mindim=None, maxdim=None):
+        """Load image to cached private '_array' attribute and return Image object.  Transformations recorded in lazy() mode are applied, fused, when loaded.
+        
+           If mindim or maxdim is provided and the image is not loaded, this is equivalent to load().mindim(mindim) or load().maxdim(maxdim), where JPEG images are decoded directly at the nearest larger 
+           DCT scale (1/2, 1/4 or 1/8) and resized to the remainder.  This reduces decode time and memory for thumbnails of large images.
+
+        >>> im = vipy.image.Image(filename='/path/to/large.jpg').load(maxdim=256)
+        """
+        if (mindim is not None or maxdim is not None) and self._array is None:
+            assert mindim is None or maxdim is None, "Provide one of mindim or maxdim"
+            lazy = self.__dict__.get('_lazy', False)
+            self.lazy(True)
+            self = self.mindim(mindim) if mindim is not None else self.maxdim(maxdim)  # recorded if lazy() is supported for this image, otherwise loaded and resized
+            self._lazy = lazy
         try:
             # Return if previously loaded image
             if self._array is not None:
                 return self
+            (ops, self._ops) = (self.__dict__.get('_ops', []), [])
 
             # Download URL to filename
             if self._url is not None:
@@ -168,7 +296,18 @@ class Image(object):
                 self._array = self._loader(self._filename).astype(np.float32)  # forcing float32
                 self.colorspace('float')
             elif isimagefile(self._filename):
-                self._array = np.array(PIL.Image.open(self._filename))  # RGB order!
+                k = next((k for (k, op) in enumerate(ops) if op[0] not in ['resize', 'crop', 'fliplr']), len(ops))
+                cache = vipy.globals.imagecache()
+                key = (os.path.abspath(self._filename), os.stat(self._filename).st_mtime_ns, tuple(ops[0:k])) if cache is not None else None  # decode params are the fused transformations
+                (self._array, k) = (cache.get(key) if cache is not None else None) or (None, k)  # read-only
+                if self._array is None:
+                    pim = PIL.Image.open(self._filename)
+                    k = k if pim.mode in ['RGB', 'RGBA', 'L'] else 0
+                    pim = self._fusedgeometry(pim, ops[0:k]) if k > 0 else pim  # leading geometric transformations fused with the decode
+                    self._array = np.array(pim)  # RGB order!
+                    if cache is not None:
+                        cache.put(key, self._array, k)
+                ops = ops[k:]
                 if self.istransparent():
                     self.colorspace('rgba')  # must be before iscolor()
                 elif self.iscolor():
@@ -206,8 +345,80 @@ class Image(object):
             else:
                 raise
 
+        # Apply the remaining lazy transformations, fusing each run of consecutive geometric transformations
+        while len(ops) > 0 and self._array is not None:
+            k = next((k for (k, op) in enumerate(ops) if op[0] not in ['resize', 'crop', 'fliplr']), len(ops))
+            if k > 0 and any([op[0] == 'resize' for op in ops[0:k]]):
+                self._array = np.array(self._fusedgeometry(self.pil(), ops[0:k]))
+            elif k > 0:
+                self._array = self._fusedgeometry(self._array, ops[0:k])
+            else:
+                (name, args, shape) = ops[0]
+                (k, _) = (1, Image.zeropad(self, *args) if name == 'zeropad' else self._convert(args))
+            ops = ops[k:]
+        return self
+
+    def lazy(self, b=True):
+        """Record the spatial transformations and colorspace conversions of an image that is not loaded, and apply them when the pixels are needed (e.g. load(), numpy(), show()).
+        
+           The chain of transformations is fused when loaded: consecutive resizes are collapsed, crops are pushed before resizes, and each run of crops, resizes and flips is a single PIL resize(box=...) or crop() 
+           of the decoded image followed by at most one flip.  Resampling with fused resizes may differ from the eager chain by interpolation rounding.  The image size is read from the file header without decoding.
+           JPEG images that are downscaled by the leading transformations are decoded at the nearest larger DCT scale (1/2, 1/4 or 1/8) with PIL draft().
+           Transformations that are not recorded (e.g. channels(), mat2gray()) load the image first.
+        
+        >>> im = vipy.image.Image(filename='/path/to/image.jpg').lazy().mindim(256).centersquare().rgb()  # not loaded
+        >>> im.numpy()  # loaded with one decode and one resize of the center square
+        """
+        (self._lazy, self._ops) = (b, self.__dict__.get('_ops', []))
         return self
 
+    def _islazy(self):
+        """Should the next transformation be recorded rather than applied?"""
+        return self.__dict__.get('_lazy', False) and self._array is None and self._loader is None and ((self._filename is not None and isimagefile(self._filename)) or (self._filename is None and self._url is not None))
+
+    def _lazyshape(self):
+        """Return the (height, width) of the image after the recorded transformations, from the file header"""
+        if len(self._ops) > 0:
+            return self._ops[-1][2]
+        if not self.hasfilename() and self._url is not None:
+            self.download()
+        with PIL.Image.open(self._filename) as pim:
+            return (pim.size[1], pim.size[0])  # header only
+
+    def _record(self, name, args, shape):
+        """Record a transformation in lazy() mode, with the (height, width) of the image after the transformation"""
+        self._ops.append( (name, args, tuple(shape)) )
+        return self
+
+    def _fusedgeometry(self, img, ops):
+        """Apply a list of recorded 'resize', 'crop' and 'fliplr' transformations to a PIL image as at most one PIL resize(box=...) or crop() and one flip, or to a numpy array as one slice"""
+        (W, H) = img.size if not isnumpy(img) else (img.shape[1], img.shape[0])
+        (box, size, flip, interp) = ((0.0, 0.0, float(W), float(H)), (W, H), False, None)  # source box (xmin, ymin, xmax, ymax) resampled to output size (width, height)
+        for (name, args, shape) in ops:
+            if name == 'resize':
+                (size, interp) = ((args[0], args[1]), args[2])  # consecutive resizes collapse
+            elif name == 'crop':
+                (xmin, ymin, xmax, ymax) = args
+                (xmin, xmax) = (size[0] - xmax, size[0] - xmin) if flip else (xmin, xmax)  # crop of flipped output is the mirrored crop of the source
+                (sx, sy) = ((box[2] - box[0]) / size[0], (box[3] - box[1]) / size[1])
+                box = (box[0] + xmin*sx, box[1] + ymin*sy, box[0] + xmax*sx, box[1] + ymax*sy)  # crop pushed before resize
+                size = (xmax - xmin, ymax - ymin)
+            elif name == 'fliplr':
+                flip = not flip
+        if interp is not None and not isnumpy(img) and img.format == 'JPEG':
+            s = max(size[0] / (box[2] - box[0]), size[1] / (box[3] - box[1]))  # output pixels per source pixel
+            if s < 1 and img.draft(img.mode, (int(np.ceil(s*W)), int(np.ceil(s*H)))) is not None:  # decode with DCT scaling to the nearest size larger than requested
+                (dx, dy) = (img.size[0] / W, img.size[1] / H)
+                box = (box[0]*dx, box[1]*dy, box[2]*dx, box[3]*dy)
+        if interp is not None and not (all([float(b).is_integer() for b in box]) and size == (box[2] - box[0], box[3] - box[1])):
+            img = img.resize(size, self._interp_string_to_pil_interpolation(interp), box=box)
+        elif box != (0.0, 0.0, float(W), float(H)):
+            box = tuple([int(round(b)) for b in box])
+            img = img.crop(box) if not isnumpy(img) else img[box[1]:box[3], box[0]:box[2]]
+        if flip:
+            img = img.transpose(PIL.Image.FLIP_LEFT_RIGHT) if not isnumpy(img) else np.fliplr(img)
+        return img
+
     def download(self, ignoreErrors=False, timeout=10, verbose=False):
         """Download URL to filename provided by constructor, or to temp filename"""
         if self._url is None and self._filename is not None:
@@ -280,6 +491,10 @@ class Image(object):
     def isloaded(self):
         return self._array is not None
 
+    def nbytes(self):
+        """Return the number of bytes of the loaded image array, or None if not loaded"""
+        return self._array.nbytes if self.isloaded() else None
+
     def channels(self):
         """Return integer number of color channels"""
         return 1 if self.load().array().ndim == 2 else self.load().array().shape[2]
@@ -306,18 +521,18 @@ class Image(object):
         return os.path.getsize(self._filename)
 
     def width(self):
-        return self.load().array().shape[1]
+        return self.load().array().shape[1] if not self._islazy() else self._lazyshape()[1]
 
     def height(self):
-        return self.load().array().shape[0]
+        return self.load().array().shape[0] if not self._islazy() else self._lazyshape()[0]
 
     def shape(self):
         """Return the (height, width) or equivalently (rows, cols) of the image"""
-        return (self.load().height(), self.width())
+        return (self.height(), self.width())
 
     def centroid(self):
         """Return the real valued center pixel coordinates of the image (col=x,row=y)"""
-        return (self.load().width() / 2.0, self.height() / 2.0)
+        return (self.width() / 2.0, self.height() / 2.0)
 
     def centerpixel(self):
         """Return the integer valued center pixel coordinates of the image (col=i,row=j)"""
@@ -388,11 +603,17 @@ class Image(object):
         """Alias for numpy()"""
         return self.numpy()
 
-    def numpy(self):
-        """Convert vipy.image.Image to numpy array, returns writeable array"""
+    def numpy(self, mean=None, std=None, scale=None, out=None, dtype=None):
+        """Convert vipy.image.Image to numpy array, returns writeable array by reference.
+
+           If any of (mean, std, scale, out, dtype) are provided, return a new float array ((scale*img) - mean) / std of the same shape as the image (HxWxC, or HxW for greyscale), with fused type conversion and normalization, 
+           written into the preallocated array out if provided.  Scale defaults to 1.0, dtype defaults to np.float32.  This does not change the image buffer.
+        """
         self.load()
-        self._array = np.copy(self._array) if not self._array.flags['WRITEABLE'] else self._array  # triggers copy         
-        return self._array
+        if mean is None and std is None and scale is None and out is None and dtype is None:
+            self._array = np.copy(self._array) if not self._array.flags['WRITEABLE'] else self._array  # triggers copy         
+            return self._array
+        return vipy.math.normalize(self._array, mean=mean, std=std, scale=scale if scale is not None else 1.0, out=out, dtype=dtype if dtype is not None else np.float32)
 
     def pil(self):
         """Convert vipy.image.Image to PIL Image, by reference"""
@@ -401,11 +622,22 @@ class Image(object):
             self.rgb()
         return PIL.Image.fromarray(self.tonumpy())
 
-    def torch(self):
-        """Convert the batch of 1 HxWxC images to a 1xCxHxW torch tensor, by reference"""
+    def torch(self, mean=None, std=None, scale=None, out=None, dtype=None):
+        """Convert the batch of 1 HxWxC images to a 1xCxHxW torch tensor, by reference.
+
+           If any of (mean, std, scale, out, dtype) are provided, return a new 1xCxHxW float tensor ((scale*img) - mean) / std, with fused type conversion, normalization and transpose,
+           written into the preallocated tensor out if provided.  Scale defaults to 1.0/255.0 for uint8 colorspaces following torchvision.transforms.ToTensor(), dtype defaults to torch.float32.
+        """
         try_import('torch'); import torch
         img = self.numpy() if self.iscolor() else np.expand_dims(self.numpy(), 2)  # HxW -> HxWx1
-        return torch.from_numpy(np.expand_dims(img,0).transpose(0,3,1,2))  # HxWxC -> 1xCxHxW
+        if mean is None and std is None and scale is None and out is None and dtype is None:
+            return torch.from_numpy(np.expand_dims(img,0).transpose(0,3,1,2))  # HxWxC -> 1xCxHxW
+        shape = (1, img.shape[2], img.shape[0], img.shape[1])
+        out = torch.empty(shape, dtype=dtype if dtype is not None else torch.float32) if out is None else out
+        assert isinstance(out, torch.Tensor) and tuple(out.shape) == shape and out.device.type == 'cpu', "Invalid output - must be preallocated CPU torch tensor of shape %s" % str(shape)
+        scale = scale if scale is not None else (1.0/255.0 if img.dtype == np.uint8 else 1.0)
+        vipy.math.normalize(img, mean=mean, std=std, scale=scale, out=out.numpy()[0], axes=(2,0,1))  # HxWxC -> CxHxW
+        return out
 
     def fromtorch(self, x):
         """Convert a 1xCxHxW torch.FloatTensor to HxWxC np.float32 numpy array(), returns new Image() instance with selected colorspace"""
@@ -559,7 +791,7 @@ class Image(object):
         
     # Spatial transformations
     def resize(self, cols=None, rows=None, width=None, height=None, interp='bilinear'):
-        """Resize the image buffer to (rows x cols) with bilinear interpolation.  If rows or cols is provided, rescale image maintaining aspect ratio"""
+        """Resize the image buffer to (rows x cols) with bilinear interpolation using the backend vipy.globals.resize_backend().  If rows or cols is provided, rescale image maintaining aspect ratio"""
         assert not (cols is not None and width is not None), "Define either width or cols"
         assert not (rows is not None and height is not None), "Define either height or rows"
         rows = rows if height is None else height
@@ -570,9 +802,10 @@ class Image(object):
             else:
                 scale = float(cols) / float(self.width())
             self.rescale(scale)
-
+        elif self._islazy():
+            self._record('resize', (cols, rows, interp), (rows, cols))
         else:
-            self._array = np.array(self.load().pil().resize((cols, rows), self._interp_string_to_pil_interpolation(interp)))
+            self._array = _resize(self.load().array(), cols, rows, interp=interp)
         return self
 
     def resize_like(self, im, interp='bilinear'):
@@ -582,8 +815,10 @@ class Image(object):
     
     def rescale(self, scale=1, interp='bilinear'):
         """Scale the image buffer by the given factor - NOT idemponent"""
-        (height, width) = self.load().shape()
-        self._array = np.array(self.pil().resize((int(np.round(scale * width)), int(np.round(scale * height))), self._interp_string_to_pil_interpolation(interp)))
+        (height, width) = self.load().shape() if not self._islazy() else self._lazyshape()
+        if self._islazy():
+            return self._record('resize', (int(np.round(scale * width)), int(np.round(scale * height)), interp), (int(np.round(scale * height)), int(np.round(scale * width))))
+        self._array = _resize(self._array, int(np.round(scale * width)), int(np.round(scale * height)), interp=interp)
         return self
 
     def maxdim(self, dim, interp='bilinear'):
@@ -608,16 +843,13 @@ class Image(object):
             padwidth = (padwidth, padwidth)
         if not isinstance(padheight, tuple):
             padheight = (padheight, padheight)
-        if self.iscolor():
-            pad_shape = (padheight, padwidth, (0, 0))
-        else:
-            pad_shape = (padheight, padwidth)
-
+        if self._islazy():
+            assert all([x>=0 for x in padheight]) and all([x>=0 for x in padwidth]), "padding must be positive"
+            return self._record('zeropad', (padwidth, padheight), (self.height() + sum(padheight), self.width() + sum(padwidth)))
         assert all([x>=0 for x in padheight]) and all([x>=0 for x in padwidth]), "padding must be positive"
-        self._array = np.pad(self.load().array(),
-                             pad_width=pad_shape,
-                             mode='constant',
-                             constant_values=0)
+        img = self.load().array()
+        self._array = np.zeros( (img.shape[0] + sum(padheight), img.shape[1] + sum(padwidth)) + img.shape[2:], dtype=img.dtype)  # output buffer only
+        self._array[padheight[0]:padheight[0]+img.shape[0], padwidth[0]:padwidth[0]+img.shape[1]] = img
         return self
 
     def zeropadlike(self, width, height):
@@ -647,19 +879,19 @@ class Image(object):
 
     def minsquare(self):
         """Crop image of size (HxW) to (min(H,W), min(H,W)), keeping upper left corner constant"""
-        S = np.min(self.load().shape())
+        S = np.min(self.shape())
         return self._crop(BoundingBox(xmin=0, ymin=0, width=S, height=S))
 
     def maxsquare(self):
         """Crop image of size (HxW) to (max(H,W), max(H,W)) with zeropadding, keeping upper left corner constant"""
-        S = np.max(self.load().shape())
+        S = np.max(self.shape())
         dW = S - self.width()
         dH = S - self.height()
         return self.zeropad((0,dW), (0,dH))._crop(BoundingBox(0, 0, width=S, height=S))
 
     def maxmatte(self):
         """Crop image of size (HxW) to (max(H,W), max(H,W)) with balanced zeropadding forming a letterbox with top/bottom matte or pillarbox with left/right matte"""
-        S = np.max(self.load().shape())
+        S = np.max(self.shape())
         dW = S - self.width()
         dH = S - self.height()
         return self.zeropad((int(np.floor(dW//2)), int(np.ceil(dW//2))), (int(np.floor(dH//2)), int(np.ceil(dH//2))))._crop(BoundingBox(0, 0, width=S, height=S))
@@ -676,7 +908,10 @@ class Image(object):
     def _crop(self, bbox):
         """Crop the image buffer using the supplied bounding box object, clipping the box to the image rectangle"""
         assert isinstance(bbox, BoundingBox) and bbox.valid(), "Invalid vipy.geometry.BoundingBox() input"""
-        if not bbox.isdegenerate() and bbox.hasoverlap(self.load().array()):
+        if self._islazy() and not bbox.isdegenerate() and bbox.hasoverlap(width=self.width(), height=self.height()):
+            bbox = bbox.imclipshape(self.width(), self.height()).int()
+            return self._record('crop', (bbox.xmin(), bbox.ymin(), bbox.xmax(), bbox.ymax()), (bbox.ymax() - bbox.ymin(), bbox.xmax() - bbox.xmin()))
+        elif not self._islazy() and not bbox.isdegenerate() and bbox.hasoverlap(self.load().array()):
             bbox = bbox.imclip(self.load().array()).int()
             self._array = self.array()[bbox.ymin():bbox.ymax(),
                                        bbox.xmin():bbox.xmax()]
@@ -686,78 +921,73 @@ class Image(object):
     
     def fliplr(self):
         """Mirror the image buffer about the vertical axis - Not idemponent"""
+        if self._islazy():
+            return self._record('fliplr', (), self.shape())
         self._array = np.fliplr(self.load().array())
         return self
 
     def imagebox(self):
         """Return the bounding box for the image rectangle"""
         return BoundingBox(xmin=0, ymin=0, width=self.width(), height=self.height())
+
+    def pyramid(self, scales=(1.0, 0.5, 0.25), interp='bilinear'):
+        """Yield this image rescaled to each of the decreasing scales, where each level is resized incrementally from the previous level rather than from this image.
+
+           * Each level is a clone with the attribute 'pyramid' set to the scale relative to this image, which is used by tiles() and vipy.image.mergetiles() to map back to this image
+           * Levels with the same scale as the previous level share the array by reference (e.g. the first level of scale 1.0), and objects of a vipy.image.Scene are rescaled with each level
+
+        >>> for im in vipy.image.Image(filename='/path/to/4k.jpg').pyramid((1.0, 0.5, 0.25)):
+        >>>     tiles = list(im.tiles((512, 512), overlap=64))
+        """
+        assert len(scales) > 0 and all([s > 0 for s in scales]) and all([s1 >= s2 for (s1, s2) in zip(scales[:-1], scales[1:])]), "Invalid scales - Must be decreasing positive scales"
+        (im, scale) = (self.load(), 1.0)
+        for s in scales:
+            level = im.clone(flushforward=True)
+            level._array = im._array  # by reference
+            level = level.rescale(float(s) / scale, interp=interp) if s != scale else level
+            level.setattribute('pyramid', float(s))
+            (im, scale) = (level, s)
+            yield level
+
+    def tiles(self, size, overlap=0):
+        """Yield vipy.image.Scene tiles of size=(height, width) in raster order with overlap pixels between adjacent tiles, where the array of each tile is a view of this image buffer.
+
+           * The last row and column of tiles are shifted to align with the image border, such that all tiles have the requested size (or the image size, for images smaller than the tile)
+           * Objects of a vipy.image.Scene that overlap a tile are translated to tile coordinates and are not clipped (see imclip())
+           * Each tile has the attribute 'tile'=(xmin, ymin, scale), the offset of the tile in this image and the pyramid() scale of this image, for vipy.image.mergetiles()
+           * Tiles are views, so an in-place transformation of a tile modifies this image.  Use clone() for a copy.
+        """
+        assert isinstance(size, tuple) and len(size) == 2 and isinstance(overlap, int), "Invalid input - size=(height, width) and integer overlap"
+        (H, W) = self.load().shape()
+        (h, w) = (min(size[0], H), min(size[1], W))
+        assert h > overlap and w > overlap, "Overlap must be less than the tile size"
+        (ys, xs) = (list(range(0, H-h+1, h-overlap)), list(range(0, W-w+1, w-overlap)))
+        (ys, xs) = (ys + ([H-h] if ys[-1] != H-h else []), xs + ([W-w] if xs[-1] != W-w else []))  # align to border
+        (scale, objects) = (self.getattribute('pyramid') if self.hasattribute('pyramid') else 1.0, self._objectlist if isinstance(self, Scene) else [])
+        for y in ys:
+            for x in xs:
+                tile = Scene(array=self._array[y:y+h, x:x+w], colorspace=self.colorspace(), category=self.category() if isinstance(self, ImageCategory) else None,
+                             objects=[bb.clone().translate(-x, -y) for bb in objects if bb.clone().translate(-x, -y).hasoverlap(width=w, height=h)])
+                tile.setattribute('tile', (x, y, scale))
+                yield tile
     
     # Color conversion
     def _convert(self, to):
-        """Supported colorspaces are rgb, rgbab, bgr, bgra, hsv, grey, lum, float"""
+        """Supported colorspaces are rgb, rgba, bgr, bgra, hsv, grey, lum, float.
+        
+           Conversion follows the shortest path in the colorspace graph (vipy.image._COLORSPACE_EDGES), where each edge is a single vectorized numpy kernel or lookup table.  
+           Intermediate buffers along the path are overwritten in place where the dtype allows, and the image buffer is never modified in place.
+        """
         to = to if to != 'gray' else 'grey'  # standardize 'gray' -> 'grey' internally
+        if self._islazy():
+            return self._record('convert', to, self.shape())
         self.load()
         if self.colorspace() == to:
             return self
+        elif self.colorspace() is None:
+            raise ValueError('Colorspace must be initialized by constructor or colorspace() to allow for colorspace conversion')
         elif to == 'float':
-            img = self.load().array()  # any type
-            self._array = np.array(img).astype(np.float32)  # typecast to float32
-        elif self.colorspace() == 'lum':
-            img = self.load().array()  # single channel, uint8 [0,255]
-            assert img.dtype == np.uint8
-            img = np.squeeze(img, axis=2) if img.ndim == 3 and img.shape[2] == 1 else img  # remove singleton channel            
-            self._array = np.array(PIL.Image.fromarray(img, mode='L').convert('RGB'))  # uint8 luminance [0,255] -> uint8 RGB
-            self.colorspace('rgb')
-            self._convert(to)
-        elif self.colorspace() in ['gray', 'grey']:
-            img = self.load().array()  # single channel float32 [0,1]
-            img = np.squeeze(img, axis=2) if img.ndim == 3 and img.shape[2] == 1 else img  # remove singleton channel                        
-            self._array = np.array(PIL.Image.fromarray(255.0 * img, mode='F').convert('RGB'))  # float32 gray [0,1] -> float32 gray [0,255] -> uint8 RGB
-            self.colorspace('rgb')
-            self._convert(to)
-        elif self.colorspace() == 'rgba':
-            img = self.load().array()  # uint8 RGBA
-            if to == 'bgra':
-                self._array = np.array(img)[:,:,::-1]  # uint8 RGBA -> uint8 ABGR
-                self._array = self._array[:,:,[1,2,3,0]]  # uint8 ABGR -> uint8 BGRA
-            elif to == 'rgb':
-                self._array = self._array[:,:,0:-1]  # uint8 RGBA -> uint8 RGB
-            else:
-                self._array = self._array[:,:,0:-1]  # uint8 RGBA -> uint8 RGB
-                self.colorspace('rgb')
-                self._convert(to)
-        elif self.colorspace() == 'rgb':
-            img = self.load().array()  # uint8 RGB
-            if to in ['grey', 'gray']:
-                self._array = (1.0 / 255.0) * np.array(PIL.Image.fromarray(img).convert('L')).astype(np.float32)  # uint8 RGB -> float32 Grey [0,255] -> float32 Grey [0,1]
-            elif to == 'bgr':
-                self._array = np.array(img)[:,:,::-1]  # uint8 RGB -> uint8 BGR
-            elif to == 'hsv':
-                self._array = np.array(PIL.Image.fromarray(img).convert('HSV'))  # uint8 RGB -> uint8 HSV
-            elif to == 'lum':
-                self._array = np.array(PIL.Image.fromarray(img).convert('L'))  # uint8 RGB -> uint8 Luminance (integer grey)
-            elif to == 'rgba':
-                self._array = np.dstack((img, np.zeros((img.shape[0], img.shape[1]), dtype=np.uint8)))
-            elif to == 'bgra':
-                self._array = np.array(img)[:,:,::-1]  # uint8 RGB -> uint8 BGR
-                self._array = np.dstack((self._array, np.zeros((img.shape[0], img.shape[1]), dtype=np.uint8)))  # uint8 BGR -> uint8 BGRA
-        elif self.colorspace() == 'bgr':
-            img = self.load().array()  # uint8 BGR
-            self._array = np.array(img)[:,:,::-1]  # uint8 BGR -> uint8 RGB
-            self.colorspace('rgb')
-            self._convert(to)
-        elif self.colorspace() == 'bgra':
-            img = self.load().array()  # uint8 BGRA
-            self._array = np.array(img)[:,:,::-1]  # uint8 BGRA -> uint8 ARGB
-            self._array = self._array[:,:,[1,2,3,0]]  # uint8 ARGB -> uint8 RGBA
-            self.colorspace('rgba')
-            self._convert(to)
-        elif self.colorspace() == 'hsv':
-            img = self.load().array()  # uint8 HSV
-            self._array = np.array(PIL.Image.fromarray(img, mode='HSV').convert('RGB'))  # uint8 HSV -> uint8 RGB
-            self.colorspace('rgb')
-            self._convert(to)
+            self._array = self.load().array().astype(np.float32)  # any type -> float32, copied
         elif self.colorspace() == 'float':
             img = self.load().array()  # float32
             if np.max(img) > 1 or np.min(img) < 0:
@@ -766,16 +996,20 @@ class Image(object):
             if not self.channels() in [1,3]:
                 raise ValueError('Float image must be single channel or three channel RGB in the range float32 [0,1] prior to conversion')
             if self.channels() == 3:  # assumed RGB
-                self._array = np.uint8(255 * self.array())   # float32 RGB [0,1] -> uint8 RGB [0,255]
+                self._array = np.uint8(255 * img)   # float32 RGB [0,1] -> uint8 RGB [0,255]
                 self.colorspace('rgb')
             else:
-                self._array = (1.0 / 255.0) * np.array(PIL.Image.fromarray(np.uint8(255 * self.array())).convert('L')).astype(np.float32)  # float32 RGB [0,1] -> float32 gray [0,1]                
+                self._array = _lumtogrey(np.uint8(255 * (np.squeeze(img, axis=2) if img.ndim == 3 else img)))  # float32 [0,1] -> float32 grey [0,1] quantized to 8 bits
                 self.colorspace('grey')
             self._convert(to)
-        elif self.colorspace() is None:
-            raise ValueError('Colorspace must be initialized by constructor or colorspace() to allow for colorspace conversion')
         else:
-            raise ValueError('unsupported colorspace "%s"' % self.colorspace())
+            img = self.load().array()
+            if self.colorspace() == 'lum':
+                assert img.dtype == np.uint8
+            img = np.squeeze(img, axis=2) if (self.colorspace() in ['lum', 'grey'] and img.ndim == 3 and img.shape[2] == 1) else img  # remove singleton channel
+            for (a, b) in _colorspace_path(self.colorspace(), to):
+                img = _COLORSPACE_EDGES[(a, b)](img, inplace=not np.may_share_memory(img, self._array))
+            self._array = img
 
         self.colorspace(to)
         return self
@@ -1325,8 +1559,8 @@ class ImageDetection(ImageCategory):
         if bbox is not None:
             assert isinstance(bbox, BoundingBox), "Invalid bounding box - Must be vipy.geometry.BoundingBox() "
         bbox = self.bbox if bbox is None else bbox
-        self.load().array()[int(bbox.ymin()):int(bbox.ymax()),
-                            int(bbox.xmin()):int(bbox.xmax())] = 0
+        self.load().numpy()[int(bbox.ymin()):int(bbox.ymax()),
+                            int(bbox.xmin()):int(bbox.xmax())] = 0  # numpy() copies read-only buffers
         return self
 
     def replace(self, img):
@@ -1335,7 +1569,7 @@ class ImageDetection(ImageCategory):
         if not (isnumpy(img) and img.shape == (self.bbox.int().height(), self.bbox.width(), self.channels()) and (img.dtype == self.array().dtype)):
             import pdb; pdb.set_trace()
         assert isnumpy(img) and img.shape == (self.bbox.int().height(), self.bbox.width(), self.channels()) and (img.dtype == self.array().dtype),  "Invalid replacement image - Must be same shape as box and same type as img"
-        self.array()[int(self.bbox.ymin()):int(self.bbox.ymax()),
+        self.numpy()[int(self.bbox.ymin()):int(self.bbox.ymax()),
                      int(self.bbox.xmin()):int(self.bbox.xmax())] = img
         return self
     
@@ -1536,15 +1770,42 @@ class Scene(ImageCategory):
         return self
 
     def padcrop(self, bbox):
-        """Crop the image buffer using the supplied bounding box object, zero padding if box is outside image rectangle, update all scene objects"""
-        self.zeropad(bbox.int().width(), bbox.int().height())
-        (dx, dy) = (bbox.width(), bbox.height())
-        bbox = bbox.translate(dx, dy)
-        self = super(ImageCategory, self)._crop(bbox)        
-        (dx, dy) = (bbox.xmin(), bbox.ymin())
+        """Crop the image buffer using the supplied bounding box object, zero padding if box is outside image rectangle, update all scene objects.  
+        
+           This is equivalent to zero padding the image by the box width and height on all sides then cropping, but allocates only the output buffer and copies the region of the box that intersects the image.
+        """
+        img = self.load().array()
+        (H, W) = (img.shape[0], img.shape[1])
+        (pw, ph) = (int(bbox.int().width()), int(bbox.int().height()))  # padding of the equivalent zeropad()
+        bbox = bbox.translate(pw, ph)  # padded coordinates
+        if not bbox.isdegenerate() and bbox.hasoverlap(width=W+2*pw, height=H+2*ph):
+            bbox = bbox.imclipshape(W+2*pw, H+2*ph).int()
+            (xmin, ymin, xmax, ymax) = (int(bbox.xmin()) - pw, int(bbox.ymin()) - ph, int(bbox.xmax()) - pw, int(bbox.ymax()) - ph)  # image coordinates
+            self._array = np.zeros( (ymax-ymin, xmax-xmin) + img.shape[2:], dtype=img.dtype)
+            (x0, y0, x1, y1) = (max(xmin, 0), max(ymin, 0), min(xmax, W), min(ymax, H))  # intersection with image rectangle
+            if x1 > x0 and y1 > y0:
+                self._array[y0-ymin:y1-ymin, x0-xmin:x1-xmin] = img[y0:y1, x0:x1]
+        else:
+            warnings.warn('BoundingBox for crop() does not intersect image rectangle - Ignoring')
+            self._array = np.pad(img, ((ph, ph), (pw, pw)) + ((0, 0),)*(img.ndim - 2), mode='constant')
+        (dx, dy) = (bbox.xmin() - pw, bbox.ymin() - ph)
         self._objectlist = [bb.translate(-dx, -dy) for bb in self._objectlist]
         return self
     
+    def crops(self, size, dilate=1.0, squareify=False, interp='bilinear'):
+        """Return an NxHxWxC numpy array of the N objects in the scene, each cropped and resized to size=(H,W) in a single vectorized pass over the image buffer.
+
+           * dilate: the dilation factor of each object box prior to crop
+           * squareify: if true, set each object box to maxsquare() prior to dilation, so that the aspect ratio of the object is preserved in the chip
+           * interp: 'bilinear' or 'nearest' sampling of the image at the pixel centers of the output grid in each box, without antialiasing
+           
+           Regions of the boxes outside the image rectangle are zero, as in padcrop(), without padding the image.  Chips are in the order of objects(), in the colorspace and dtype of the image.
+           This is equivalent to [im.padcrop(bb).resize(W,H).numpy() for bb in boxes] up to the resampling filter, without a crop, resize and PIL conversion per object.
+        """
+        assert isinstance(size, tuple) and len(size) == 2, "Invalid size - Must be tuple (height, width)"
+        boxes = [bb.clone().maxsquareif(squareify).dilate(dilate) for bb in self._objectlist]
+        return _cropresize(self.load().array(), np.array([bb.ulbr() for bb in boxes], dtype=np.float32).reshape(-1,4), size, interp=interp)
+    
     # Image export
     def rectangular_mask(self, W=None, H=None):
         """Return a binary array of the same size as the image (or using the
@@ -1608,6 +1869,392 @@ class Scene(ImageCategory):
             return outfile
 
 
+class ImageCache(object):
+    """vipy.image.ImageCache class
+
+    A least recently used cache of decoded image arrays with a budget of maxbytes in total, shared by all vipy.image.Image objects in this process and enabled with vipy.globals.imagecache(maxbytes).
+    Images are keyed on (filename, modification time, decode parameters), where the decode parameters are the transformations fused with the decode in lazy() mode, so a modified file is decoded again.
+    Cached arrays are read-only and are shared by reference by all images loaded from the same key, such that numpy() or an in-place transformation will copy.  Images larger than maxbytes are not cached.
+
+    >>> vipy.globals.imagecache(2**30)
+    >>> imlist = [vipy.image.ImageDetection(filename='/path/to/img.jpg', bbox=bb).crop() for bb in boxes]  # decoded once
+    >>> vipy.globals.imagecache().stats()
+    """
+    def __init__(self, maxbytes):
+        assert isinstance(maxbytes, int) and maxbytes > 0, "Invalid input - maxbytes must be a positive integer"
+        (self._maxbytes, self._nbytes, self._cache, self._lock) = (maxbytes, 0, OrderedDict(), threading.Lock())
+        (self._hits, self._misses, self._evictions) = (0, 0, 0)
+
+    def __repr__(self):
+        return str('<vipy.image.ImageCache: images=%d, bytes=%d, maxbytes=%d, hits=%d, misses=%d>' % (len(self), self._nbytes, self._maxbytes, self._hits, self._misses))
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def get(self, key):
+        """Return the (read-only array, decode params) for the key and mark it most recently used, or None if not cached, and update the hit and miss statistics"""
+        with self._lock:
+            if key in self._cache:
+                self._hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self._misses += 1
+            return None
+
+    def put(self, key, img, params=None):
+        """Cache the decoded numpy array img for the key along with the decode params, and evict least recently used images until the cache is within budget.  The cached array is set read-only, and arrays larger than the budget are not cached."""
+        if img.nbytes > self._maxbytes:
+            return self
+        img.flags.writeable = False
+        with self._lock:
+            if key in self._cache:
+                self._nbytes -= self._cache.pop(key)[0].nbytes
+            self._cache[key] = (img, params)
+            self._nbytes += img.nbytes
+            while self._nbytes > self._maxbytes:
+                self._nbytes -= self._cache.popitem(last=False)[1][0].nbytes
+                self._evictions += 1
+        return self
+
+    def clear(self):
+        """Remove all images from the cache and reset the statistics"""
+        with self._lock:
+            (self._nbytes, self._cache) = (0, OrderedDict())
+            (self._hits, self._misses, self._evictions) = (0, 0, 0)
+        return self
+
+    def nbytes(self):
+        """Total bytes of all cached arrays"""
+        return self._nbytes
+
+    def maxbytes(self):
+        return self._maxbytes
+
+    def stats(self):
+        """Return a dictionary of the cache statistics"""
+        return {'images':len(self), 'bytes':self._nbytes, 'maxbytes':self._maxbytes, 'hits':self._hits, 'misses':self._misses, 'evictions':self._evictions,
+                'hitrate':float(self._hits) / max(1, self._hits + self._misses)}
+
+
+def _resample_weights(n_in, n_out, interp='bilinear'):
+    """Return the (n_out x n_in) float32 matrix that resamples a signal of length n_in to length n_out, with the same pixel centers and antialiasing filter support as PIL resize()"""
+    assert interp in ['bilinear', 'bicubic', 'nearest'], "Invalid interp - Must be in ['bilinear', 'bicubic', 'nearest']"
+    scale = float(n_in) / float(n_out)
+    center = (np.arange(0, n_out) + 0.5) * scale  # output pixel centers in input coordinates
+    W = np.zeros((n_out, n_in), dtype=np.float64)
+    if interp == 'nearest':
+        center = np.cumsum(np.concatenate(([0.5*scale], np.full(n_out-1, scale))))  # accumulated pixel centers, as in PIL
+        W[np.arange(0, n_out), np.minimum(np.floor(center).astype(np.int64), n_in-1)] = 1.0
+        return W.astype(np.float32)
+    (support, kernel) = (1.0, lambda x: np.maximum(0, 1.0 - np.abs(x))) if interp == 'bilinear' else (2.0, lambda x: np.where(np.abs(x) < 1, (1.5*np.abs(x) - 2.5)*x*x + 1, np.where(np.abs(x) < 2, ((-0.5*np.abs(x) + 2.5)*np.abs(x) - 4)*np.abs(x) + 2, 0)))
+    fscale = max(scale, 1.0)  # filter is stretched for downsampling (antialiasing)
+    x = np.arange(0, n_in) + 0.5
+    W = kernel((x.reshape(1,-1) - center.reshape(-1,1)) / fscale)
+    W[np.abs(x.reshape(1,-1) - center.reshape(-1,1)) >= support*fscale] = 0
+    return (W / np.sum(W, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _resize_pil(img, cols, rows, interp='bilinear'):
+    """Resize the HxW or HxWxC array img to (rows x cols) with PIL.Image.resize().  Arrays that are not greyscale, RGB or RGBA uint8 are resized per channel as greyscale uint8 or float32 PIL images"""
+    resample = {'bilinear':PIL.Image.BILINEAR, 'bicubic':PIL.Image.BICUBIC, 'nearest':PIL.Image.NEAREST}[interp]
+    if img.dtype == np.uint8 and (img.ndim == 2 or img.shape[2] in [3,4]):
+        return np.array(PIL.Image.fromarray(img).resize((cols, rows), resample))
+    x = np.stack([np.array(PIL.Image.fromarray(np.ascontiguousarray(c, dtype=np.uint8 if img.dtype == np.uint8 else np.float32)).resize((cols, rows), resample)) for c in np.moveaxis(img.reshape(img.shape[0], img.shape[1], -1), 2, 0)], axis=2)
+    x = x.reshape((rows, cols) + img.shape[2:])
+    return x.astype(img.dtype) if not np.issubdtype(img.dtype, np.integer) else np.clip(np.round(x), np.iinfo(img.dtype).min, np.iinfo(img.dtype).max).astype(img.dtype)
+
+
+def _resize_cv2(img, cols, rows, interp='bilinear'):
+    """Resize the HxW or HxWxC array img to (rows x cols) with cv2.resize(), using pixel area interpolation for bilinear downsampling"""
+    try_import('cv2', 'opencv-python'); import cv2
+    downsample = cols < img.shape[1] or rows < img.shape[0]
+    flags = {'bilinear':cv2.INTER_AREA if downsample else cv2.INTER_LINEAR, 'bicubic':cv2.INTER_CUBIC, 'nearest':getattr(cv2, 'INTER_NEAREST_EXACT', cv2.INTER_NEAREST)}[interp]
+    return cv2.resize(img, (cols, rows), interpolation=flags).reshape((rows, cols) + img.shape[2:])  # cv2 drops singleton channels
+
+
+def _resize_numpy(img, cols, rows, interp='bilinear'):
+    """Resize the HxW or HxWxC array img to (rows x cols) as two matrix products with the same filters and pixel centers as PIL.Image.resize(), see also vipy.image.ImageBatch.resize()"""
+    (Wy, Wx) = (_resample_weights(img.shape[0], rows, interp), _resample_weights(img.shape[1], cols, interp))
+    if interp == 'nearest':
+        return img[np.argmax(Wy, axis=1)][:, np.argmax(Wx, axis=1)]
+    isint = np.issubdtype(img.dtype, np.integer)
+    x = np.matmul(Wx, img.reshape(img.shape[0], img.shape[1], -1).astype(np.float32))  # HxWxC -> HxcolsxC
+    x = np.clip(np.round(x), np.iinfo(img.dtype).min, np.iinfo(img.dtype).max) if isint else x  # horizontal pass is rounded to integer precision, as in PIL
+    x = np.matmul(Wy, x.reshape(img.shape[0], -1)).reshape((rows, cols) + img.shape[2:])  # Hx(cols*C) -> rowsxcolsxC
+    return x.astype(img.dtype) if not isint else np.clip(np.round(x), np.iinfo(img.dtype).min, np.iinfo(img.dtype).max).astype(img.dtype)
+
+
+_RESIZE_BACKENDS = {'pil':_resize_pil, 'cv2':_resize_cv2, 'numpy':_resize_numpy}  # vipy.globals.resize_backend()
+_RESIZE_AUTO = {}  # (dtype, channels, interp, downsample) -> fastest backend, memoized per process
+
+
+def _resize(img, cols, rows, interp='bilinear'):
+    """Resize the HxW or HxWxC array img to (rows x cols) with the backend vipy.globals.resize_backend().  
+    
+       The 'auto' backend is the fastest backend for the (dtype, channels, interp, downsample) of img, selected on first use by a micro-benchmark on a 256x256 random image of the same type, among those 
+       backends that are installed, support the input and agree with the first supported backend in ['pil', 'cv2', 'numpy'] to within two intensity levels.  Random images are used so that backends that do not antialias are rejected for downsampling.
+    """
+    assert interp in ['bilinear', 'bicubic', 'nearest'], "Invalid interp - Must be in ['bilinear', 'bicubic', 'nearest']"
+    backend = vipy.globals.resize_backend()
+    if backend == 'auto':
+        key = (img.dtype.str, img.shape[2] if img.ndim == 3 else 0, interp, cols*rows < img.shape[0]*img.shape[1])
+        if key not in _RESIZE_AUTO:
+            x = (np.random.RandomState(0).rand(*((256, 256) + img.shape[2:])) * 255).astype(img.dtype)
+            _RESIZE_AUTO[key] = fastest(_RESIZE_BACKENDS, (x, 160, 160, interp) if key[3] else (x, 400, 400, interp), atol=2)
+        backend = _RESIZE_AUTO[key]
+    return _RESIZE_BACKENDS[backend](img, cols, rows, interp)
+
+
+def _cropresize(img, boxes, size, interp='bilinear'):
+    """Crop the HxW or HxWxC array img with the Nx4 array of boxes (xmin, ymin, xmax, ymax), and resample each crop to size=(height, width), returning an NxHxW or NxHxWxC array of the same dtype as img.
+    
+       * The output pixel centers of each crop are sampled from the image with 'bilinear' or 'nearest' interpolation, without antialiasing (e.g. RoIAlign with one sample per bin)
+       * Samples outside the image rectangle are zero, without padding the image
+       * Sample coordinates are separable, so each of the (at most) four neighbors of all crops is a single gather from img
+    """
+    assert interp in ['bilinear', 'nearest'], "Invalid interp - Must be in ['bilinear', 'nearest']"
+    assert isinstance(boxes, np.ndarray) and boxes.ndim == 2 and boxes.shape[1] == 4, "Invalid boxes - Must be Nx4 array of (xmin, ymin, xmax, ymax)"
+    (H, W) = (int(size[0]), int(size[1]))
+    (imH, imW) = img.shape[0:2]
+    x = boxes[:,0:1] + (np.arange(0, W, dtype=np.float32).reshape(1,-1) + 0.5) * ((boxes[:,2:3] - boxes[:,0:1]) / W)  # NxW sample coordinates, pixel k has center k+0.5
+    y = boxes[:,1:2] + (np.arange(0, H, dtype=np.float32).reshape(1,-1) + 0.5) * ((boxes[:,3:4] - boxes[:,1:2]) / H)  # NxH
+    if interp == 'nearest':
+        neighbors = [(np.floor(y).astype(np.int64), np.ones_like(y), np.floor(x).astype(np.int64), np.ones_like(x))]
+    else:
+        (x, y) = (x - 0.5, y - 0.5)
+        (x0, y0) = (np.floor(x), np.floor(y))
+        (fx, fy) = (x - x0, y - y0)
+        (x0, y0) = (x0.astype(np.int64), y0.astype(np.int64))
+        neighbors = [(y0, 1-fy, x0, 1-fx), (y0, 1-fy, x0+1, fx), (y0+1, fy, x0, 1-fx), (y0+1, fy, x0+1, fx)]
+    
+    shape = (len(boxes), H, W) + img.shape[2:]
+    chips = np.zeros(shape, dtype=np.float32)
+    for (yi, wy, xi, wx) in neighbors:
+        wy = wy * ((yi >= 0) & (yi < imH))  # zero weight outside image rectangle
+        wx = wx * ((xi >= 0) & (xi < imW))
+        w = wy[:,:,np.newaxis] * wx[:,np.newaxis,:]  # NxHxW
+        chips += (w.reshape(w.shape + (1,)*(img.ndim-2)) * img[np.clip(yi, 0, imH-1)[:,:,np.newaxis], np.clip(xi, 0, imW-1)[:,np.newaxis,:]])
+    return chips if img.dtype == np.float32 else np.clip(np.round(chips), np.iinfo(img.dtype).min, np.iinfo(img.dtype).max).astype(img.dtype) if np.issubdtype(img.dtype, np.integer) else chips.astype(img.dtype)
+
+
+def mergetiles(tiles, iou=0.5):
+    """Map the objects of the vipy.image.Scene tiles from tiles() (e.g. the detections in each tile, at any level of pyramid()) to the coordinates of the tiled image, and merge duplicates with non-maximum suppression.
+    
+       * Returns the list of merged vipy.object.Detection in the coordinates of the image at scale 1.0, in decreasing order of confidence within each category
+       * Detections in the overlap of adjacent tiles or at multiple scales are suppressed per category with vipy.geometry.nms() if the intersection over union with a detection of higher confidence is greater than iou
+       * Detections without a confidence are treated as confidence zero
+
+    >>> dets = vipy.image.mergetiles([detector(t) for im in img.pyramid((1.0, 0.5)) for t in im.tiles((512, 512), overlap=64)])
+    >>> img = vipy.image.Scene(array=img.array(), colorspace=img.colorspace(), objects=dets)
+    """
+    assert all([isinstance(t, Scene) and t.hasattribute('tile') for t in tiles]), "Invalid input - Must be list of vipy.image.Scene from vipy.image.Image.tiles()"
+    dets = [d.clone().translate(t.getattribute('tile')[0], t.getattribute('tile')[1]).rescale(1.0 / t.getattribute('tile')[2]) for t in tiles for d in t.objects()]
+    merged = []
+    for c in sorted(set([d.category() for d in dets]), key=str):
+        catdets = [d for d in dets if d.category() == c]
+        keep = vipy.geometry.nms(np.array([d.ulbr() for d in catdets], dtype=np.float64).reshape(-1,4), [d.confidence() if d.confidence() is not None else 0 for d in catdets], iou=iou)
+        merged.extend([catdets[k] for k in keep])
+    return merged
+
+
+class ImageBatch(object):
+    """vipy.image.ImageBatch class
+
+    A batch of N images of the same size and colorspace, represented as a single contiguous NxHxWxC uint8 or float32 numpy array with per-image metadata.
+    Transformations are a single vectorized operation over the whole batch, rather than N calls to the same method of each vipy.image.Image (e.g. vipy.batch.Batch). 
+    This is useful for batches of small images of the same size, such as crops, MNIST digits or montage tiles.
+
+    >>> imb = vipy.image.ImageBatch([vipy.image.ImageDetection(filename='/path/to/img_%d.jpg' % k, xywh=(0,0,64,64)).crop() for k in range(0,100)])
+    >>> t = imb.fliplr().resize(32, 32).torch()  # 100x3x32x32
+    >>> imlist = imb.lum().images()  # list of 100 vipy.image.ImageDetection with the luminance array and the transformed boxes
+
+    Supported colorspaces are 'rgb', 'bgr', 'lum' and 'float'.  The metadata for each image is the image object without the array (e.g. the category, filename and attributes), and the bounding boxes of 
+    vipy.image.ImageDetection and vipy.image.Scene are transformed with the batch geometry by crop(), centercrop(), fliplr() and resize().
+    """
+    def __init__(self, images=None, array=None, colorspace=None):
+        assert (images is None) != (array is None), "Invalid input - Provide one of images or array"
+        if images is not None:
+            images = tolist(images)
+            assert len(images) > 0 and all([isinstance(im, Image) for im in images]), "Invalid input - Must be non-empty list of vipy.image.Image"
+            assert len(set([(im.load().shape(), im.channels(), im.colorspace(), im.array().dtype) for im in images])) == 1, "Invalid input - All images must have the same shape, channels and colorspace"
+            img = images[0].array()
+            self._array = np.empty((len(images),) + img.shape[0:2] + (img.shape[2] if img.ndim == 3 else 1,), dtype=img.dtype)  # contiguous NxHxWxC
+            for (k, im) in enumerate(images):
+                self._array[k] = im.array() if im.array().ndim == 3 else np.expand_dims(im.array(), 2)
+            self._colorspace = images[0].colorspace() if images[0].colorspace() != 'grey' else 'float'
+            self._images = [im.clone(flushforward=True) for im in images]
+        else:
+            assert isnumpyarray(array) and array.ndim in [3,4] and array.dtype in [np.uint8, np.float32], "Invalid input - array must be NxHxW or NxHxWxC numpy array of type uint8 or float32"
+            self._array = array if array.ndim == 4 else np.expand_dims(array, 3)
+            self._colorspace = colorspace if colorspace is not None else ('float' if array.dtype == np.float32 else ('rgb' if self._array.shape[3] == 3 else 'lum'))
+            self._images = [Image() for k in range(0, len(array))]
+        assert self._colorspace in ['rgb', 'bgr', 'lum', 'float'], "Invalid colorspace '%s' - Must be in ['rgb', 'bgr', 'lum', 'float']" % str(self._colorspace)
+        assert self._colorspace == 'float' or self._array.dtype == np.uint8, "Colorspace '%s' must be uint8" % self._colorspace
+
+    def __repr__(self):
+        return str('<vipy.image.ImageBatch: n=%d, height=%d, width=%d, channels=%d, color=%s>' % (len(self), self.height(), self.width(), self.channels(), self.colorspace()))
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, k):
+        """Return the kth image in the batch, with the array by reference"""
+        im = self._images[k].clone()
+        im._array = self._array[k] if self.channels() > 1 else self._array[k,:,:,0]
+        im._colorspace = self._colorspace
+        return im
+
+    def __iter__(self):
+        for k in range(0, len(self)):
+            yield self[k]
+
+    def images(self):
+        """Return the list of vipy.image.Image in the batch, with each array by reference"""
+        return [im for im in self]
+
+    def array(self):
+        """Return the NxHxWxC numpy array by reference"""
+        return self._array
+
+    def numpy(self):
+        """Alias for array()"""
+        return self.array()
+
+    def colorspace(self):
+        return self._colorspace
+
+    def shape(self):
+        """Return the (height, width) of each image in the batch"""
+        return (self.height(), self.width())
+
+    def height(self):
+        return self._array.shape[1]
+
+    def width(self):
+        return self._array.shape[2]
+
+    def channels(self):
+        return self._array.shape[3]
+
+    def _boxes(self):
+        """Return the list of all bounding boxes in the metadata of all images in the batch, which are transformed in place with the batch geometry"""
+        return [im.bbox for im in self._images if isinstance(im, ImageDetection)] + [bb for im in self._images if isinstance(im, Scene) for bb in im._objectlist]
+    
+    # Color conversion
+    def _convert(self, to):
+        """Convert the batch to the colorspace to in ['rgb', 'bgr', 'lum', 'float'] using vectorized kernels over the whole batch"""
+        assert to in ['rgb', 'bgr', 'lum', 'float'], "Invalid colorspace '%s' - Must be in ['rgb', 'bgr', 'lum', 'float']" % to
+        if self._colorspace == to:
+            return self
+        elif to == 'float':
+            self._array = self._array.astype(np.float32)  # uint8 [0,255] -> float32 [0,255], consistent with Image.float()
+        elif self._colorspace == 'float':
+            assert self.channels() in [1,3], "Float batch must be single channel or three channel RGB in the range float32 [0,1] prior to conversion"
+            img = np.empty(self._array.shape, dtype=np.uint8)
+            np.multiply(np.clip(self._array, 0, 1, out=np.empty_like(self._array)), 255, out=img, casting='unsafe')  # float32 [0,1] -> uint8 [0,255]
+            (self._array, self._colorspace) = (img, 'rgb' if self.channels() == 3 else 'lum')
+            return self._convert(to)
+        elif to == 'lum':
+            self._array = _COLORSPACE_EDGES[(self._colorspace, 'lum')](self._array)[...,np.newaxis]  # same kernels as Image._convert()
+        elif self._colorspace == 'lum':
+            self._array = _fromlum(self._array[...,0])
+        else:
+            self._array = _swaprb(self._array)
+        self._colorspace = to
+        return self
+
+    def rgb(self):
+        """Convert the batch to three channel RGB uint8 colorspace"""
+        return self._convert('rgb')
+
+    def bgr(self):
+        """Convert the batch to three channel BGR uint8 colorspace"""
+        return self._convert('bgr')
+
+    def lum(self):
+        """Convert the batch to single channel uint8 luminance"""
+        return self._convert('lum')
+
+    def float(self):
+        """Convert the batch to float32"""
+        return self._convert('float')
+
+    # Spatial transformations
+    def fliplr(self):
+        """Mirror all images in the batch about the vertical axis"""
+        self._array = np.ascontiguousarray(self._array[:,:,::-1,:])
+        for bb in self._boxes():
+            bb.fliplr(width=self.width())
+        return self
+
+    def crop(self, bbox):
+        """Crop all images in the batch with the same vipy.geometry.BoundingBox, clipped to the image rectangle"""
+        assert isinstance(bbox, BoundingBox) and bbox.valid(), "Invalid vipy.geometry.BoundingBox() input"
+        bbox = bbox.clone().imclipshape(self.width(), self.height()).int()
+        self._array = np.ascontiguousarray(self._array[:, bbox.ymin():bbox.ymax(), bbox.xmin():bbox.xmax(), :])
+        for bb in self._boxes():
+            bb.translate(-bbox.xmin(), -bbox.ymin())
+        return self
+
+    def centercrop(self, height, width):
+        """Crop all images in the batch to (height x width) in the center, keeping the image centroid constant"""
+        return self.crop(BoundingBox(xcentroid=self.width() / 2.0, ycentroid=self.height() / 2.0, width=width, height=height))
+
+    def resize(self, cols=None, rows=None, width=None, height=None, interp='bilinear'):
+        """Resize all images in the batch to (rows x cols) as two matrix products over the whole batch, with the same filter as Image.resize().  If rows or cols is None, preserve the aspect ratio"""
+        rows = rows if height is None else height
+        cols = cols if width is None else width
+        assert rows is not None or cols is not None, "Invalid input"
+        rows = rows if rows is not None else int(np.round(self.height() * (float(cols) / self.width())))
+        cols = cols if cols is not None else int(np.round(self.width() * (float(rows) / self.height())))
+        (Wy, Wx) = (_resample_weights(self.height(), rows, interp), _resample_weights(self.width(), cols, interp))
+        isuint8 = self._array.dtype == np.uint8
+        img = np.matmul(Wx, self._array.astype(np.float32))  # NxHxWxC -> NxHxcolsxC 
+        img = np.clip(np.round(img), 0, 255) if isuint8 else img  # horizontal pass is rounded to uint8 precision, as in PIL
+        img = np.matmul(Wy, img.reshape(len(self), self.height(), -1)).reshape(len(self), rows, cols, self.channels())  # NxHx(cols*C) -> NxrowsxcolsxC
+        for bb in self._boxes():
+            bb.scalex(float(cols) / self.width()).scaley(float(rows) / self.height())
+        self._array = np.clip(np.round(img), 0, 255).astype(np.uint8) if isuint8 else img
+        return self
+
+    def affine(self, A, interp='bilinear', out=None):
+        """Warp each image in the batch by the corresponding transformation in the Nx2x3 or Nx3x3 array A, or all images by the same 2x3 or 3x3 transformation A, with vipy.geometry.imtransforms().
+
+           * The output is written into the preallocated NxHxWxC array out if provided (which may be array() for an in-place warp), otherwise a new array
+           * Bounding boxes are transformed with the matrix of their image in one vectorized vipy.geometry.transform_boxes(), where each box is the enclosing box of the four transformed corners
+        """
+        A = np.asarray(A, dtype=np.float64)
+        A = np.broadcast_to(A, (len(self),) + A.shape) if A.ndim == 2 else A
+        self._array = vipy.geometry.imtransforms(self._array, A, interp=interp, out=out)
+        (boxes, index) = zip(*[(bb, k) for (k, im) in enumerate(self._images) for bb in (([im.bbox] if isinstance(im, ImageDetection) else []) + (im._objectlist if isinstance(im, Scene) else []))]) if len(self._boxes()) > 0 else ((), ())
+        for (bb, b) in zip(boxes, vipy.geometry.transform_boxes(A[list(index)], np.array([bb.ulbr() for bb in boxes]).reshape(-1,4))):
+            bb.ulbr(tuple(b.tolist()))
+        return self
+
+    def randomaffine(self, txy=((-8,8),(-8,8)), r=(-0.1,0.1), sx=(0.9,1.1), sy=(0.9,1.1), kx=(0,0), ky=(0,0), interp='bilinear', out=None):
+        """Warp each image in the batch by a random affine transformation about the image center, with all N transformations sampled at once by vipy.geometry.random_affine_transforms() with translation txy (pixels), rotation r (radians), scale sx, sy and shear kx, ky.
+           See affine() for the output buffer and the transformation of bounding boxes.  Use random_affine_transforms() then affine() if the transformations are needed.
+        """
+        return self.affine(vipy.geometry.random_affine_transforms(len(self), txy=txy, r=r, sx=sx, sy=sy, kx=kx, ky=ky, c=(self.width()/2.0, self.height()/2.0)), interp=interp, out=out)
+
+    def normalize(self, mean=None, std=None, scale=1.0):
+        """Convert the batch to float32 ((scale*img) - mean) / std, with per channel mean and std, in a single pass"""
+        self._array = vipy.math.normalize(self._array, mean=mean, std=std, scale=scale, dtype=np.float32)
+        self._colorspace = 'float'
+        return self
+
+    def torch(self, mean=None, std=None, scale=None):
+        """Return the batch as an NxCxHxW torch tensor, by reference.  If any of (mean, std, scale) are provided, return a new float32 tensor ((scale*img) - mean) / std, with scale defaulting to 1.0/255.0 for uint8"""
+        try_import('torch'); import torch
+        if mean is None and std is None and scale is None:
+            return torch.from_numpy(self._array).permute(0,3,1,2)  # NxHxWxC -> NxCxHxW
+        scale = scale if scale is not None else (1.0/255.0 if self._array.dtype == np.uint8 else 1.0)
+        return torch.from_numpy(vipy.math.normalize(self._array, mean=mean, std=std, scale=scale, axes=(0,3,1,2), dtype=np.float32))
+
+
 def RandomImage(rows=None, cols=None):
     rows = np.random.randint(128, 1024) if rows is None else rows
     cols = np.random.randint(128, 1024) if cols is None else cols
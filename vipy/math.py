@@ -31,3 +31,36 @@ def find_closest_positive_divisor(a, b):
         if bh>1 and a % bh == 0:
             return bh
     return a  # should never get here, since bh=a is always a solution
+
+
+def normalize(x, mean=None, std=None, scale=1.0, out=None, axes=None, index=None, dtype=np.float32, chunksize=16):
+    """Return out = ((scale*x) - mean) / std, computed in a single pass over chunks of the leading axis of x and written into the (optionally preallocated) out array.
+
+       Input:
+         -x:  numpy array (e.g. NxHxWxC uint8 frames or HxWxC image)
+         -mean, std:  None, scalar or broadcastable to the trailing dimensions of x (e.g. per channel mean and standard deviation)
+         -scale:  scalar applied to x before whitening (e.g. 1.0/255.0)
+         -out:  preallocated output array, or None to allocate a new array of type dtype
+         -axes:  transpose of x to the output axis ordering (e.g. axes=(0,3,1,2) for NxHxWxC -> NxCxHxW), or None for no transpose
+         -index:  Convert only the rows x[index] in the order provided, such that len(out) == len(index)
+         -chunksize:  the number of rows of x converted at a time
+
+       The type conversion, normalization and transpose are performed without full size temporaries.  
+    """
+    n = len(x) if index is None else len(index)
+    shape = (n,) + x.shape[1:]
+    shape = shape if axes is None else tuple(shape[a] for a in axes)
+    out = np.empty(shape, dtype=dtype) if out is None else out
+    assert out.shape == shape, "Invalid output shape %s, must be %s" % (str(out.shape), str(shape))
+    assert np.issubdtype(out.dtype, np.floating), "Output must be a floating point array"
+    dst = out if axes is None else out.transpose(np.argsort(axes))  # view of out in the axis ordering of x
+
+    # ((scale*x) - mean) / std == (x * gain) - bias
+    gain = np.asarray(scale if std is None else np.divide(scale, std, dtype=np.float64), dtype=out.dtype)
+    bias = None if mean is None else np.asarray(np.asarray(mean, dtype=np.float64) if std is None else np.divide(mean, std, dtype=np.float64), dtype=out.dtype)
+    for k in range(0, n, chunksize):
+        d = dst[k:k+chunksize]
+        np.multiply(x[k:k+chunksize] if index is None else x[np.asarray(index[k:k+chunksize])], gain, out=d)
+        if bias is not None:
+            np.subtract(d, bias, out=d)
+    return out
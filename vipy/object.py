@@ -1,5 +1,6 @@
 import numpy as np
 from vipy.geometry import BoundingBox
+import vipy.geometry
 from vipy.util import isstring, tolist
 import uuid
 import copy
@@ -70,6 +71,14 @@ class Detection(BoundingBox):
         else:
             return self._shortlabel
 
+    def confidence(self, c=None):
+        """Update the confidence of the detection, or return the confidence (None if not provided)"""
+        if c is None:
+            return self._confidence
+        else:
+            self._confidence = float(c)
+            return self
+
     def label(self, label):
         """Alias for category"""
         return self.category(label)
@@ -81,6 +90,13 @@ class Detection(BoundingBox):
         return copy.deepcopy(self)
     
 
+def _unpack_boundingbox(ulbr):
+    """Construct a vipy.geometry.BoundingBox from a packed (xmin, ymin, xmax, ymax) list without constructor validation, for unpickling"""
+    bb = BoundingBox.__new__(BoundingBox)
+    (bb._xmin, bb._ymin, bb._xmax, bb._ymax) = ulbr
+    return bb
+
+
 class Track(object):
     """vipy.object.Track class
     
@@ -136,6 +152,20 @@ class Track(object):
             self._keyframes = [int(np.round(f)) for f in keyframes]  # coerce to int
             self._keyboxes = list(boxes)
         
+    def __getstate__(self):
+        """Pickle the keyboxes as a packed Nx4 array of (xmin, ymin, xmax, ymax) and keyframes as an integer array, rather than a list of vipy.geometry.BoundingBox objects"""
+        state = self.__dict__.copy()
+        if all([type(bb) is BoundingBox for bb in self._keyboxes]):
+            state['_keyframes'] = np.array(self._keyframes, dtype=np.int64)
+            state['_keyboxes'] = np.array([[bb._xmin, bb._ymin, bb._xmax, bb._ymax] for bb in self._keyboxes], dtype=np.float64).reshape(-1, 4)
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state['_keyboxes'], np.ndarray):
+            state['_keyframes'] = state['_keyframes'].tolist()
+            state['_keyboxes'] = [_unpack_boundingbox(ulbr) for ulbr in state['_keyboxes'].tolist()]
+        self.__dict__.update(state)
+
     def __repr__(self):
         strlist = []
         if self.category() is not None:
@@ -267,6 +297,12 @@ class Track(object):
         self._keyboxes = [bb.dilate(s) for bb in self._keyboxes]
         return self
 
+    def affine(self, A):
+        """Transform all keyboxes by the 2x3 or 3x3 affine transformation A in one vectorized vipy.geometry.transform_boxes(), where each box is the enclosing box of the four transformed corners"""
+        boxes = vipy.geometry.transform_boxes(A, np.array([bb.ulbr() for bb in self._keyboxes]).reshape(-1,4))
+        self._keyboxes = [bb.ulbr(tuple(b.tolist())) for (bb, b) in zip(self._keyboxes, boxes)]
+        return self
+
     def rot90cw(self, H, W):
         """Rotate an image with (H,W)=shape 90 degrees clockwise and update all boxes to be consistent"""
         self._keyboxes = [bb.rot90cw(H, W) for bb in self._keyboxes]
@@ -0,0 +1,283 @@
+import time
+import warnings
+import collections
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from vipy.util import try_import
+try_import('torch', 'torch');  import torch
+import vipy.image
+import vipy.video
+import vipy.math
+
+
+class _Dataset(torch.utils.data.IterableDataset):
+    """vipy.torch._Dataset class
+
+    Base class for iterable datasets of vipy objects, which shards elements deterministically across torch.utils.data.DataLoader workers and distributed ranks,
+    loads elements lazily with a bounded prefetch queue of background threads and skips elements that fail to load.
+    """
+    def __init__(self, objlist, transform, label=None, shuffle=False, seed=0, prefetch=4, ignoreErrors=True, rank=None, world_size=None, verbose=False, reportevery=1000):
+        assert hasattr(objlist, '__getitem__') and hasattr(objlist, '__len__'), "Invalid input - Must be an indexable dataset (e.g. list)"
+        assert callable(transform), "Invalid transform - Must be a lambda function of a single vipy object"
+        assert prefetch >= 1, "Prefetch must be >= 1"
+        self._objlist = objlist
+        self._transform = transform
+        self._label = label
+        self._shuffle = shuffle
+        self._seed = seed
+        self._epoch = 0
+        self._prefetch = prefetch
+        self._ignoreErrors = ignoreErrors
+        self._rank = rank
+        self._world_size = world_size
+        self._verbose = verbose
+        self._reportevery = reportevery
+        self._stats = {'items':0, 'skipped':0, 'seconds':0.0}
+
+    def __len__(self):
+        return len(self._objlist)
+
+    def __repr__(self):
+        return str('<vipy.torch.%s: len=%d, prefetch=%d, shuffle=%s>' % (self.__class__.__name__, len(self), self._prefetch, str(self._shuffle)))
+
+    def set_epoch(self, epoch):
+        """Set the epoch for a new deterministic shuffle order, which must be the same on all ranks (e.g. torch.utils.data.distributed.DistributedSampler)"""
+        self._epoch = epoch
+        return self
+
+    def shard(self):
+        """Return the (shard, num_shards) for the current DataLoader worker and distributed rank"""
+        info = torch.utils.data.get_worker_info()
+        (worker, num_workers) = (info.id, info.num_workers) if info is not None else (0, 1)
+        distributed = torch.distributed.is_available() and torch.distributed.is_initialized()
+        rank = self._rank if self._rank is not None else (torch.distributed.get_rank() if distributed else 0)
+        world_size = self._world_size if self._world_size is not None else (torch.distributed.get_world_size() if distributed else 1)
+        return (rank*num_workers + worker, world_size*num_workers)
+
+    def index(self):
+        """Return the element indexes for the current shard, in a deterministic order for the current seed and epoch"""
+        (shard, num_shards) = self.shard()
+        index = np.random.RandomState(self._seed + self._epoch).permutation(len(self)) if self._shuffle else np.arange(len(self))
+        return index[shard::num_shards]
+
+    def throughput(self):
+        """Return the number of elements per second loaded by this worker"""
+        return self._stats['items'] / max(self._stats['seconds'], 1E-6)
+
+    def stats(self):
+        """Return a dictionary of the number of elements loaded, skipped and the elapsed seconds for this worker"""
+        return dict(self._stats, throughput=self.throughput())
+
+    def _load(self, k):
+        obj = self._objlist[int(k)].clone()  # do not cache the loaded buffer in the dataset
+        try:
+            self._isvalid(obj)
+            x = self._transform(obj)
+            return (x, self._label(obj)) if self._label is not None else x
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            if not self._ignoreErrors:
+                raise
+            if self._verbose:
+                warnings.warn('[vipy.torch.%s]: Skipping element "%s" with error "%s"' % (self.__class__.__name__, str(obj), str(e)))
+            return None
+
+    def _isvalid(self, obj):
+        return True
+
+    def __iter__(self):
+        (shard, num_shards) = self.shard()
+        index = iter(self.index())
+        self._stats = {'items':0, 'skipped':0, 'seconds':0.0}
+        t0 = time.time()
+        with ThreadPoolExecutor(max_workers=self._prefetch) as e:
+            futures = collections.deque([e.submit(self._load, k) for k in islice(index, self._prefetch)])  # bounded prefetch queue
+            while len(futures) > 0:
+                r = futures.popleft().result()
+                futures.extend([e.submit(self._load, k) for k in islice(index, 1)])
+                self._stats['seconds'] = time.time() - t0
+                if r is None:
+                    self._stats['skipped'] += 1
+                    continue
+                self._stats['items'] += 1
+                if self._verbose and self._stats['items'] % self._reportevery == 0:
+                    print('[vipy.torch.%s]: shard=%d/%d, items=%d, skipped=%d, %1.1f items/sec' % (self.__class__.__name__, shard, num_shards, self._stats['items'], self._stats['skipped'], self.throughput()))
+                yield r
+        if self._verbose:
+            print('[vipy.torch.%s]: shard=%d/%d completed, items=%d, skipped=%d, %1.1f items/sec' % (self.__class__.__name__, shard, num_shards, self._stats['items'], self._stats['skipped'], self.throughput()))
+
+
+class VideoDataset(_Dataset):
+    """vipy.torch.VideoDataset class
+
+    A torch.utils.data.IterableDataset for a list of vipy.video.Video objects, such as those returned from vipy.dataset.kinetics.Kinetics700().trainset() or vipy.dataset.meva.KF1().
+
+    >>> d = vipy.torch.VideoDataset(Kinetics700('/path/to/kinetics').trainset(), transform=lambda v: v.torch(startframe='random', length=16), label=lambda v: v.category())
+    >>> loader = torch.utils.data.DataLoader(d, batch_size=8, num_workers=4)
+
+       * transform:  lambda function of a vipy.video.Video returning the tensor for this video, defaults to v.torch()
+       * label:  lambda function of a vipy.video.Video returning the label for this video, if provided each element is the tuple (transform(v), label(v))
+       * shuffle, seed: deterministic shuffle of the dataset, with a new order for each set_epoch()
+       * prefetch:  the number of videos decoded in background threads ahead of the consumer by each DataLoader worker
+       * ignoreErrors:  skip videos that are not downloaded or fail to decode
+       * rank, world_size:  the distributed rank and number of ranks, defaults to torch.distributed if initialized
+
+    Videos are sharded deterministically across DataLoader workers and distributed ranks, so that each video is loaded once per epoch.
+    Videos are cloned before loading, so the dataset list never caches the decoded frames.
+    """
+    def __init__(self, videolist, transform=lambda v: v.torch(), label=None, shuffle=False, seed=0, prefetch=4, ignoreErrors=True, rank=None, world_size=None, verbose=False, reportevery=100):
+        super(VideoDataset, self).__init__(videolist, transform=transform, label=label, shuffle=shuffle, seed=seed, prefetch=prefetch, ignoreErrors=ignoreErrors,
+                                           rank=rank, world_size=world_size, verbose=verbose, reportevery=reportevery)
+
+    def _isvalid(self, v):
+        assert isinstance(v, vipy.video.Video), "Invalid input - Must be vipy.video.Video"
+        if not v.isloaded() and not v.hasfilename():
+            raise ValueError('Video not downloaded')  # do not download during training
+        return True
+
+
+class ImageDataset(_Dataset):
+    """vipy.torch.ImageDataset class
+
+    A torch.utils.data.IterableDataset for a list of vipy.image.Image objects.
+
+    >>> d = vipy.torch.ImageDataset(imlist, transform=lambda im: im.mindim(256).centersquare().torch(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]).squeeze(0), label=lambda im: im.category())
+    >>> loader = torch.utils.data.DataLoader(d, batch_size=64, num_workers=4)
+
+    See vipy.torch.VideoDataset for arguments.  The default transform is a float CxHxW tensor in the range [0,1].
+    """
+    def __init__(self, imlist, transform=lambda im: im.torch(dtype=torch.float32).squeeze(0), label=None, shuffle=False, seed=0, prefetch=4, ignoreErrors=True, rank=None, world_size=None, verbose=False, reportevery=1000):
+        super(ImageDataset, self).__init__(imlist, transform=transform, label=label, shuffle=shuffle, seed=seed, prefetch=prefetch, ignoreErrors=ignoreErrors,
+                                           rank=rank, world_size=world_size, verbose=verbose, reportevery=reportevery)
+
+    def _isvalid(self, im):
+        assert isinstance(im, vipy.image.Image), "Invalid input - Must be vipy.image.Image"
+        if not im.isloaded() and not im.hasfilename():
+            raise ValueError('Image not downloaded')
+        return True
+
+
+class ClipIndex(_Dataset):
+    """vipy.torch.ClipIndex class
+
+    A precomputed index of fixed length temporal sliding windows over every video in a dataset, with a streaming reader for activity detection training and inference.
+
+    >>> d = vipy.torch.ClipIndex(vipy.dataset.meva.KF1(...).videos(), length=64, stride=16).save('/path/to/index.npz')
+    >>> d = vipy.torch.ClipIndex(vipy.dataset.meva.KF1(...).videos(), indexfile='/path/to/index.npz')  # restore index, same videolist
+    >>> loader = torch.utils.data.DataLoader(d, batch_size=8, num_workers=4)   # (clip, labels) for each window
+
+    The index is built from the probed number of frames for each video (see vipy.video.Video.framecount()) and is stored as a compact array of windows with rows (videoindex, startframe, endframe)
+    and a boolean matrix of labels for each window, which is True for each activity category in categories() that overlaps the window temporally.
+
+       * length, stride:  the window length and the stride between consecutive window start frames
+       * boundary:  'strict' includes only windows fully inside the video, 'repeat' includes the last partial window with the last frame repeated
+       * mean, std, scale:  each clip is converted to an LxCxHxW float tensor ((scale*frames) - mean) / std, as in vipy.video.Video.totensor()
+
+    Iteration streams each video once from ffmpeg into a ring buffer of length frames, so that overlapping windows share decoded frames.  
+    Videos are sharded deterministically across DataLoader workers and ranks, and videos that fail to decode are skipped.
+    """
+    def __init__(self, videolist, length=64, stride=16, boundary='strict', indexfile=None, mean=None, std=None, scale=1.0/255.0, ignoreErrors=True, rank=None, world_size=None, verbose=False):
+        super(ClipIndex, self).__init__(videolist, transform=lambda v: v, ignoreErrors=ignoreErrors, rank=rank, world_size=world_size, verbose=verbose, reportevery=1)
+        assert boundary in ['strict', 'repeat'], "Invalid boundary mode - must be in ['repeat', 'strict']"
+        (self._mean, self._std, self._scale) = (mean, std, scale)
+        if indexfile is not None:
+            d = np.load(indexfile, allow_pickle=False)
+            assert int(d['num_videos']) == len(videolist), "Index file '%s' was built for %d videos, not %d" % (indexfile, int(d['num_videos']), len(videolist))
+            (self._windows, self._labels, self._categories) = (d['windows'], d['labels'], [str(c) for c in d['categories']])
+            (self._length, self._stride, self._boundary) = (int(d['length']), int(d['stride']), str(d['boundary']))
+        else:
+            assert length >= 1 and stride >= 1, "Invalid length or stride"
+            (self._length, self._stride, self._boundary) = (length, stride, boundary)
+            self._build()
+
+    def __repr__(self):
+        return str('<vipy.torch.ClipIndex: videos=%d, windows=%d, length=%d, stride=%d, categories=%d>' % (len(self._objlist), len(self), self._length, self._stride, len(self._categories)))
+
+    def __len__(self):
+        return len(self._windows)
+
+    def _build(self):
+        windows = []
+        activities = []  # (videoindex, startframe, endframe, category)
+        for (k, v) in enumerate(self._objlist):
+            n = v.framecount()
+            n = v.clone().load().framecount() if n is None else n  # no metadata, decode to count frames
+            last = n - self._length if self._boundary == 'strict' else max(n - self._length, (n-1) - ((n-1) % self._stride))
+            starts = np.arange(0, last+1, self._stride)
+            windows.append(np.stack( (np.full(len(starts), k), starts, starts+self._length), axis=1))
+            activities.extend([(k, a.startframe(), a.endframe(), a.category()) for a in (v.activitylist() if hasattr(v, 'activitylist') else [])])
+        self._windows = np.concatenate(windows).astype(np.int64) if len(windows) > 0 else np.zeros( (0,3), dtype=np.int64)
+        self._categories = sorted(set([str(c) for (k,s,e,c) in activities]))
+        self._labels = np.zeros( (len(self._windows), len(self._categories)), dtype=np.bool_)
+        d_category_to_index = {c:j for (j,c) in enumerate(self._categories)}
+        for (k, s, e, c) in activities:
+            overlap = (self._windows[:,0] == k) & (self._windows[:,1] < e) & (self._windows[:,2] > s)   # temporal intersection 
+            self._labels[overlap, d_category_to_index[str(c)]] = True
+        return self
+
+    def save(self, outfile):
+        """Save the index to the provided .npz file, which can be restored with ClipIndex(videolist, indexfile=outfile) for the same videolist"""
+        np.savez_compressed(outfile, windows=self._windows, labels=self._labels, categories=np.array(self._categories, dtype=np.str_),
+                            length=self._length, stride=self._stride, boundary=self._boundary, num_videos=len(self._objlist))
+        return self
+
+    def windows(self):
+        """Return the Nx3 array of (videoindex, startframe, endframe) for all windows"""
+        return self._windows
+
+    def labels(self):
+        """Return the NxC boolean array of activity categories overlapping each window"""
+        return self._labels
+
+    def categories(self):
+        """Return the list of category names for the columns of labels()"""
+        return self._categories
+
+    def index(self):
+        """Return the video indexes for the current shard"""
+        (shard, num_shards) = self.shard()
+        return np.unique(self._windows[:,0])[shard::num_shards]
+
+    def _clips(self, k):
+        """Yield (clip, labels, (videoindex, startframe, endframe)) for every window of video k, streaming the video through a ring buffer"""
+        rows = np.flatnonzero(self._windows[:,0] == k)
+        (H, W) = self._objlist[k].shape()
+        ringbuffer = np.empty( (self._length, H, W, 3), dtype=np.uint8)
+        (r, n) = (0, 0)
+        for (n, frame) in enumerate(self._objlist[k].clone().stream(ringbuffer), start=1):
+            while r < len(rows) and self._windows[rows[r], 2] == n:
+                yield self._clip(ringbuffer, rows[r], n)
+                r += 1
+        for j in rows[r:]:
+            if self._windows[j,1] < n:
+                yield self._clip(ringbuffer, j, n)  # boundary='repeat', or probed framecount too large
+
+    def _clip(self, ringbuffer, j, n):
+        (k, s, e) = self._windows[j]
+        frameindex = np.minimum(np.arange(s, e), n-1) % len(ringbuffer)   # repeat last frame past the end of the video
+        t = torch.empty( (e-s, 3) + ringbuffer.shape[1:3], dtype=torch.float32)
+        vipy.math.normalize(ringbuffer, mean=self._mean, std=self._std, scale=self._scale, out=t.numpy(), axes=(0,3,1,2), index=frameindex)
+        return (t, torch.from_numpy(self._labels[j]))
+
+    def __iter__(self):
+        (shard, num_shards) = self.shard()
+        self._stats = {'items':0, 'skipped':0, 'seconds':0.0}
+        t0 = time.time()
+        for k in self.index():
+            try:
+                for c in self._clips(k):
+                    self._stats['items'] += 1
+                    self._stats['seconds'] = time.time() - t0
+                    yield c
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                if not self._ignoreErrors:
+                    raise
+                self._stats['skipped'] += 1
+                if self._verbose:
+                    warnings.warn('[vipy.torch.ClipIndex]: Skipping video "%s" with error "%s"' % (str(self._objlist[k]), str(e)))
+        if self._verbose:
+            print('[vipy.torch.ClipIndex]: shard=%d/%d completed, windows=%d, skipped videos=%d, %1.1f windows/sec' % (shard, num_shards, self._stats['items'], self._stats['skipped'], self.throughput()))
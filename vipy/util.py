@@ -47,6 +47,32 @@ def try_import(package, pipname=None):
         raise ImportError('Optional package "%s" not installed -  Run "pip install %s" ' % (package, package if pipname is None else pipname))
 
 
+def fastest(functions, args, atol=0, trials=3):
+    """Return the key of the fastest function in the dictionary functions={key: f} by a micro-benchmark of f(*args).  
+
+       * Functions that raise an exception (e.g. a missing optional package or an unsupported input) are excluded
+       * Functions that return a numpy array with a different shape or dtype, or with maximum absolute difference greater than atol from the first function that succeeds, are excluded
+       * Each function is timed as the best of the provided number of trials, after one warmup call which is used for the comparison
+    """
+    (reference, elapsed) = (None, {})
+    for (k, f) in functions.items():
+        try:
+            y = f(*args)
+        except Exception:
+            continue
+        reference = y if reference is None else reference
+        if y.shape != reference.shape or y.dtype != reference.dtype or np.max(np.abs(y.astype(np.float64) - reference.astype(np.float64))) > atol:
+            continue
+        t = []
+        for j in range(0, trials):
+            t0 = time.time()
+            f(*args)
+            t.append(time.time() - t0)
+        elapsed[k] = min(t)
+    assert len(elapsed) > 0, "No function succeeded"
+    return min(elapsed, key=elapsed.get)
+
+
 def findyaml(basedir):
     """Return a list of absolute paths to yaml files recursively discovered by walking the directory tree rooted at basedir"""
     return [str(path.resolve()) for path in pathlib.Path(basedir).rglob('*.yml')]
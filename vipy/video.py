@@ -2,11 +2,12 @@ import os
 import dill
 from vipy.util import remkdir, tempMP4, isurl, \
     isvideourl, templike, tempjpg, filetail, tempdir, isyoutubeurl, try_import, isnumpy, temppng, \
-    istuple, islist, isnumber, tolist, filefull, fileext, isS3url, totempdir, flatlist, tocache, premkdir
+    istuple, islist, isnumber, tolist, filefull, fileext, isS3url, totempdir, flatlist, tocache, premkdir, isstring, readjson, writejson
 from vipy.image import Image
 import vipy.geometry
 import vipy.image
 import vipy.downloader
+import vipy.math
 import copy
 import numpy as np
 import ffmpeg
@@ -21,10 +22,33 @@ import warnings
 import shutil
 import types
 import platform
+import hashlib
 from io import BytesIO
+from fractions import Fraction
 import vipy.globals
 
 
+def _ffmpeg_to_recipe(f):
+    """Convert a linear ffmpeg-python filter chain to a list of [input kwargs, (filter name, args, kwargs), ...] for compact pickling, or return the filter chain unchanged if it is not linear"""
+    (recipe, node) = ([], f.node if f is not None else None)
+    while node is not None:
+        if isinstance(node, ffmpeg.nodes.InputNode):
+            return [dict(node.kwargs)] + recipe[::-1]
+        elif not isinstance(node, ffmpeg.nodes.FilterNode) or len(node.incoming_edges) != 1 or node.incoming_edges[0].upstream_label is not None or node.incoming_edges[0].upstream_selector is not None:
+            break
+        recipe.append((node.name, tuple(node.args), dict(node.kwargs)))
+        node = node.incoming_edges[0].upstream_node
+    return f 
+
+
+def _ffmpeg_from_recipe(recipe):
+    """Reconstruct the ffmpeg-python filter chain from the list output of _ffmpeg_to_recipe()"""
+    f = ffmpeg.input(**recipe[0])
+    for (name, args, kwargs) in recipe[1:]:
+        f = f.filter(name, *args, **kwargs)
+    return f
+
+
 class Video(object):
     """ vipy.video.Video class
 
@@ -111,6 +135,25 @@ class Video(object):
             self.array(array)
             self.colorspace(colorspace)
 
+    def __getstate__(self):
+        """Pickle the ffmpeg filter chain as a compact list of filter operations rather than the ffmpeg-python graph, and exclude the loaded array if vipy.globals.pickle_arrays(False)"""
+        state = self.__dict__.copy()
+        state['_ffmpeg'] = _ffmpeg_to_recipe(self._ffmpeg)
+        if not vipy.globals.pickle_arrays():
+            state['_array'] = None
+        return state
+
+    def __setstate__(self, state):
+        state['_ffmpeg'] = _ffmpeg_from_recipe(state['_ffmpeg']) if isinstance(state.get('_ffmpeg'), list) else state.get('_ffmpeg')
+        self.__dict__.update(state)
+
+    def __deepcopy__(self, memo):
+        """Deep copy all attributes including the loaded array, bypassing the compact pickle state"""
+        v = self.__class__.__new__(self.__class__)
+        memo[id(self)] = v
+        v.__dict__.update(copy.deepcopy(self.__dict__, memo))
+        return v
+        
     def __repr__(self):
         strlist = []
         if self.isloaded():
@@ -181,11 +224,40 @@ class Video(object):
             print(prefix+self.__repr__())
         return self
 
-    def stream(self):
-        # FIXME: Streaming video access for large videos that will not fit into memory
-        # https://github.com/kkroening/ffmpeg-python/blob/master/examples/README.md
-        # FIXME: https://github.com/kkroening/ffmpeg-python/issues/78
-        raise NotImplementedError('Streaming video access for large videos that will not fit into memory - Try clip() first')
+    def stream(self, ringbuffer=None):
+        """Iterate over the frames of the video for the current filter chain, streaming from an ffmpeg pipe without loading the whole video into memory.  Yields HxWx3 uint8 numpy frames.
+        
+           If ringbuffer is a preallocated C-contiguous uint8 array of shape MxHxWx3, then frame k is decoded directly into ringbuffer[k % M] and the yielded frame is a view of the ring buffer, 
+           which will be overwritten M frames later.  Otherwise, each frame is a new array.  If the video is loaded, yield the loaded frames.
+        """
+        if not self.isloaded() and not self.hasfilename() and self.hasurl():
+            self.download()
+        if not self.isloaded() and not self.hasfilename():
+            raise ValueError('Invalid input - stream() requires a valid URL, filename or array')
+
+        (height, width) = self.shape()  # triggers preview
+        assert ringbuffer is None or (isnumpy(ringbuffer) and ringbuffer.dtype == np.uint8 and ringbuffer.shape[1:] == (height, width, 3) and ringbuffer.flags['C_CONTIGUOUS']), "Invalid ring buffer - Must be uint8 C-contiguous array of shape Mx%dx%dx3" % (height, width)
+        if self.isloaded():
+            for (k, frame) in enumerate(self._array):
+                if ringbuffer is not None:
+                    ringbuffer[k % len(ringbuffer)] = frame
+                yield frame if ringbuffer is None else ringbuffer[k % len(ringbuffer)]
+            return
+        p = self._ffmpeg.output('pipe:', format='rawvideo', pix_fmt='rgb24')\
+                        .global_args('-cpuflags', '0', '-loglevel', 'debug' if vipy.globals.verbose() else 'error')\
+                        .run_async(pipe_stdout=True)
+        try:
+            k = 0
+            while True:
+                frame = ringbuffer[k % len(ringbuffer)] if ringbuffer is not None else np.empty( (height, width, 3), dtype=np.uint8)
+                if p.stdout.readinto(memoryview(frame).cast('B')) < frame.nbytes:
+                    break  # end of stream
+                yield frame
+                k += 1
+        finally:
+            p.stdout.close()
+            p.kill()
+            p.wait()
         
     def __array__(self):
         """Called on np.array(self) for custom array container, (requires numpy >=1.16)"""
@@ -303,6 +375,19 @@ class Video(object):
         """Alias for self.array(..., copy=True), which forces the new array to be a copy"""
         return self.array(array, copy=True)
     
+    def from_framestore(self, store, key=None):
+        """Set the array() of this video to the decoded frames saved in the vipy.video.FrameStore (or FrameStore filename), without decoding or copying.
+        
+           The frames are a read-only memory-mapped view of the frame store file, which are paged by the operating system and shared across processes.  
+           The key defaults to the ffmpeg filter chain of this video, so that the video must have the same filter chain as when it was added to the store with FrameStore.add().
+        """
+        store = FrameStore(store) if not isinstance(store, FrameStore) else store
+        key = store.key(self) if key is None else key
+        assert key in store, "Video '%s' not found in frame store '%s'" % (str(self), store.filename())
+        self._array = store.array(key)  # read-only memmap, like load()
+        self._colorspace = store.colorspace(key)
+        return self
+
     def tonumpy(self):
         """Alias for numpy()"""
         return self.numpy()
@@ -579,6 +664,12 @@ class Video(object):
         self._ffmpeg = self._ffmpeg.filter('vflip')
         return self
 
+    def affine(self, A, interp='bilinear'):
+        """Warp every frame of the video by the same 2x3 or 3x3 affine transformation A with vipy.geometry.imtransforms(), triggers load().  The frame buffer is warped in place if writeable."""
+        img = self.load().array()
+        self._array = vipy.geometry.imtransforms(img, A, interp=interp, out=img if img.flags['WRITEABLE'] else None)
+        return self
+
     def rescale(self, s):
         """Rescale the video by factor s, such that the new dimensions are (s*H, s*W), can only be applied prior load()"""
         assert not self.isloaded(), "Filters can only be applied prior to load() - Try calling flush() first"
@@ -730,62 +821,132 @@ class Video(object):
         """Alias for play()"""
         return self.play()
     
+    def framecount(self):
+        """Return the number of frames in the video for the current filter chain.  If the video is loaded, this is len(self).  
+           If the video is not loaded, estimate the number of frames from the ffprobe metadata, the requested framerate and the clip, without triggering a load().
+           Returns None if the frame count cannot be determined (e.g. ffprobe is not installed or the video is not downloaded).  
+           Probed frame counts are estimates and may differ by a frame from the loaded video.
+        """
+        if self.isloaded():
+            return len(self._array)
+        if not self.hasfilename() or shutil.which('ffprobe') is None:
+            return None
+        try:
+            p = self.probe()
+            s = [s for s in p['streams'] if s['codec_type'] == 'video'][0]
+            duration = float(s['duration']) if 'duration' in s else float(p['format']['duration'])
+            if self._framerate is not None:
+                n = int(np.ceil(duration*float(self._framerate)))  # fps filter with round='up'
+            elif 'nb_frames' in s:
+                n = int(s['nb_frames'])
+            else:
+                n = int(np.round(duration*float(Fraction(s['avg_frame_rate']))))
+        except Exception:
+            return None
+        if self._startframe is not None:
+            n = max(0, min(n, self._endframe) - self._startframe)  # cumulative clip()
+        if self._startsec is not None and self._framerate is not None:
+            n = min(n, int(np.ceil((self._endsec - self._startsec)*float(self._framerate))))
+        return n
+    
+    def nbytes(self):
+        """Return the number of bytes of the loaded video array.  If the video is not loaded, estimate the number of bytes that load() will allocate from framecount() and the shape of a preview frame, without triggering a load().
+           Returns None if the estimate cannot be determined.
+        """
+        if self.isloaded():
+            return self._array.nbytes
+        n = self.framecount()
+        if n is None:
+            return None
+        try:
+            (h, w) = self.shape()
+        except Exception:
+            return None
+        return int(n*h*w*3)  # load() decodes rgb24
+        
+    def _hasfilter(self, names):
+        """Does the ffmpeg filter chain include any of the named filters (e.g. ['trim', 'fps'])?"""
+        nodes = ffmpeg.nodes.get_stream_spec_nodes(self._ffmpeg)
+        (sorted_nodes, outgoing_edge_maps) = ffmpeg.dag.topo_sort(nodes)
+        return any([getattr(n, 'name', None) in names for n in sorted_nodes])
+
     def torch(self, startframe=0, endframe=None, length=None, stride=1, take=None, boundary='repeat', order='nchw', verbose=False, withslice=False):
-        """Convert the loaded video of shape N HxWxC frames to an MxCxHxW torch tensor, forces a load().
+        """Convert the loaded video of shape N HxWxC frames to an MxCxHxW torch tensor.
            Order of arguments is (startframe, endframe) or (startframe, startframe+length) or (random_startframe, random_starframe+takelength), then stride or take.
            Follows numpy slicing rules.  Optionally return the slice used if withslice=True
            Returns float tensor in the range [0,1] following torchvision.transforms.ToTensor()           
+
+           If the video is not loaded and the number of frames can be determined from framecount(), then the slice is computed up front and only the frames in the slice are decoded, 
+           and this video is not loaded.  Otherwise, or if the video has a clip() or the probed frame count was wrong, this forces a load() and the slice is computed from the loaded frames.  
+           Frames beyond the end of the video are repeated from the last frame if boundary='repeat'.
         """
         try_import('torch'); import torch
-        frames = self.load().array() if self.iscolor() else np.expand_dims(self.load().array(), 3)
         assert boundary in ['repeat', 'strict'], "Invalid boundary mode - must be in ['repeat', 'strict']"
-
-        # Slice index (i=start, j=end, k=step)
-        (i,j,k) = (startframe, len(frames), stride)
-        if startframe == 'random':
-            assert length is not None, "Random start frame requires fixed length"
-            i = max(0, np.random.randint(len(frames)-length+1))
-        if endframe is not None:
-            assert length is None, "Cannot specify both endframe and length"                        
-            assert endframe > startframe, "End frame must be greater than start frame"
-            (j,k) = (endframe-startframe+1, 1)
-        if length is not None:
-            assert endframe is None, "Cannot specify both endframe and length"
-            assert length >= 0, "Length must be positive"
-            (j,k) = (i+length, 1)
-        if stride != 1:
-            assert take is None, "Cannot specify both take and stride"
-            assert stride >= 1, "Stride must be >= 1"
-            k = stride
-        if take is not None:
-            # Uniformly sampled frames to result in len(frames)=take
-            assert stride == 1, "Cannot specify both take and stride"
-            assert take <= len(frames), "Take must be less than the number of frames"
-            k = int(np.ceil(len(frames)/float(take)))
-
-        # Boundary handling
-        assert i >= 0, "Start frame must be >= 0"
-        assert i < j, "Start frame must be less then end frame"
-        assert k <= len(frames), "Stride must be <= len(frames)"            
-        if boundary == 'repeat' and j > len(frames):
-            for d in range(j-len(frames)):
-                frames = np.concatenate( (frames, np.expand_dims(frames[-1], 0) ))
-        assert j <= len(frames), "invalid slice=%s for frame shape=%s - try setting boundary='repeat'" % (str((i,j,k)), str(frames.shape))
-        if verbose:
-            print('[vipy.video.torch]: slice (start,end,step)=%s for frame shape (N,C,H,W)=%s' % (str((i,j,k)), str(frames.shape)))
-
-        # Slice and transpose to torch tensor axis ordering
-        t = torch.from_numpy(frames[i:j:k])
-        if order == 'nchw':
-            t = t.permute(0,3,1,2)  # NxCxHxW
-        elif order == 'nhwc':
-            pass  # NxHxWxC  (native numpy order)
+        assert order in ['nchw', 'nhwc'], "Invalid order = must be in ['nchw', 'nhwc']"
+        n = self.framecount()
+        if n is None:
+            n = self.load().framecount()
+
+        def _slice(n):
+            """Slice index (i=start, j=end, k=step) and the frame index of each output frame for a video with n frames"""
+            (i,j,k) = (startframe, n, stride)
+            if startframe == 'random':
+                assert length is not None, "Random start frame requires fixed length"
+                i = max(0, np.random.randint(n-length+1))
+            if endframe is not None:
+                assert length is None, "Cannot specify both endframe and length"                        
+                assert endframe > startframe, "End frame must be greater than start frame"
+                (j,k) = (endframe-startframe+1, 1)
+            if length is not None:
+                assert endframe is None, "Cannot specify both endframe and length"
+                assert length >= 0, "Length must be positive"
+                (j,k) = (i+length, 1)
+            if stride != 1:
+                assert take is None, "Cannot specify both take and stride"
+                assert stride >= 1, "Stride must be >= 1"
+                k = stride
+            if take is not None:
+                # Uniformly sampled frames to result in len(frames)=take
+                assert stride == 1, "Cannot specify both take and stride"
+                assert take <= n, "Take must be less than the number of frames"
+                k = int(np.ceil(n/float(take)))
+
+            # Boundary handling: frames past the end of the video repeat the last frame
+            assert i >= 0, "Start frame must be >= 0"
+            assert i < j, "Start frame must be less then end frame"
+            assert k <= n, "Stride must be <= len(frames)"            
+            assert boundary == 'repeat' or j <= n, "invalid slice=%s for frame shape=%s - try setting boundary='repeat'" % (str((i,j,k)), str(n))
+            assert i < n, "Start frame must be less than the number of frames"
+            if verbose:
+                print('[vipy.video.torch]: slice (start,end,step)=%s for frames=%d' % (str((i,j,k)), n))
+            return (i, j, k, np.minimum(np.arange(i, j, k), n-1))
+
+        (i, j, k, frameindex) = _slice(n)
+        if self.isloaded() or self._hasfilter(['trim']):
+            (frames, colorspace) = (self.load()._array, self.colorspace())  # load() renumbers the frames of a clip() by timestamp
+            (i, j, k, frameindex) = _slice(len(frames)) if len(frames) != n else (i, j, k, frameindex)
         else:
-            raise ValueError("Invalid order = must be in ['nchw', 'nhwc']")
-            
-        # Scaling
-        if self.colorspace() != 'float':
-            t = (1.0/255.0)*t  # [0,255] -> [0,1]
+            # Decode only the frames in the slice, selected by output frame index at the end of the filter chain (e.g. after framerate())
+            sliceindex = np.unique(frameindex)
+            select = 'between(n,%d,%d)' % (sliceindex[0], sliceindex[-1])
+            if k > 1:
+                select = '%s*not(mod(n-%d,%d))' % (select, i, k) if (sliceindex[-1] - i) % k == 0 else '%s*not(mod(n-%d,%d))+eq(n,%d)' % (select, i, k, sliceindex[-1])
+            select = '%s+eq(n,%d)+eq(n,%d)' % (select, n-1, n)  # a missing last frame or a frame past the end means the probed frame count was wrong
+            decodeindex = np.unique(np.append(sliceindex, n-1))
+            v = self.clone(flushforward=True)
+            v._ffmpeg = v._ffmpeg.filter('select', select).filter('settb', '1/30').setpts('N').filter('fps', fps=30)  # consecutive integer timestamps at a constant rate, so that no frames are dropped or duplicated on output
+            (frames, colorspace) = (v.load().array(), v.colorspace())
+            if len(frames) == len(decodeindex):
+                frameindex = np.searchsorted(decodeindex, frameindex)
+            else:
+                # The probed frame count was off (see framecount()), so load and recompute the slice for the loaded frames
+                (frames, colorspace) = (self.load()._array, self.colorspace())
+                (i, j, k, frameindex) = _slice(len(frames))
+
+        # Convert, scale and transpose the sliced frames into a preallocated float tensor in a single pass
+        (H, W, C) = frames.shape[1:]
+        t = torch.empty( (len(frameindex), C, H, W) if order == 'nchw' else (len(frameindex), H, W, C), dtype=torch.float32)
+        vipy.math.normalize(frames, scale=1.0 if colorspace == 'float' else 1.0/255.0, out=t.numpy(), axes=(0,3,1,2) if order == 'nchw' else None, index=frameindex)
 
         # Return tensor or (tensor, slice)
         return t if not withslice else (t, (i,j,k))
@@ -853,11 +1014,32 @@ class Video(object):
         return self
 
     def normalize(self, mean, std, scale=1.0):
-        """Pixelwise whitening, out = ((scale*in) - mean) / std); triggers load()"""
-        self._array = (((scale*self.load()._array) - np.array(mean)) / np.array(std)).astype(np.float32)
+        """Pixelwise whitening, out = ((scale*in) - mean) / std); triggers load().  Computed in chunks of frames with no full size float64 temporaries."""
+        self._array = vipy.math.normalize(self.load()._array, mean=mean, std=std, scale=scale, dtype=np.float32)
         self.colorspace('float')
         return self
 
+    def totensor(self, out=None, mean=None, std=None, scale=None, dtype=None, order='nchw'):
+        """Convert the loaded video of N HxWxC frames to an NxCxHxW torch tensor, with fused type conversion, normalization and transpose, triggers load().
+        
+           Output is ((scale*frames) - mean) / std, computed in a single pass over chunks of frames without full size temporaries.
+
+           * out: preallocated torch tensor of shape NxCxHxW (order='nchw') or NxHxWxC (order='nhwc') to write into, or None to allocate a new tensor
+           * mean, std: scalar or per channel mean and standard deviation, applied after scaling
+           * scale: scale factor, defaults to 1.0/255.0 for uint8 colorspaces and 1.0 for colorspace='float' (e.g. range [0,1] following torchvision.transforms.ToTensor())
+           * dtype: torch.float32 (default) or torch.float16, ignored if out is provided
+        """
+        try_import('torch'); import torch
+        assert order in ['nchw', 'nhwc'], "Invalid order = must be in ['nchw', 'nhwc']"
+        frames = self.load().array()
+        (N, H, W, C) = frames.shape
+        shape = (N, C, H, W) if order == 'nchw' else (N, H, W, C)
+        out = torch.empty(shape, dtype=dtype if dtype is not None else torch.float32) if out is None else out
+        assert isinstance(out, torch.Tensor) and tuple(out.shape) == shape and out.device.type == 'cpu', "Invalid output - must be preallocated CPU torch tensor of shape %s" % str(shape)
+        scale = scale if scale is not None else (1.0 if self.colorspace() == 'float' else 1.0/255.0)
+        vipy.math.normalize(frames, mean=mean, std=std, scale=scale, out=out.numpy(), axes=(0,3,1,2) if order == 'nchw' else None)
+        return out
+
     
 class VideoCategory(Video):
     """vipy.video.VideoCategory class
@@ -1240,6 +1422,20 @@ class Scene(VideoCategory):
             warnings.warn('[vipy.video.activitytube]: Removed %d frames during activity with no spatial bounding boxes' % (len(vid) - len(frames)))
         return vid.array(frames)
 
+    def crops(self, size, dilate=1.0, squareify=False, interp='bilinear'):
+        """Return a dictionary of track chips {trackid: TxHxWxC numpy array}, where each chip is the interpolated track box cropped and resized to size=(H,W) in each of the T frames where the track is present.
+
+           The chips for all tracks in each frame are extracted with one vectorized crop and resample of the frame, with zeros outside the frame rectangle.  See vipy.image.Scene.crops() for the arguments.
+        """
+        chips = {tid:[] for tid in self.tracks().keys()}
+        for k in range(0, len(self.load())):
+            dets = [(tid, t[k]) for (tid, t) in self._tracks.items() if t[k] is not None]  # track interpolation with boundary handling
+            if len(dets) > 0:
+                boxes = np.array([d.clone().maxsquareif(squareify).dilate(dilate).ulbr() for (tid, d) in dets], dtype=np.float32)
+                for ((tid, d), chip) in zip(dets, vipy.image._cropresize(self._array[k], boxes, size, interp=interp)):
+                    chips[tid].append(chip)
+        return {tid:np.stack(c) for (tid, c) in chips.items() if len(c) > 0}
+
     def clip(self, startframe, endframe):
         """Clip the video to between (startframe, endframe).  This clip is relative to cumulative clip() from the filter chain"""
         super(Scene, self).clip(startframe, endframe)
@@ -1283,6 +1479,12 @@ class Scene(VideoCategory):
         super(Scene, self).flipud()
         return self
 
+    def affine(self, A, interp='bilinear'):
+        """Warp every frame of the video by the same 2x3 or 3x3 affine transformation A, and transform all track keyboxes by A, triggers load()"""
+        super(Scene, self).affine(A, interp=interp)
+        self._tracks = {k:t.affine(A) for (k,t) in self._tracks.items()}
+        return self
+
     def rot90ccw(self):
         assert not self.isloaded(), "Filters can only be applied prior to load() - Try calling flush() first"                
         (H,W) = self.shape()  # yuck, need to get image dimensions before filter
@@ -1413,6 +1615,80 @@ class Scene(VideoCategory):
         return self.__getitem__(frame).savefig(outfile if outfile is not None else temppng(), fontsize=fontsize, nocaption=nocaption, boxalpha=boxalpha, dpi=dpi, textfacecolor=textfacecolor, textfacealpha=textfacealpha)
 
     
+class FrameStore(object):
+    """vipy.video.FrameStore class
+
+    A cache of decoded uint8 video clips in a single memory-mapped file, with a JSON index of the byte offset, shape and colorspace of each clip.  
+    This is useful for small clips (e.g. vipy.video.Scene.activitycuboid() at maxdim=256) that are reused for many epochs, such that the clips are decoded once, 
+    and then memory-mapped with no decoding cost in any process, with operating system managed paging.
+
+    >>> store = vipy.video.FrameStore('/path/to/clips.frames').add([v.activitycuboid(maxdim=256) for v in videos])
+    >>> v = video.activitycuboid(maxdim=256).from_framestore('/path/to/clips.frames')   # zero-copy, memory mapped frames with annotations from the video
+
+    Clips are keyed by the ffmpeg filter chain of the video (filename, clips, crops and resizing), or by a user provided key.  The index is saved to '/path/to/clips.frames.json'.
+    Adding clips requires a single writer process.
+    """
+    def __init__(self, filename):
+        self._filename = os.path.abspath(os.path.expanduser(filename))
+        self._indexfile = '%s.json' % self._filename
+        self._index = readjson(self._indexfile) if os.path.exists(self._indexfile) else {}
+        self._mmap = None
+
+    def __repr__(self):
+        return str('<vipy.video.framestore: filename="%s", clips=%d, bytes=%d>' % (self._filename, len(self), self.filesize()))
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return (key if isstring(key) else self.key(key)) in self._index
+
+    def filename(self):
+        return self._filename
+
+    def filesize(self):
+        return os.path.getsize(self._filename) if os.path.exists(self._filename) else 0
+
+    def keys(self):
+        return list(self._index.keys())
+
+    def key(self, v):
+        """The key for a video is the sha1 hash of the ffmpeg command line for the current filter chain of the video, which requires a filename"""
+        assert isinstance(v, Video) and v.filename() is not None, "Video frame store key requires a video filename - Provide a key"
+        return hashlib.sha1(v._ffmpeg_commandline().encode('utf-8')).hexdigest()
+
+    def add(self, videos, key=None, flush=True):
+        """Decode and append the frames of the video (or list of videos) to the frame store, and update the index.  If flush=True, the frames are flushed from the videos after adding"""
+        videos = tolist(videos)
+        keys = [self.key(v) for v in videos] if key is None else tolist(key)
+        assert len(keys) == len(videos), "One key per video required"
+        with open(self._filename, 'ab') as f:
+            for (k, v) in zip(keys, videos):
+                if k in self._index:
+                    continue
+                wasloaded = v.isloaded()
+                frames = np.ascontiguousarray(v.load().array())
+                assert frames.dtype == np.uint8, "Frame store requires uint8 frames"
+                self._index[k] = {'offset':f.tell(), 'shape':list(frames.shape), 'colorspace':v.colorspace()}
+                frames.tofile(f)
+                if flush and not wasloaded:
+                    v.flush()
+        writejson(self._index, self._indexfile)
+        self._mmap = None  # file size changed, remap
+        return self
+
+    def array(self, key):
+        """Return the read-only memory-mapped NxHxWxC uint8 frames for the key"""
+        if self._mmap is None:
+            self._mmap = np.memmap(self._filename, dtype=np.uint8, mode='r')
+        d = self._index[key]
+        n = int(np.prod(d['shape']))
+        return self._mmap[d['offset']:d['offset']+n].reshape(d['shape'])
+
+    def colorspace(self, key):
+        return self._index[key]['colorspace']
+
+    
 def RandomVideo(rows=None, cols=None, frames=None):
     """Return a random loaded vipy.video.video, useful for unit testing, minimum size (32x32x32)"""
     rows = np.random.randint(256, 1024) if rows is None else rows